@@ -0,0 +1,131 @@
+"""The catalog of apps, kept as a memory-mapped Arrow file.
+
+Parsing a catalog of 100k apps from CSV, and then parsing every app url into
+its coordinates, takes seconds on every cold start of the app, and the parsed
+owner, repo, branch and path columns take a Python string per row. Instead
+we convert the CSV once into an Arrow file next to it, with the coordinates
+already parsed and stored as dictionary encoded, i.e. categorical, columns.
+Loads memory map that file and keep it as one shared Arrow table, so only
+the apps we actually work on are copied into a DataFrame. The file remembers
+the size and modification time of the CSV it was built from, and is rebuilt
+whenever those change.
+See: https://arrow.apache.org/docs/python/ipc.html
+"""
+
+import os
+import threading
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from typing import Optional
+
+# The Arrow file is named after the CSV, with this extension instead.
+CATALOG_EXTENSION = '.arrow'
+
+# Where the catalog records which CSV it was built from.
+SOURCE_KEY = b'source_csv'
+
+# The parsed coordinates of each app, which repeat a lot, so are stored as
+# categoricals. These are `streamlit_github.COORDS_COLUMNS`.
+CATEGORICAL_COLUMNS = ['owner', 'repo', 'branch', 'path']
+
+def get_catalog_path(csv_path: str) -> str:
+    """Returns where the Arrow file for this CSV lives."""
+    return os.path.splitext(csv_path)[0] + CATALOG_EXTENSION
+
+def _get_source_stamp(csv_path: str) -> str:
+    """Returns a string which changes whenever the CSV does."""
+    stat = os.stat(csv_path)
+    return f"{os.path.abspath(csv_path)} {stat.st_size} {stat.st_mtime_ns}"
+
+def read_csv(csv_path: str) -> pd.DataFrame:
+    """Reads a CSV of apps with an app_url column, and parses the urls,
+    unless the CSV already has their coordinates, e.g. because we wrote it
+    with the apps' statuses."""
+    # Only rebuilding needs the url parser.
+    import streamlit_github
+    apps = pd.read_csv(csv_path, low_memory=False)
+    if 'Unnamed: 0' in apps.columns:
+        apps = apps.drop(columns='Unnamed: 0')
+    if 'owner' in apps.columns:
+        return apps
+    return apps.join(streamlit_github.parse_app_urls(apps.app_url))
+
+def _to_table(apps: pd.DataFrame) -> pa.Table:
+    """Converts the apps to Arrow, with categorical coordinates."""
+    apps = apps.astype({column: 'category'
+        for column in CATEGORICAL_COLUMNS if column in apps.columns})
+    return pa.Table.from_pandas(apps, preserve_index=False)
+
+def build_catalog(csv_path: str, catalog_path: str) -> None:
+    """Converts the CSV into the Arrow file, replacing it atomically."""
+    table = _to_table(read_csv(csv_path))
+    table = table.replace_schema_metadata({**table.schema.metadata,
+        SOURCE_KEY: _get_source_stamp(csv_path).encode('utf-8')})
+    temp_path = f"{catalog_path}.{os.getpid()}.tmp"
+    with pa.OSFile(temp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(temp_path, catalog_path)
+
+def _open_catalog(catalog_path: str) -> pa.Table:
+    """Memory maps the Arrow file. The table reads its pages from the file
+    as they're touched, and keeps the map open for as long as it lives."""
+    return pa.ipc.open_file(pa.memory_map(catalog_path)).read_all()
+
+def _is_built_from(catalog_path: str, csv_path: str) -> bool:
+    """True if the Arrow file exists and was built from the CSV as it is."""
+    if not os.path.exists(catalog_path):
+        return False
+    with pa.memory_map(catalog_path) as source:
+        metadata = pa.ipc.open_file(source).schema.metadata or {}
+    return metadata.get(SOURCE_KEY) == \
+        _get_source_stamp(csv_path).encode('utf-8')
+
+def load_table(csv_path: str) -> pa.Table:
+    """Returns the apps in this CSV, with their parsed coordinates, from the
+    Arrow file, which is built first if it's missing or stale. If it can't
+    be written, e.g. next to a read-only CSV, we parse the CSV into memory
+    instead."""
+    catalog_path = get_catalog_path(csv_path)
+    if not _is_built_from(catalog_path, csv_path):
+        try:
+            build_catalog(csv_path, catalog_path)
+        except OSError:
+            return _to_table(read_csv(csv_path))
+    return _open_catalog(catalog_path)
+
+# The loaded catalogs, keyed by CSV path, with the stamp they were loaded
+# from, so every rerun shares one without hashing or copying it.
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+def get_table(csv_path: str) -> pa.Table:
+    """Returns the shared catalog for this CSV, loading it again if the CSV
+    changed. Only the apps which are used need to become a DataFrame, with
+    `to_frame`."""
+    stamp = _get_source_stamp(csv_path)
+    with _catalogs_lock:
+        if csv_path not in _catalogs or _catalogs[csv_path][0] != stamp:
+            _catalogs[csv_path] = (stamp, load_table(csv_path))
+        return _catalogs[csv_path][1]
+
+def filter_urls(apps: pa.Table, pattern: str) -> pa.Table:
+    """Returns the apps whose url matches this regular expression, without
+    copying the rest into Python."""
+    return apps.filter(pc.match_substring_regex(apps['app_url'], pattern))
+
+def to_frame(apps: pa.Table) -> pd.DataFrame:
+    """Converts some apps to a DataFrame, with categorical coordinates."""
+    return apps.to_pandas()
+
+def get_apps(csv_path: str, first: int = 0,
+        last: Optional[int] = None) -> pd.DataFrame:
+    """Returns the apps in this CSV from first up to last, like a slice,
+    with their parsed coordinates, as a DataFrame indexed by row. Only those
+    rows are copied out of the catalog."""
+    table = get_table(csv_path)
+    start, stop, _ = slice(first, last).indices(table.num_rows)
+    apps = to_frame(table.slice(start, max(0, stop - start)))
+    apps.index = pd.RangeIndex(start, start + len(apps))
+    return apps
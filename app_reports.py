@@ -0,0 +1,98 @@
+"""A durable store of what happened to each app in each run of the bot.
+
+Drawing an expander per app makes the Streamlit frontend unresponsive once a
+run has thousands of apps, and every rerun has to diff all of them. So the
+`StreamlitReporter` only draws running totals, and stores each app's status
+and messages here, where the app shows them a page at a time, on demand.
+"""
+
+import datetime
+import json
+import time
+import sqlite_store
+import pandas as pd
+from typing import List, Optional, Tuple
+
+# Where the reports live on disk.
+APP_REPORTS_PATH = 'app_reports.sqlite'
+
+# How many reports we show per page.
+PAGE_SIZE = 50
+
+def new_run_name() -> str:
+    """Returns a name for a new run, which sorts by when it started."""
+    return datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')
+
+class AppReports(sqlite_store.SqliteStore):
+    """App reports keyed by run and the order they were reported in, stored
+    in SQLite."""
+
+    SCHEMA = ["""
+        CREATE TABLE IF NOT EXISTS reports (
+            run TEXT,
+            seq INTEGER,
+            app_url TEXT,
+            status TEXT,
+            messages TEXT,
+            reported_at REAL,
+            PRIMARY KEY (run, seq)
+        )""", """
+        CREATE INDEX IF NOT EXISTS reports_by_status
+        ON reports (run, status, seq)"""]
+
+    def put_many(self, run: str,
+            reports: List[Tuple[int, str, str, List[Tuple[str, str]]]]
+            ) -> None:
+        """Stores (seq, app url, status, messages) reports in one
+        transaction."""
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO reports VALUES (?, ?, ?, ?, ?, ?)",
+                [(run, seq, app_url, status, json.dumps(messages), now)
+                    for seq, app_url, status, messages in reports])
+
+    def list_runs(self) -> pd.DataFrame:
+        """Returns every run with its number of apps, newest first."""
+        with self._lock:
+            return pd.read_sql_query("""
+                SELECT run, COUNT(*) AS apps, MAX(reported_at) AS reported_at
+                FROM reports GROUP BY run ORDER BY run DESC""",
+                self._connection)
+
+    def get_status_counts(self, run: str) -> pd.Series:
+        """Returns how many apps in this run got each status."""
+        with self._lock:
+            counts = pd.read_sql_query("""
+                SELECT status, COUNT(*) AS apps FROM reports
+                WHERE run = ? GROUP BY status ORDER BY apps DESC""",
+                self._connection, params=(run,))
+        return counts.set_index('status').apps
+
+    def get_page(self, run: str, page: int, status: Optional[str] = None,
+            page_size: int = PAGE_SIZE) -> pd.DataFrame:
+        """Returns one page of this run's reports, without their messages,
+        with seq, app_url and status columns, optionally just the ones with
+        this status."""
+        query = "SELECT seq, app_url, status FROM reports WHERE run = ?"
+        params = [run]
+        if status is not None:
+            query += " AND status = ?"
+            params.append(status)
+        query += " ORDER BY seq LIMIT ? OFFSET ?"
+        params += [page_size, page * page_size]
+        with self._lock:
+            return pd.read_sql_query(query, self._connection, params=params)
+
+    def get_messages(self, run: str, seq: int) -> List[Tuple[str, str]]:
+        """Returns the (level, message) pairs of one report."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT messages FROM reports WHERE run = ? AND seq = ?",
+                (run, seq)).fetchone()
+        return [] if row is None else [tuple(message)
+            for message in json.loads(row[0])]
+
+def get_reports(path: str = APP_REPORTS_PATH) -> AppReports:
+    """Returns the shared store at this path."""
+    return sqlite_store.get_shared(AppReports, path)
@@ -0,0 +1,623 @@
+"""The UI-agnostic core of the badge bot: working out which Streamlit sharing
+apps already have badges, and forking repos to add badges to the rest.
+
+Nothing in here writes to Streamlit. Progress and results go to a
+`reporting.Reporter` instead, so the same code runs in the Streamlit app,
+from the command line in `badge_cli`, or silently."""
+
+import concurrent.futures
+import difflib
+import functools
+import json
+import pandas as pd
+import app_catalog
+import badge_detector
+import streamlit_github
+import github_graphql
+import github_metrics
+import github_rate_limit
+import fork_inventory
+import fork_journal
+import pull_request_tracker
+import readme_cache
+import reporting
+import status_store
+from github import MainClass as GithubMainClass
+from github import ContentFile
+from github import GithubException
+from github import UnknownObjectException
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# This is the commit message when we add a new badge.
+COMMIT_MESSAGE = "Added Streamlit app badge for discoverability"
+
+# This is the title we give the pull request.
+OLD_BADGE_PULL_REQUEST_TITLE = "Add a Stremlit app badge to readme"
+BADGE_PULL_REQUEST_TITLE = "Add a Streamlit app badge to README"
+
+# This is the body of the pull request.
+BADGE_PULL_REQUEST_BODY = """
+Hi 👋!
+
+Thank you for making this awesome Streamlit app!
+
+I noticed that your project's README doesn't have a Streamlit badge.
+Adding one would let people directly click into your app when
+browsing your GitHub repo. Cool, right?!
+
+This pull request automatically adds a beautiful Streamlit badge to your
+README. Just go ahead and click `Merge pull request` below to get it!
+
+Happy app creating 🎈
+
+~ StreamlitBadgeBot 🤖
+___
+For more information about how pull requests work, please [click here](https://docs.github.com/en/free-pro-team@latest/github/collaborating-with-issues-and-pull-requests/merging-a-pull-request).
+"""
+
+class ForkAppError(Exception):
+    """Represents a mistake that could happen when trying to fork an app."""
+
+    def __init__(self, reason):
+        """Constructor."""
+        Exception.__init__(self, reason)
+        self.reason = reason
+
+class BatchOptions:
+    """The options which control a batch run."""
+
+    def __init__(self, num_workers: int = 8, status_backend: str = "REST",
+            graphql_batch_size: int = github_graphql.MAX_BATCH_SIZE,
+            show_readmes: bool = False, do_pull_requests: bool = False,
+            resume_forks: bool = True,
+            status_store_path: str = status_store.STATUS_STORE_PATH,
+            fork_journal_path: str = fork_journal.FORK_JOURNAL_PATH,
+            fork_inventory_path: str = fork_inventory.FORK_INVENTORY_PATH,
+            pull_request_tracker_path: str =
+                pull_request_tracker.PULL_REQUEST_TRACKER_PATH,
+            num_processes: Optional[int] = None,
+            readme_cache_path: str = readme_cache.README_CACHE_PATH) -> None:
+        """Constructor. If num_processes is None, dry runs use one process
+        per CPU."""
+        self.num_workers = num_workers
+        self.status_backend = status_backend
+        self.graphql_batch_size = graphql_batch_size
+        self.show_readmes = show_readmes
+        self.do_pull_requests = do_pull_requests
+        self.resume_forks = resume_forks
+        self.status_store_path = status_store_path
+        self.fork_journal_path = fork_journal_path
+        self.fork_inventory_path = fork_inventory_path
+        self.pull_request_tracker_path = pull_request_tracker_path
+        self.num_processes = num_processes
+        self.readme_cache_path = readme_cache_path
+
+def read_apps_csv(path: str, first: int = 0,
+        last: Optional[int] = None) -> pd.DataFrame:
+    """Reads the apps from first up to last, like a slice, of a CSV with an
+    app_url column, with every url parsed once, up front, from the catalog
+    built from it. See `app_catalog`."""
+    return app_catalog.get_apps(path, first, last)
+
+def add_app_coords(apps: pd.DataFrame) -> pd.DataFrame:
+    """Adds owner, repo, branch and path columns parsed from the app urls,
+    unless the apps already have them."""
+    if 'owner' in apps.columns:
+        return apps
+    return apps.join(streamlit_github.parse_app_urls(apps.app_url))
+
+def coords_iter(apps: pd.DataFrame) -> Iterator[streamlit_github.GithubCoords]:
+    """Takes a list of apps and iterate over that list, yielding GithubCoord objects."""
+
+    if "app_url" in apps.columns:
+        apps = add_app_coords(apps)
+        for app in apps.itertuples():
+            if pd.isna(app.owner):
+                yield None, app.app_url
+            else:
+                coords = streamlit_github.GithubCoords(
+                    app.owner, app.repo, app.branch, app.path)
+                yield coords, app.app_url
+    else:
+        for app in apps.itertuples():
+            coords = streamlit_github.GithubCoords.from_github_url(app.github_url)
+            yield coords, app.github_url
+
+def get_repo_status(coords: streamlit_github.GithubCoords,
+        github: GithubMainClass.Github,
+        stored: Optional[status_store.StoredStatus]) -> Tuple[Optional[str], str]:
+    """Returns the repo's freshness fingerprint and a status string which
+    indicates whether the app has a badge or not and / or whether there was
+    an error processing the app for some reason. If the repo hasn't changed
+    since the stored status was computed, that status is reused."""
+
+    fingerprint = None
+    try:
+        # Get the repo.
+        repo = coords.get_repo(github)
+        if repo is None:
+            raise ForkAppError("Repo does not exist")
+
+        # Nothing to do if the repo hasn't changed since we last checked.
+        fingerprint = repo.freshness
+        if stored is not None and stored.fingerprint == fingerprint:
+            return fingerprint, stored.status
+
+        readme = streamlit_github.get_readme(github, repo)
+        if readme is None:
+            raise ForkAppError("Readme does not exist")
+
+        if repo.fork:
+            raise ForkAppError("Repo forks another.")
+
+        if streamlit_github.has_streamlit_badge(github, repo):
+            return fingerprint, "Has badge"
+        else:
+            return fingerprint, "No badge"
+    except ForkAppError as e:
+        return fingerprint, f"ForkAppError: {e.reason}"
+
+def check_repo(repo_key: Tuple[str, str], github: GithubMainClass.Github,
+        store: status_store.StatusStore) -> str:
+    """Returns the status string for a repo, only asking Github if the store
+    has no fresh status for it. This is safe to call from worker threads."""
+
+    owner, repo = repo_key
+    stored = store.get(owner, repo)
+    if stored is not None and stored.is_fresh():
+        return stored.status
+
+    coords = streamlit_github.GithubCoords(owner, repo, None, None)
+    fingerprint, repo_status = get_repo_status(coords, github, stored)
+    store.put(owner, repo, fingerprint, repo_status)
+    return repo_status
+
+def get_summary_status(summary: Optional[dict]) -> str:
+    """Returns the same status string as `get_repo_status` for a repo summary
+    from `github_graphql`, checking things in the same order."""
+    if summary is None:
+        return "ForkAppError: Repo does not exist"
+    elif summary['readme_path'] is None:
+        return "ForkAppError: Readme does not exist"
+    elif summary['fork']:
+        return "ForkAppError: Repo forks another."
+    elif badge_detector.find_badge(
+            (summary['readme_text'] or '').encode('utf-8')):
+        return "Has badge"
+    else:
+        return "No badge"
+
+def check_repos_graphql(repo_keys: List[Tuple[str, str]],
+        github: GithubMainClass.Github, batch_size: int,
+        store: status_store.StatusStore) -> Dict[Tuple[str, str], str]:
+    """Returns the same status strings as `check_repo` for each repo, but
+    looks up `batch_size` repos at a time with one GraphQL query each.
+    Each batch is stored as soon as it's done, so if a later one fails,
+    running again picks up where this left off."""
+
+    # Look up each missing or stale repo, in batches.
+    statuses = {repo_key: stored.status
+        for repo_key, stored in store.get_many(repo_keys).items()
+        if stored.is_fresh()}
+    repo_keys = [repo_key for repo_key in repo_keys if repo_key not in statuses]
+    for batch in github_graphql.iter_batches(repo_keys, batch_size):
+        summaries = github_graphql.get_batch_summaries(github, batch)
+        new_statuses = []
+        for (owner, repo), summary in summaries.items():
+            fingerprint = None
+            if summary is not None and summary['pushed_at'] is not None:
+                fingerprint = streamlit_github.format_freshness(
+                    summary['pushed_at'], summary['updated_at'])
+            statuses[owner, repo] = get_summary_status(summary)
+            new_statuses.append((owner, repo, fingerprint,
+                statuses[owner, repo]))
+        store.put_many(new_statuses)
+    return statuses
+
+def get_readme_message(coords: streamlit_github.GithubCoords,
+        options: BatchOptions,
+        github: GithubMainClass.Github) -> Tuple[str, str]:
+    """Returns a message with the readme of the app's repo. The repo or its
+    readme may have gone since its status was stored, in which case the
+    message is a warning which says so."""
+    repo = coords.get_repo(github)
+    if repo is None:
+        return "warning", "Repo no longer exists."
+    readme = streamlit_github.get_readme(github, repo)
+    if readme is None:
+        return "warning", "Readme no longer exists."
+    try:
+        contents = readme_cache.get_contents(repo.full_name, readme,
+            readme_cache.get_cache(options.readme_cache_path), github)
+    except UnknownObjectException:
+        return "warning", "Readme no longer exists."
+    return "text", contents.decode('utf-8')
+
+def compute_app_status(apps: pd.DataFrame, options: BatchOptions,
+        github: GithubMainClass.Github,
+        reporter: reporting.Reporter) -> pd.DataFrame:
+    """Adds a "status" column to the app DataFrame which indicates that
+    whether the app has a badge or not and / or whether there was an
+    error processing the app for some reason.
+
+    Many apps live in the same repo, so each unique repo is checked once and
+    its status is fanned back out to all of its apps. Statuses are kept per
+    repo in the status store, so only repos which are missing or stale cost
+    any API calls. With the REST backend, repos are checked concurrently by
+    `options.num_workers` threads. The GraphQL backend instead looks up
+    `options.graphql_batch_size` repos per request. Either way, the status
+    column doesn't depend on the order in which the lookups finish."""
+
+    # Work out which apps we can't even parse.
+    apps = add_app_coords(apps)
+    no_url = apps.app_url.isna() | (apps.app_url == "None")
+    unparsed = ~no_url & apps.owner.isna()
+    parsed = ~(no_url | unparsed)
+
+    # Github names are case insensitive, so lowercase them to find the
+    # unique repos, in the order they first appear.
+    repo_keys = list(zip(apps.owner[parsed].str.lower(),
+        apps.repo[parsed].str.lower()))
+    unique_repo_keys = list(dict.fromkeys(repo_keys))
+
+    store = status_store.get_store(options.status_store_path)
+    if options.status_backend == "GraphQL":
+        repo_statuses = check_repos_graphql(unique_repo_keys, github,
+            options.graphql_batch_size, store)
+    else:
+        # Almost all the time is spent waiting on Github, so threads suffice.
+        check = functools.partial(check_repo, github=github, store=store)
+        repo_statuses = {}
+        with concurrent.futures.ThreadPoolExecutor(options.num_workers) as executor:
+            for repo_key, repo_status in zip(unique_repo_keys,
+                    executor.map(check, unique_repo_keys)):
+                repo_statuses[repo_key] = repo_status
+                reporter.progress(len(repo_statuses), len(unique_repo_keys),
+                    "Checked repos")
+    reporter.progress(len(unique_repo_keys), len(unique_repo_keys),
+        "Checked repos")
+
+    # Fan the repo statuses back out to the apps.
+    status_column = pd.Series(None, index=apps.index, dtype=object)
+    status_column[no_url] = "ForkAppError: No URL"
+    status_column[unparsed] = "ForkAppError: Unable to parse URL"
+    status_column[parsed] = [repo_statuses[repo_key] for repo_key in repo_keys]
+
+    # Report the results in row order.
+    for app, app_status in zip(apps.itertuples(), status_column):
+        messages = [("info", f"app_status: '{app_status}'")]
+        if options.show_readmes and app_status in ("Has badge", "No badge"):
+            coords = streamlit_github.GithubCoords(
+                app.owner, app.repo, app.branch, app.path)
+            messages.append(get_readme_message(coords, options, github))
+        reporter.report_app(str(app.app_url), messages, app_status)
+    reporter.flush()
+
+    # Assign these new columns to the app DataFrame.
+    apps = apps.assign(status=status_column)
+    return apps
+
+# Where `insert_badge` put the badge.
+BADGE_IN_TITLE = "Badge in title"
+BADGE_PREPENDED = "Badge prepended"
+ALREADY_HAS_BADGE = "Already has badge"
+
+def insert_badge(readme_contents: bytes,
+        app_url: str) -> Tuple[str, Optional[str]]:
+    """Returns where the badge goes in the readme, i.e. BADGE_IN_TITLE,
+    BADGE_PREPENDED or ALREADY_HAS_BADGE, and the new contents, or None if
+    the readme already has a badge or app link. This doesn't touch Github
+    or the reporter, so it can run in a process pool."""
+
+    # Don't add the badge twice, or to a readme which already links to an app.
+    if badge_detector.find_badge(readme_contents):
+        return ALREADY_HAS_BADGE, None
+    readme_contents = readme_contents.decode('utf-8')
+
+    # Compute the badge location.
+    badge_image = "https://static.streamlit.io/badges/streamlit_badge_black_white.svg"
+    badge_markdown = f"[![Open in Streamlit]({badge_image})]({app_url})"
+
+    # Plan A is to add the badge to the end of the title readme, keeping the
+    # readme's line endings, but if that doesn't work, then we just prepend
+    # the badge to the beginning of the readme.
+    newline = '\r\n' if '\r\n' in readme_contents else '\n'
+    first_line, separator, rest = readme_contents.partition(newline)
+    if first_line.startswith('#') and '[' not in first_line and \
+            '\r' not in first_line:
+        return BADGE_IN_TITLE, f"{first_line} {badge_markdown}{separator}{rest}"
+    return BADGE_PREPENDED, f"{badge_markdown}{newline}{newline}{readme_contents}"
+
+def add_badge_to_readme(readme: ContentFile.ContentFile, app_url: str) -> str:
+    """Adds a Streamlit badge to the readme, and returns the new contents,
+    or None if it already has a badge."""
+    placement, new_contents = insert_badge(readme.decoded_content, app_url)
+    reporting.get_reporter().debug(f"Readme for {app_url}: {placement}")
+    return new_contents
+
+def get_readme_contents(coords: streamlit_github.GithubCoords,
+        github: GithubMainClass.Github, cache: readme_cache.ReadmeCache
+        ) -> Tuple[Optional[str], Optional[bytes], Optional[str]]:
+    """Returns the path and contents of the readme we would add a badge to,
+    or the status string saying why we wouldn't. This is safe to call from
+    worker threads, and doesn't write anything to Github."""
+    repo = coords.get_repo(github)
+    if repo is None:
+        return None, None, "ForkAppError: Repo does not exist"
+    if repo.fork:
+        return None, None, "ForkAppError: Repo forks another."
+    readme = streamlit_github.get_readme(github, repo)
+    if readme is None:
+        return None, None, "ForkAppError: Readme does not exist"
+    return readme.path, \
+        readme_cache.get_contents(repo.full_name, readme, cache, github), None
+
+def diff_readme(item: Tuple[str, str, str, bytes]) -> Tuple[str, str]:
+    """Takes the repo name, readme path, app url and readme contents, and
+    returns where the badge would go and the change as a unified diff. This
+    runs in a process pool, so it only takes and returns plain values."""
+    full_name, readme_path, app_url, contents = item
+    try:
+        placement, new_contents = insert_badge(contents, app_url)
+    except UnicodeDecodeError:
+        return "Readme is not UTF-8", ''
+    if new_contents is None:
+        return placement, ''
+    diff_lines = difflib.unified_diff(
+        contents.decode('utf-8').splitlines(keepends=True),
+        new_contents.splitlines(keepends=True),
+        f"a/{full_name}/{readme_path}", f"b/{full_name}/{readme_path}")
+
+    # Mark a missing final newline the way git does.
+    return placement, ''.join(line if line.endswith('\n')
+        else f"{line}\n\\ No newline at end of file\n" for line in diff_lines)
+
+def dry_run_badges(apps: pd.DataFrame, options: BatchOptions,
+        github: GithubMainClass.Github, reporter: reporting.Reporter,
+        diff_path: str) -> pd.DataFrame:
+    """Works out the badge we would add to each repo's readme without
+    forking anything, and writes every change to diff_path as a unified
+    diff. Returns a DataFrame with the app_url, owner, repo, readme_path and
+    outcome for each repo, and reports how many repos had each outcome.
+
+    Readmes are read across `options.num_workers` threads, from the readme
+    cache if we can, and only cost API calls for repos and readme listings
+    which aren't cached already. The badges are then inserted across
+    `options.num_processes` processes."""
+
+    # Each repo once, with the first app which points at it.
+    repos = {}
+    for coords, app_url in coords_iter(apps):
+        if coords is not None:
+            repo_key = coords.owner.lower(), coords.repo.lower()
+            repos.setdefault(repo_key, (coords, app_url))
+    repos = list(repos.values())
+
+    # Read the readmes.
+    cache = readme_cache.get_cache(options.readme_cache_path)
+    def get_readme_contents_safely(coords_and_url):
+        coords, _ = coords_and_url
+        try:
+            return get_readme_contents(coords, github, cache)
+        except Exception as e:
+            return None, None, f"Error: {e!r}"
+
+    readmes = []
+    with concurrent.futures.ThreadPoolExecutor(options.num_workers) as executor:
+        for readme in executor.map(get_readme_contents_safely, repos):
+            readmes.append(readme)
+            reporter.progress(len(readmes), len(repos), "Read readmes")
+
+    # Insert the badges.
+    items = [(f"{coords.owner}/{coords.repo}", readme_path, app_url, contents)
+        for (coords, app_url), (readme_path, contents, problem)
+        in zip(repos, readmes) if problem is None]
+    with concurrent.futures.ProcessPoolExecutor(options.num_processes) \
+            as executor:
+        diffs = iter(list(executor.map(diff_readme, items, chunksize=64)))
+
+    # Write the report, keeping each readme's line endings.
+    rows = []
+    with open(diff_path, 'w', encoding='utf-8', newline='') as diff_file:
+        for (coords, app_url), (readme_path, _, problem) in zip(repos, readmes):
+            outcome = problem
+            if problem is None:
+                outcome, diff = next(diffs)
+                diff_file.write(diff)
+            rows.append((app_url, coords.owner, coords.repo, readme_path,
+                outcome))
+    results = pd.DataFrame(rows,
+        columns=['app_url', 'owner', 'repo', 'readme_path', 'outcome'])
+    for outcome, count in results.outcome.value_counts().items():
+        reporter.info(f"{count} repos: {outcome}")
+    reporter.info(f"Wrote the changes to `{diff_path}`.")
+    reporter.flush()
+    return results
+
+# Github's secondary rate limits punish bursts of content creation, so each
+# kind of write gets its own concurrency limit and spacing. Waiting for forks
+# to become readable isn't limited, so many forks can be pending while other
+# repos are committing or opening pull requests.
+FORK_STAGE_LIMIT = github_rate_limit.StageLimit(2, 1.0)
+COMMIT_STAGE_LIMIT = github_rate_limit.StageLimit(1, 1.0)
+PULL_REQUEST_STAGE_LIMIT = github_rate_limit.StageLimit(1, 1.0)
+
+@github_metrics.helper
+def fork_app(coords: streamlit_github.GithubCoords, app_url: str,
+        github: GithubMainClass.Github, do_pull_requests: bool,
+        journal: fork_journal.ForkJournal,
+        inventory: fork_inventory.ForkInventory,
+        tracker: pull_request_tracker.PullRequestTracker,
+        resume: bool) -> List[Tuple[str, str]]:
+    """Forks this app's repo, adds a badge to the readme and issues a pull
+    request. This is safe to call from worker threads. Returns what happened
+    as a list of (level, message) pairs for `Reporter.report_app`.
+
+    Each finished stage is recorded in the journal. If resume is True, we
+    skip any stages which the journal says already finished. Forks which
+    the inventory already has are reused rather than created again, and
+    pull requests we open are recorded in the tracker, which we check so
+    that we never open a second one on the same repo."""
+    messages = []
+    if coords is None:
+        return [("error", "Unable to parse URL")]
+    if resume:
+        state = journal.get(coords.owner, coords.repo)
+    else:
+        state = fork_journal.RepoJournal()
+    if state.is_finished(fork_journal.PULL_REQUEST_OPENED):
+        pull_request_url = \
+            state.finished[fork_journal.PULL_REQUEST_OPENED]['pull_request_url']
+        return [("success", f"Already opened {pull_request_url}")]
+
+    def record(stage, **details):
+        journal.record(coords.owner, coords.repo, app_url, stage, **details)
+
+    # Don't open a second pull request, even if the journal has forgotten
+    # the first one.
+    pull_request_url = do_pull_requests and \
+        tracker.get_open_url(f"{coords.owner}/{coords.repo}")
+    if pull_request_url:
+        record(fork_journal.PULL_REQUEST_OPENED,
+            pull_request_url=pull_request_url)
+        return [("success", f"Already opened {pull_request_url}")]
+
+    stage = fork_journal.FORKED
+    try:
+        # Fork the repo.
+        messages.append(("info", f"App to fork: `{coords}`"))
+        repo = coords.get_repo(github)
+        if repo is None:
+            raise ForkAppError("Repo does not exist")
+        if state.is_finished(fork_journal.FORKED):
+            fork_name = state.finished[fork_journal.FORKED]['fork']
+            messages.append(("info", f"Forked `{fork_name}` in an earlier run."))
+        if not state.is_finished(fork_journal.BADGE_COMMITTED):
+            try:
+                fork = streamlit_github.fork_repo(github, repo, inventory,
+                    FORK_STAGE_LIMIT)
+            except streamlit_github.ForkOutOfDate as e:
+                raise ForkAppError(f"Fork `{e.fork_name}` couldn't be synced "
+                    "with the repo.")
+            forked_repo = fork.get_repo(github)
+            fork_name = fork.full_name
+            if not state.is_finished(fork_journal.FORKED):
+                record(fork_journal.FORKED, fork=fork_name)
+
+            # Add a badge to the readme.
+            stage = fork_journal.BADGE_COMMITTED
+            messages.append(("info", f"Fork: `{fork.key}`"))
+            # The listing has no contents, so we ask for the readme itself,
+            # and commit on top of exactly that version of it.
+            readme = streamlit_github.get_readme(github, fork)
+            if readme is None:
+                raise ForkAppError("Readme does not exist")
+            readme = forked_repo.get_contents(readme.path)
+            new_contents = add_badge_to_readme(readme, app_url)
+            if new_contents is None:
+                messages.append(("warning", "No extra commit since badge already exists."))
+            else:
+                with COMMIT_STAGE_LIMIT.slot():
+                    forked_repo.update_file(readme.path, COMMIT_MESSAGE,
+                            new_contents, readme.sha)
+                inventory.mark_pushed(fork_name)
+                messages.append(("success", "Just added a badge to the readme."))
+            record(fork_journal.BADGE_COMMITTED,
+                committed=(new_contents is not None))
+
+        # If we haven't allowed pull requesting, then nothing more to do.
+        if not do_pull_requests:
+            messages.append(("warning", "Skipping this pull request."))
+            return messages
+
+        # Create a pull request
+        stage = fork_journal.PULL_REQUEST_OPENED
+        fork_owner = fork_name.split('/')[0]
+        pull_request_args = {
+            'title': BADGE_PULL_REQUEST_TITLE,
+            'head': f"{fork_owner}:{repo.default_branch}",
+            'base': repo.default_branch,
+            'body': BADGE_PULL_REQUEST_BODY,
+        }
+        try:
+            with PULL_REQUEST_STAGE_LIMIT.slot():
+                pull_request = repo.get_repo(github).create_pull(
+                    **pull_request_args)
+            messages.append(("success",
+                f"Created pull request {pull_request.html_url}"))
+            tracker.record_opened(pull_request.html_url, repo.full_name,
+                pull_request.number, app_url, pull_request.title,
+                pull_request.created_at)
+            record(fork_journal.PULL_REQUEST_OPENED,
+                pull_request_url=pull_request.html_url)
+        except GithubException as e:
+            messages.append(("error",
+                f"Error creating the pull request: {json.dumps(e.data)}"))
+            journal.record_failure(coords.owner, coords.repo, app_url, stage,
+                json.dumps(e.data))
+        return messages
+    except Exception as e:
+        journal.record_failure(coords.owner, coords.repo, app_url, stage,
+            repr(e))
+        raise
+
+def batch_fork_repos(apps: pd.DataFrame, options: BatchOptions,
+        github: GithubMainClass.Github, reporter: reporting.Reporter) -> None:
+    """Goes through a list of apps and forks them all and then
+    add badges to them and issues pull requests.
+
+    Each repo is only handled once, for the first of its apps, and what
+    happened is reported for all of them. The repos are pipelined across
+    `options.num_workers` threads, with each
+    stage limited separately, so slow steps like waiting for a fork to
+    become readable overlap with other repos' commits and pull requests.
+    Every stage is recorded in the fork journal, so an interrupted run can
+    resume where it left off, and the bot's existing forks are reused."""
+
+    journal = fork_journal.get_journal(options.fork_journal_path)
+
+    # Catch up on the bot's forks, so we can reuse them.
+    inventory = fork_inventory.get_inventory(options.fork_inventory_path)
+    num_forks = inventory.refresh(github)
+    reporter.debug(f"Refreshed {num_forks} of {len(inventory)} known forks.")
+    tracker = pull_request_tracker.get_tracker(
+        options.pull_request_tracker_path)
+    if options.do_pull_requests:
+        num_pulls = tracker.refresh(github)
+        reporter.debug(f"Refreshed {num_pulls} pull requests.")
+
+    def fork_app_safely(coords_and_url):
+        coords, app_url = coords_and_url
+        try:
+            return fork_app(coords, app_url, github, options.do_pull_requests,
+                journal, inventory, tracker, options.resume_forks)
+        except Exception as e:
+            return [("error", f"Failed to fork `{app_url}`: {e!r}")]
+
+    # Many apps live in the same repo, which we only fork, badge and pull
+    # request once, for the first of its apps. Github names are case
+    # insensitive, so we lowercase them to find the unique repos.
+    apps_coords = list(coords_iter(apps))
+    repo_apps = {}
+    for i, (coords, app_url) in enumerate(apps_coords):
+        repo_key = i if coords is None else \
+            (coords.owner.lower(), coords.repo.lower())
+        repo_apps.setdefault(repo_key, []).append(i)
+    first_apps = [apps_coords[app_indices[0]]
+        for app_indices in repo_apps.values()]
+
+    with concurrent.futures.ThreadPoolExecutor(options.num_workers) as executor:
+        all_messages = executor.map(fork_app_safely, first_apps)
+
+        # Report the results as they finish, in order, for every app in
+        # each repo.
+        num_reported = 0
+        for app_indices, messages in zip(repo_apps.values(), all_messages):
+            first_app_url = apps_coords[app_indices[0]][1]
+            reporter.report_app(first_app_url, messages)
+            for i in app_indices[1:]:
+                reporter.report_app(apps_coords[i][1], [("info",
+                    f"Same repo as `{first_app_url}`."), *messages])
+            num_reported += len(app_indices)
+            reporter.progress(num_reported, len(apps), "Forked apps")
+    reporter.flush()
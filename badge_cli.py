@@ -0,0 +1,198 @@
+"""Runs the badge bot from the command line, without a Streamlit server,
+e.g. from a cron job.
+
+    python badge_cli.py status sharing_apps_2.csv --output statuses.csv
+    python badge_cli.py fork statuses.csv --dry-run badges.diff
+    python badge_cli.py fork statuses.csv --pull-requests
+    python badge_cli.py prs --retitle
+    python badge_cli.py track
+"""
+
+import argparse
+import logging
+import os
+import sys
+import pandas as pd
+import badge_batch
+import bulk_pull_requests
+import fork_journal
+import github_bot
+import github_graphql
+import github_completion
+import github_metrics
+import github_token_pool
+import pull_request_tracker
+import reporting
+import streamlit_github
+
+def parse_args(args):
+    """Parses the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--token', default=os.environ.get('GITHUB_TOKEN'),
+        help="Github access token. Defaults to $GITHUB_TOKEN.")
+    parser.add_argument('--read-tokens',
+        default=os.environ.get('GITHUB_READ_TOKENS'),
+        help="More access tokens, separated by commas, to spread reads over. "
+            "Writes always use --token. Defaults to $GITHUB_READ_TOKENS.")
+    parser.add_argument('--lazy-calls', choices=github_completion.MODES,
+        default=github_completion.ALLOW,
+        help="Whether to allow, warn about or forbid the API calls PyGithub "
+            "makes to complete objects when we read a field they lack.")
+    parser.add_argument('--workers', type=int, default=8,
+        help="How many threads talk to Github at once.")
+    parser.add_argument('--quiet', action='store_true',
+        help="Don't report anything.")
+    parser.add_argument('-v', '--verbose', action='store_true',
+        help="Also report debug messages.")
+    parser.add_argument('--metrics-json',
+        help="Write API call metrics here as JSON when done.")
+    parser.add_argument('--metrics-prom',
+        help="Write API call metrics here in the Prometheus text format.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    status_parser = subparsers.add_parser('status',
+        help="Work out which apps have badges.")
+    status_parser.add_argument('apps_csv', help="A CSV with an app_url column.")
+    status_parser.add_argument('--output',
+        help="Where to write the apps with their status, as a CSV.")
+    status_parser.add_argument('--backend', choices=['REST', 'GraphQL'],
+        default='REST')
+    status_parser.add_argument('--batch-size', type=int,
+        default=github_graphql.MAX_BATCH_SIZE,
+        help="How many repos to look up per GraphQL query.")
+    status_parser.add_argument('--first', type=int, default=0,
+        help="The index of the first app to check.")
+    status_parser.add_argument('--last', type=int, default=None,
+        help="The index after the last app to check.")
+
+    fork_parser = subparsers.add_parser('fork',
+        help="Fork apps and add badges to their READMEs.")
+    fork_parser.add_argument('apps_csv', nargs='?',
+        help="A CSV with an app_url column. If it has a status column, "
+        "only apps with no badge are forked.")
+    fork_parser.add_argument('--pull-requests', action='store_true',
+        help="Also open pull requests.")
+    fork_parser.add_argument('--no-resume', action='store_true',
+        help="Ignore the fork journal and redo every stage.")
+    fork_parser.add_argument('--replay-failed', action='store_true',
+        help="Fork the apps which failed in the journal instead.")
+    fork_parser.add_argument('--dry-run', metavar='DIFF',
+        help="Don't fork anything. Instead write the badges we would add "
+        "here, as a unified diff.")
+    fork_parser.add_argument('--processes', type=int, default=None,
+        help="How many processes insert badges in a dry run. Defaults to "
+        "one per CPU.")
+    prs_parser = subparsers.add_parser('prs',
+        help="Fix the bot's pull requests in bulk.")
+    prs_parser.add_argument('--title',
+        default=badge_batch.OLD_BADGE_PULL_REQUEST_TITLE,
+        help="Only change pull requests with exactly this title. Defaults to "
+        "the old, misspelled title.")
+    prs_parser.add_argument('--state', choices=['open', 'closed', 'all'],
+        default='open')
+    prs_parser.add_argument('--retitle', action='store_true',
+        help="Give them the current pull request title.")
+    prs_parser.add_argument('--update-body', action='store_true',
+        help="Give them the current pull request body.")
+    prs_parser.add_argument('--close', action='store_true',
+        help="Close them.")
+    prs_parser.add_argument('--output',
+        help="Where to write what happened to each pull request, as a CSV.")
+
+    track_parser = subparsers.add_parser('track',
+        help="Refresh which of our pull requests were merged.")
+    track_parser.add_argument('--output',
+        help="Where to write every pull request we track, as a CSV.")
+
+    users_parser = subparsers.add_parser('users',
+        help="Find the Github users for a list of emails.")
+    users_parser.add_argument('emails_csv', help="A CSV with an email column.")
+    users_parser.add_argument('--output',
+        help="Where to write the users, as a CSV.")
+    return parser.parse_args(args)
+
+def main(args=None):
+    """Execution starts here."""
+    args = parse_args(sys.argv[1:] if args is None else args)
+    logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s',
+        level=(logging.DEBUG if args.verbose else logging.INFO))
+    if args.quiet:
+        reporting.set_reporter(reporting.NullReporter())
+    reporter = reporting.get_reporter()
+    read_tokens = github_token_pool.parse_tokens(args.read_tokens)
+    github = streamlit_github.make_github(args.token, read_tokens=read_tokens)
+    github_completion.set_mode(args.lazy_calls)
+
+    if args.command == 'status':
+        options = badge_batch.BatchOptions(num_workers=args.workers,
+            status_backend=args.backend, graphql_batch_size=args.batch_size)
+        apps = badge_batch.read_apps_csv(args.apps_csv, args.first, args.last)
+        apps = badge_batch.compute_app_status(apps, options, github, reporter)
+        if args.output:
+            apps.to_csv(args.output, index=False)
+        for status, count in apps.status.value_counts().items():
+            reporter.info(f"{count} apps: {status}")
+    elif args.command == 'prs':
+        bot = github_bot.GitHubBot(args.token, read_tokens=read_tokens)
+        pull_requests = bulk_pull_requests.find_pull_requests(bot.github,
+            args.title, state=args.state)
+        reporter.info(f"Found {len(pull_requests)} pull requests.")
+        if args.retitle or args.update_body or args.close:
+            results = bulk_pull_requests.edit_pull_requests(bot, pull_requests,
+                title=(badge_batch.BADGE_PULL_REQUEST_TITLE
+                    if args.retitle else None),
+                body=(badge_batch.BADGE_PULL_REQUEST_BODY
+                    if args.update_body else None),
+                close=args.close, num_workers=args.workers)
+            pull_requests = pull_requests.join(
+                results.set_index('key')[['status', 'result', 'error']],
+                on='url')
+        if args.output:
+            pull_requests.to_csv(args.output, index=False)
+    elif args.command == 'track':
+        tracker = pull_request_tracker.get_tracker()
+        num_changed = tracker.refresh(github)
+        reporter.info(f"{num_changed} pull requests changed.")
+        for cohort in tracker.get_cohorts().itertuples():
+            reporter.info(f"{cohort.cohort}: {cohort.opened} opened, "
+                f"{cohort.open} open, {cohort.merged} merged, "
+                f"{cohort.closed} closed.")
+        if args.output:
+            tracker.to_frame().to_csv(args.output, index=False)
+    elif args.command == 'users':
+        emails = pd.read_csv(args.emails_csv).email
+        users = streamlit_github.get_users_from_emails(github, emails)
+        if args.output:
+            users.to_csv(args.output, index=False)
+        for status, count in users.status.value_counts().items():
+            reporter.info(f"{count} emails: {status}")
+    else:
+        options = badge_batch.BatchOptions(num_workers=args.workers,
+            do_pull_requests=args.pull_requests,
+            resume_forks=(not args.no_resume), num_processes=args.processes)
+        if args.replay_failed:
+            apps = fork_journal.get_journal().get_failed_apps()
+        elif args.apps_csv:
+            apps = badge_batch.read_apps_csv(args.apps_csv)
+            if 'status' in apps.columns:
+                apps = apps[apps.status == "No badge"]
+        else:
+            sys.exit("Either give an apps CSV or --replay-failed.")
+        if args.dry_run:
+            reporter.info(f"Dry run for {len(apps)} apps.")
+            badge_batch.dry_run_badges(apps, options, github, reporter,
+                args.dry_run)
+        else:
+            reporter.info(f"Forking {len(apps)} apps.")
+            badge_batch.batch_fork_repos(apps, options, github, reporter)
+
+    metrics = github_metrics.get_metrics()
+    if args.metrics_json:
+        with open(args.metrics_json, 'w') as metrics_file:
+            metrics_file.write(metrics.to_json())
+    if args.metrics_prom:
+        with open(args.metrics_prom, 'w') as metrics_file:
+            metrics_file.write(metrics.to_prometheus())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Finds Streamlit badges and app links in READMEs, reading as little as we can.
+
+READMEs link to Streamlit apps in several ways: our badges in any color, the
+shields.io badges people make themselves, and plain links to the app. Any
+of them means the README doesn't need our pull request. We look for all of
+them in one pass over the raw bytes, and fetch the raw README in ranges,
+starting with the top where badges usually are, stopping at the first match.
+"""
+
+import re
+import requests
+import github_transport
+from github import ContentFile
+from typing import Callable, Iterator, Optional
+
+# Every kind of badge or app link, as a named group.
+BADGE_PATTERN = re.compile(
+    rb'(?P<streamlit_badge>static\.streamlit\.io/badges/streamlit_badge_)'
+    rb'|(?P<shields_badge>img\.shields\.io/[^\s)"\'>]{0,200}?streamlit)'
+    rb'|(?P<app_link>share\.streamlit\.io/[\w\-]'
+    rb'|[\w\-]+\.streamlit(?:app\.com|\.app)\b)',
+    re.IGNORECASE)
+
+# The longest match we need to see whole, which is how much of each chunk
+# we keep to find matches which straddle two chunks.
+MAX_MATCH_BYTES = 256
+
+# We first fetch this much of the README, then the rest in bigger chunks.
+FIRST_CHUNK_BYTES = 8 * 1024
+CHUNK_BYTES = 64 * 1024
+
+# How long to wait for the raw README.
+TIMEOUT_SECONDS = 10.0
+
+def find_badge(contents: bytes) -> Optional[str]:
+    """Returns which kind of badge or app link is in the contents, i.e.
+    'streamlit_badge', 'shields_badge' or 'app_link', or None."""
+    match = BADGE_PATTERN.search(contents)
+    return match and match.lastgroup
+
+class BadgeScanner:
+    """Finds badges in contents which arrive a chunk at a time."""
+
+    def __init__(self) -> None:
+        """Constructor."""
+        self.badge = None
+        self.bytes_scanned = 0
+        self._tail = b''
+
+    def feed(self, chunk: bytes) -> Optional[str]:
+        """Scans the next chunk, and returns the kind of badge once found."""
+        if self.badge is None:
+            self.bytes_scanned += len(chunk)
+            data = self._tail + chunk
+            self.badge = find_badge(data)
+            self._tail = data[-MAX_MATCH_BYTES:]
+        return self.badge
+
+def _iter_raw_chunks(download_url: str) -> Iterator[bytes]:
+    """Yields the raw file a chunk at a time. The first chunk is a ranged
+    read, and the rest is streamed, so the caller can stop early."""
+    session = github_transport.get_session()
+    response = session.get(download_url, timeout=TIMEOUT_SECONDS,
+        headers={'Range': f'bytes=0-{FIRST_CHUNK_BYTES - 1}'}, stream=True)
+    with response:
+        response.raise_for_status()
+        yield from response.iter_content(CHUNK_BYTES)
+        if response.status_code != 206:
+            # The server sent the whole file.
+            return
+        content_range = response.headers.get('Content-Range', '')
+        total_bytes = content_range.rpartition('/')[2]
+        if not total_bytes.isdigit() or int(total_bytes) <= FIRST_CHUNK_BYTES:
+            return
+    response = session.get(download_url, timeout=TIMEOUT_SECONDS,
+        headers={'Range': f'bytes={FIRST_CHUNK_BYTES}-'}, stream=True)
+    with response:
+        response.raise_for_status()
+        yield from response.iter_content(CHUNK_BYTES)
+
+def scan_readme(readme: ContentFile.ContentFile,
+        read_contents: Callable[[], bytes]) -> Optional[str]:
+    """Returns which kind of badge or app link is in the README, or None.
+    This reads the raw file, which doesn't count against the API rate
+    limit, and only as far as the first match. If the raw file can't be
+    read, we fall back to read_contents, e.g. through the contents API."""
+    scanner = BadgeScanner()
+    try:
+        if readme.download_url:
+            for chunk in _iter_raw_chunks(readme.download_url):
+                if scanner.feed(chunk):
+                    break
+            return scanner.badge
+    except requests.RequestException:
+        pass
+    return find_badge(read_contents())
@@ -0,0 +1,244 @@
+"""Benchmarks the badge bot against `fake_github`, a local stand-in for the
+Github API, so performance changes show up as numbers without spending any
+real rate limit.
+
+    python benchmark.py --sizes 100 1000 10000 --latency 0.02
+
+For each catalog size this checks every app's status cold, then again with
+everything cached, then with a new status store but warm HTTP and Streamlit
+caches, then cold with the GraphQL backend, which must agree. Then it does a dry run of adding badges to every app, cold and
+warm, and finally forks a few apps, then forks them again with a new fork
+journal, which should reuse the forks. Each scenario reports wall time, API
+calls per app, kilobytes sent and calls per endpoint.
+
+PyGithub's hidden calls to complete objects are forbidden by default, and
+the status and dry run scenarios must make exactly the API calls we expect,
+or the benchmark fails. Pass --tokens to
+spread reads over several access tokens, each with its own rate limits.
+"""
+
+import argparse
+import json
+import os
+import secrets
+import sys
+import tempfile
+import time
+import pandas as pd
+import badge_batch
+import fake_github
+import github_completion
+import github_graphql
+import github_metrics
+import github_rate_limit
+import reporting
+import streamlit_github
+
+# The catalog sizes we benchmark by default.
+SIZES = [100, 1000, 10000]
+
+# The rate limit resources whose sleeps we report.
+RESOURCES = ['core', 'search', 'graphql']
+
+# Raw file reads, which don't count against the rate limit.
+RAW_ENDPOINT = 'GET /raw/'
+
+def parse_args(args):
+    """Parses the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES,
+        help="How many apps are in each catalog.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.0,
+        help="Seconds the fake server takes per response.")
+    parser.add_argument('--page-size', type=int, default=30)
+    parser.add_argument('--core-limit', type=int, default=1000000,
+        help="Core calls allowed per rate limit window before 403s.")
+    parser.add_argument('--window', type=float, default=3600.0,
+        help="Seconds per rate limit window.")
+    parser.add_argument('--tokens', type=int, default=1,
+        help="How many access tokens to spread reads over, each with its "
+            "own rate limits.")
+    parser.add_argument('--fork-ready', type=float, default=0.0,
+        help="Seconds before a new fork can be read.")
+    parser.add_argument('--fork-apps', type=int, default=10,
+        help="How many apps without badges to fork in each catalog.")
+    parser.add_argument('--lazy-calls', choices=github_completion.MODES,
+        default=github_completion.FORBID,
+        help="Whether to allow, warn about or forbid the API calls PyGithub "
+            "makes to complete objects when we read a field they lack.")
+    parser.add_argument('--json', help="Also write the results here.")
+    parser.add_argument('-v', '--verbose', action='store_true',
+        help="Show what the bot reports while it runs.")
+    return parser.parse_args(args)
+
+def get_api_calls(calls):
+    """Counts the calls which aren't raw file reads, i.e. the ones which
+    count against the rate limit."""
+    return sum(count for endpoint, count in calls.items()
+        if not endpoint.startswith(RAW_ENDPOINT))
+
+def get_expected_status_calls(apps, data):
+    """Returns how many API calls a cold status pass should make: one to
+    snapshot each repo, and one to list the files of each which exists."""
+    coords = badge_batch.add_app_coords(apps).dropna(subset=['owner'])
+    repo_keys = set(zip(coords.owner.str.lower(), coords.repo.str.lower()))
+    return sum(1 + (data.get_repo(owner, repo) is not None)
+        for owner, repo in repo_keys)
+
+def get_expected_graphql_calls(apps, data):
+    """Returns how many queries a cold GraphQL status pass should make: one
+    per batch of repos, and one more for a batch with any READMEs whose
+    names we don't ask for up front."""
+    coords = badge_batch.add_app_coords(apps).dropna(subset=['owner'])
+    repo_keys = list(dict.fromkeys(zip(coords.owner.str.lower(),
+        coords.repo.str.lower())))
+    def has_unusual_readme(owner, repo):
+        fake_repo = data.get_repo(owner, repo)
+        return fake_repo is not None and any(path.lower() == 'readme.md'
+            and path not in github_graphql.COMMON_README_NAMES
+            for path in fake_repo.files)
+    return sum(1 + any(has_unusual_readme(owner, repo) for owner, repo in batch)
+        for batch in github_graphql.iter_batches(repo_keys))
+
+def run_scenario(name, num_apps, server, func, expected_calls=None):
+    """Runs func, and returns a dict of how long it took and which API
+    calls it made, and how many we expected it to make, if we know."""
+    server.reset_counts()
+    github_metrics.get_metrics().reset()
+    github_completion.reset()
+    slept = sum(budget.seconds_slept for r in RESOURCES
+        for budget in github_rate_limit.get_budgets(r))
+    start = time.time()
+    func()
+    wall_seconds = time.time() - start
+    slept = sum(budget.seconds_slept for r in RESOURCES
+        for budget in github_rate_limit.get_budgets(r)) - slept
+    calls, statuses = server.get_counts()
+    total_calls = sum(calls.values())
+    bytes_sent = server.get_bytes_sent()
+    return {
+        'apps': num_apps,
+        'scenario': name,
+        'wall_seconds': round(wall_seconds, 3),
+        'calls': total_calls,
+        'calls_per_app': round(total_calls / max(num_apps, 1), 3),
+        'api_calls': get_api_calls(calls),
+        'expected_calls': expected_calls,
+        'lazy_calls': sum(github_completion.get_completions().values()),
+        'not_modified': statuses[304],
+        'rate_limited': statuses[403],
+        'seconds_slept': round(slept, 3),
+        'kb_sent': round(sum(bytes_sent.values()) / 1024, 1),
+        'endpoints': dict(calls.most_common()),
+        'helpers': github_metrics.get_metrics().snapshot()['helpers'],
+    }
+
+def benchmark_catalog(num_apps, args, work_dir):
+    """Runs every scenario against a fresh catalog and server."""
+    # A new owner prefix keeps Streamlit's caches from mixing up catalogs.
+    owner_prefix = f"bench{secrets.token_hex(3)}-user"
+    apps, data = fake_github.make_catalog(num_apps, args.seed, owner_prefix)
+    server_options = fake_github.FakeGithubOptions(
+        latency_seconds=args.latency, page_size=args.page_size,
+        core_limit=args.core_limit, window_seconds=args.window,
+        fork_ready_seconds=args.fork_ready)
+    reporter = reporting.get_reporter()
+
+    def path(name):
+        return os.path.join(work_dir, f"{owner_prefix}_{name}")
+
+    results = []
+    with fake_github.FakeGithubServer(data, server_options) as server:
+        read_tokens = [f'token{i}' for i in range(1, args.tokens)]
+        github = streamlit_github.make_github('token', base_url=server.url,
+            read_tokens=read_tokens, cache_path=path('http_cache.sqlite'))
+        options = badge_batch.BatchOptions(num_workers=args.workers,
+            do_pull_requests=True,
+            status_store_path=path('app_status.sqlite'),
+            fork_journal_path=path('fork_journal.jsonl'),
+            readme_cache_path=path('readme_cache.sqlite'),
+            fork_inventory_path=path('fork_inventory.sqlite'),
+            pull_request_tracker_path=path('pull_requests.sqlite'))
+
+        statuses = {}
+        def check_statuses():
+            statuses['apps'] = badge_batch.compute_app_status(apps, options,
+                github, reporter)
+        results.append(run_scenario('status (cold)', num_apps, server,
+            check_statuses, get_expected_status_calls(apps, data)))
+        results.append(run_scenario('status (warm)', num_apps, server,
+            check_statuses, 0))
+        options.status_store_path = path('app_status_2.sqlite')
+        results.append(run_scenario('status (new store)', num_apps, server,
+            check_statuses, 0))
+
+        # The GraphQL backend must find the same statuses.
+        rest_statuses = statuses['apps'].status
+        options.status_store_path = path('app_status_graphql.sqlite')
+        options.status_backend = "GraphQL"
+        results.append(run_scenario('status (GraphQL)', num_apps, server,
+            check_statuses, get_expected_graphql_calls(apps, data)))
+        options.status_backend = "REST"
+        if not statuses['apps'].status.equals(rest_statuses):
+            raise RuntimeError("The GraphQL and REST statuses differ.")
+
+        dry_run = lambda: badge_batch.dry_run_badges(apps, options, github,
+            reporter, path('badges.diff'))
+        results.append(run_scenario('dry run (cold)', num_apps, server,
+            dry_run, 0))
+        results.append(run_scenario('dry run (warm)', num_apps, server,
+            dry_run, 0))
+
+        apps_to_fork = statuses['apps']
+        apps_to_fork = apps_to_fork[apps_to_fork.status == "No badge"]
+        apps_to_fork = apps_to_fork[:args.fork_apps]
+        fork = lambda: badge_batch.batch_fork_repos(apps_to_fork, options,
+            github, reporter)
+        results.append(run_scenario('fork', len(apps_to_fork), server, fork))
+        options.fork_journal_path = path('fork_journal_2.jsonl')
+        results.append(run_scenario('fork (new journal)', len(apps_to_fork),
+            server, fork))
+    return results
+
+def main(args=None):
+    """Execution starts here."""
+    args = parse_args(sys.argv[1:] if args is None else args)
+    if not args.verbose:
+        reporting.set_reporter(reporting.NullReporter())
+    github_completion.install()
+    github_completion.set_mode(args.lazy_calls)
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for num_apps in args.sizes:
+            results.extend(benchmark_catalog(num_apps, args, work_dir))
+
+    summary = pd.DataFrame(results).drop(columns=['endpoints', 'helpers'])
+    print(summary.to_string(index=False))
+    for result in results:
+        print(f"\n{result['apps']} apps, {result['scenario']}:")
+        for endpoint, count in result['endpoints'].items():
+            print(f"  {count:8d}  {endpoint}")
+        for helper, counts in result['helpers'].items():
+            cache_hits = counts.get('cache_hits')
+            cache_hits = '' if cache_hits is None else f" ({cache_hits} cache hits)"
+            print(f"  {counts['calls']:8d}  {helper}(){cache_hits}")
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump(results, json_file, indent=2)
+
+    # Fail if any scenario made calls we didn't expect.
+    unexpected = [result for result in results
+        if result['expected_calls'] is not None and
+            result['api_calls'] != result['expected_calls']]
+    for result in unexpected:
+        print(f"\n{result['apps']} apps, {result['scenario']}: made "
+            f"{result['api_calls']} API calls, expected "
+            f"{result['expected_calls']}.")
+    if unexpected:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""Finds and edits the bot's pull requests in bulk.
+
+Finding the bot's pull requests by walking every forked repo costs several
+core calls per repo. Instead we find them all with the issue search API
+(`is:pr author:<bot> in:title`), 100 per page, splitting the search by
+creation date whenever it has more than the 1000 results Github returns.
+The matching pull requests are then edited through `GitHubBot.map`, with
+paced writes, and every edit is stored in `map_results`, so re-running a
+cleanup only touches the pull requests which weren't done yet.
+See: https://docs.github.com/en/rest/reference/search#search-issues-and-pull-requests
+"""
+
+import datetime
+import math
+import pandas as pd
+import github_rate_limit
+import reporting
+import streamlit_github
+from github import MainClass as GithubMainClass
+from github_bot import GitHubBot
+from typing import Iterator, List, Optional, Tuple
+
+# Github returns at most this many results for any one search.
+MAX_RESULTS = 1000
+
+# The most results Github returns per page.
+PAGE_SIZE = 100
+
+# No pull request of ours was created before this.
+FIRST_DATE = datetime.date(2020, 1, 1)
+
+# Editing pull requests counts as content creation for Github's secondary
+# rate limits, which allow roughly 80 such writes a minute.
+EDIT_LIMIT = github_rate_limit.StageLimit(4, 0.75)
+
+# The columns of the DataFrame returned by `find_pull_requests`.
+PULL_REQUEST_COLUMNS = ['url', 'repo', 'number', 'title', 'body', 'state',
+    'created_at']
+
+def _search_page(github: GithubMainClass.Github, query: str,
+        page: int) -> Tuple[int, List[dict]]:
+    """Returns the total count and the items on one page of results."""
+    requester = github._Github__requester
+    _, response = requester.requestJsonAndCheck('GET', '/search/issues',
+        parameters={'q': query, 'per_page': PAGE_SIZE, 'page': page,
+            'sort': 'created', 'order': 'asc'})
+    return response['total_count'], response['items']
+
+def search_issues(github: GithubMainClass.Github, query: str,
+        dates: Optional[Tuple[datetime.date, datetime.date]] = None
+        ) -> Iterator[dict]:
+    """Yields every result of this issue search created between these dates,
+    which default to every date we could have opened pull requests on,
+    splitting the dates in two while there are too many results."""
+    # Github's creation dates are in UTC, which can be a day ahead of ours.
+    dates = dates or (FIRST_DATE,
+        datetime.datetime.now(datetime.timezone.utc).date())
+    low, high = dates
+    dated_query = f"{query} created:{low.isoformat()}..{high.isoformat()}"
+    total_count, items = _search_page(github, dated_query, 1)
+    if total_count > MAX_RESULTS:
+        if low < high:
+            middle = low + (high - low) // 2
+            yield from search_issues(github, query, (low, middle))
+            yield from search_issues(github, query,
+                (middle + datetime.timedelta(days=1), high))
+            return
+        reporting.get_reporter().warning(f"Only the first {MAX_RESULTS} of "
+            f"{total_count} results are available for `{dated_query}`.")
+
+    yield from items
+    num_pages = math.ceil(min(total_count, MAX_RESULTS) / PAGE_SIZE)
+    for page in range(2, num_pages + 1):
+        _, items = _search_page(github, dated_query, page)
+        if not items:
+            break
+        yield from items
+
+def find_pull_requests(github: GithubMainClass.Github, title: str,
+        author: Optional[str] = None, state: str = 'open') -> pd.DataFrame:
+    """Returns a DataFrame of the pull requests by author, which defaults
+    to us, whose title is exactly title, with PULL_REQUEST_COLUMNS. State
+    is 'open', 'closed' or 'all'."""
+    author = author or streamlit_github.get_login(github)
+    query = f'is:pr author:{author} in:title "{title}"'
+    if state != 'all':
+        query += f' is:{state}'
+
+    # The search matches words, so check the whole title ourselves, and
+    # skip repeats, since results can shift between pages.
+    rows = {}
+    for item in search_issues(github, query):
+        if item['title'] == title and item['html_url'] not in rows:
+            repo = item['repository_url'].split('/repos/')[-1]
+            rows[item['html_url']] = (item['html_url'], repo, item['number'],
+                item['title'], item['body'], item['state'], item['created_at'])
+    return pd.DataFrame(list(rows.values()), columns=PULL_REQUEST_COLUMNS)
+
+def edit_pull_requests(bot: GitHubBot, pull_requests: pd.DataFrame,
+        title: Optional[str] = None, body: Optional[str] = None,
+        close: bool = False, num_workers: int = 8) -> pd.DataFrame:
+    """Sets the title and / or body of every pull request, and closes them
+    if close is True, with one paced call each. Pull requests which already
+    look like that are skipped for free. Returns `GitHubBot.map`'s results,
+    keyed by pull request url."""
+    changes = {}
+    if title is not None:
+        changes['title'] = title
+    if body is not None:
+        changes['body'] = body
+    if close:
+        changes['state'] = 'closed'
+    if not changes:
+        raise ValueError("Nothing to change.")
+
+    def edit_pull_request(github, pull_request):
+        needed = {field: value for field, value in changes.items()
+            if pull_request[field] != value}
+        if not needed:
+            return 'unchanged'
+        requester = github._Github__requester
+        with EDIT_LIMIT.slot():
+            requester.requestJsonAndCheck('PATCH',
+                f"/repos/{pull_request['repo']}/pulls/{pull_request['number']}",
+                input=needed)
+        return 'edited'
+
+    # The map's name includes the changes, so the same cleanup is only done
+    # once, while different ones don't get mixed up.
+    name = 'edit_pull_requests: ' + ', '.join(f"{field}={value[:40]!r}"
+        for field, value in sorted(changes.items()))
+    return bot.map([row for _, row in pull_requests.iterrows()],
+        edit_pull_request, name=name, key=lambda row: row['url'],
+        num_workers=num_workers)
@@ -1,26 +1,37 @@
 """This is a second script which I'm creating to clean up every PR
 which had a misspelled title.
 
-Todo:
-
-- Create a list of all of the repos which we forked.
-- Create a template which performs actions and then captures errors
-  which can be displayed layer
-
 Overview of pieces:
 
 - GithubBot
     - map(input, func): map a function over a set and store the errors
-    - fromIdToken():
+    - from_user_defined_token()
+
+- bulk_pull_requests
+    - find every one of the bot's PRs with a given title in one search
+    - edit their titles, bodies or states with paced writes
 
-- Repository
-    - a repository from the bot that helps you do stuff
+Titles which are already fixed are skipped when the script is re-run: they
+no longer match the search, and `GitHubBot.map` remembers what it did.
 """
 
 import streamlit as st
+import badge_batch
+import bulk_pull_requests
+import reporting
 from github_bot import GitHubBot
 
 st.title("Fix the typos in the PRs")
 
 gh_bot = GitHubBot.from_user_defined_token()
-st.write(gh_bot)
+reporting.set_reporter(reporting.StreamlitReporter())
+
+pull_requests = bulk_pull_requests.find_pull_requests(gh_bot.github,
+    badge_batch.OLD_BADGE_PULL_REQUEST_TITLE)
+st.write(f"Found {len(pull_requests)} pull requests with the old title.")
+st.dataframe(pull_requests.drop(columns=['body']))
+
+if len(pull_requests) > 0 and st.button("Fix their titles"):
+    results = bulk_pull_requests.edit_pull_requests(gh_bot, pull_requests,
+        title=badge_batch.BADGE_PULL_REQUEST_TITLE)
+    st.dataframe(results)
@@ -0,0 +1,788 @@
+"""A local stand-in for the Github REST API, for benchmarks and experiments.
+
+It serves the endpoints the badge bot uses (repos, branches, contents,
+search/code, search/users, search/issues, forks, merge-upstream, pulls,
+user, the user's repos, rate_limit and the repository queries of
+`github_graphql`), and raw files with ranged reads
+like raw.githubusercontent.com, from an in-memory catalog of synthetic
+repos, with configurable latency, page sizes, rate limits and fork delays.
+Point a client at it with
+
+    github = streamlit_github.make_github('token', base_url=server.url)
+
+The server counts every call and every byte sent by endpoint, so the API
+calls and transfer a change costs can be measured without spending any real
+rate limit.
+"""
+
+import base64
+import collections
+import datetime
+import hashlib
+import http.server
+import json
+import random
+import re
+import threading
+import time
+import urllib.parse
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+
+# The badges and app links some synthetic READMEs already have.
+BADGE_MARKDOWN = ("[![Open in Streamlit]"
+    "(https://static.streamlit.io/badges/streamlit_badge_black_white.svg)]"
+    "(https://share.streamlit.io/{owner}/{name}/main/streamlit_app.py)")
+BADGE_VARIANTS = [
+    BADGE_MARKDOWN,
+    BADGE_MARKDOWN.replace('black_white', 'color'),
+    "[![Streamlit](https://img.shields.io/badge/Streamlit-FF4B4B?logo=streamlit)]"
+        "(https://share.streamlit.io/{owner}/{name})",
+    "[Try the app!](https://share.streamlit.io/{owner}/{name})",
+]
+
+# Some synthetic READMEs are padded with this paragraph, to be large.
+FILLER = "This paragraph is here to make the README larger. " * 20 + "\n\n"
+
+# Like Github, searches only return this many results.
+MAX_SEARCH_RESULTS = 1000
+
+# Github's message when the primary rate limit is used up.
+RATE_LIMIT_MESSAGE = "API rate limit exceeded for 127.0.0.1."
+
+class FakeGithubOptions:
+    """How the fake server behaves."""
+
+    def __init__(self, latency_seconds: float = 0.0, page_size: int = 30,
+            max_page_size: int = 100, core_limit: int = 1000000,
+            search_limit: int = 1000000, graphql_limit: int = 1000000,
+            window_seconds: float = 3600.0,
+            fork_ready_seconds: float = 0.0,
+            bot_login: str = 'streamlit-badge-bot') -> None:
+        """Constructor.
+
+        latency_seconds: how long every response takes.
+        page_size / max_page_size: the default and largest `per_page`.
+        core_limit / search_limit / graphql_limit: calls allowed per rate
+            limit window and access token, after which calls get a 403, or
+            for GraphQL a RATE_LIMITED error, until the window resets.
+        fork_ready_seconds: how long a new fork 404s on branches and contents.
+        bot_login: who the access token belongs to.
+        """
+        self.latency_seconds = latency_seconds
+        self.page_size = page_size
+        self.max_page_size = max_page_size
+        self.core_limit = core_limit
+        self.search_limit = search_limit
+        self.graphql_limit = graphql_limit
+        self.window_seconds = window_seconds
+        self.fork_ready_seconds = fork_ready_seconds
+        self.bot_login = bot_login
+
+class FakeRepo:
+    """A repo on the fake server."""
+
+    def __init__(self, owner: str, name: str, files: Dict[str, bytes],
+            fork: bool = False, pushed_at: datetime.datetime = None,
+            parent: Optional[str] = None) -> None:
+        """Constructor. parent is the full name of the repo this forks."""
+        self.owner = owner
+        self.name = name
+        self.files = files
+        self.fork = fork
+        self.parent = parent
+        self.default_branch = 'main'
+        self.pushed_at = pushed_at or datetime.datetime(2020, 10, 1)
+        self.updated_at = self.created_at = self.pushed_at
+        self.ready_at = 0.0
+        self.pulls = []
+
+    @property
+    def full_name(self) -> str:
+        return f"{self.owner}/{self.name}"
+
+    def is_ready(self) -> bool:
+        return time.time() >= self.ready_at
+
+class FakeGithubData:
+    """Everything the fake server knows about, keyed case insensitively."""
+
+    def __init__(self) -> None:
+        """Constructor."""
+        self.repos = {}
+        self.emails = {}
+        self._lock = threading.Lock()
+
+    def add_repo(self, repo: FakeRepo) -> None:
+        with self._lock:
+            self.repos[repo.full_name.lower()] = repo
+            self.emails.setdefault(repo.owner, f"{repo.owner}@example.com")
+
+    def get_repo(self, owner: str, name: str) -> Optional[FakeRepo]:
+        return self.repos.get(f"{owner}/{name}".lower())
+
+    def get_user_repos(self, login: str) -> List[FakeRepo]:
+        return [repo for repo in list(self.repos.values())
+            if repo.owner.lower() == login.lower()]
+
+def make_catalog(num_apps: int, seed: int = 0,
+        owner_prefix: str = 'user') -> Tuple[pd.DataFrame, FakeGithubData]:
+    """Returns a synthetic catalog of apps, like sharing_apps_2.csv, and the
+    repos behind them. Roughly two apps share each repo and three repos share
+    each owner. A few urls are missing or unparseable, and a few repos don't
+    exist, have no README, are forks, or already have a badge or app link,
+    so every status shows up. A fifth of the READMEs are tens of kilobytes,
+    and a tenth have CRLF line endings. The same seed always gives the same catalog, and
+    `owner_prefix` keeps catalogs from colliding in Streamlit's caches."""
+    rng = random.Random(seed)
+    data = FakeGithubData()
+    coords = []
+    for i in range(max(1, num_apps // 2)):
+        owner, name = f"{owner_prefix}{i // 3}", f"app-{i}"
+        coords.append((owner, name))
+        kind = rng.random()
+        if kind < 0.03:
+            # This repo has since been deleted.
+            continue
+        files = {
+            'streamlit_app.py': b"import streamlit as st\n\nst.write('Hi!')\n",
+            'requirements.txt': b"streamlit\n",
+        }
+        if kind >= 0.08:
+            body = "A Streamlit app.\n"
+            if rng.random() < 0.2:
+                body += FILLER * rng.randrange(10, 100)
+            readme = f"# {name}\n\n{body}"
+            if kind >= 0.13 and kind < 0.45:
+                badge = rng.choice(BADGE_VARIANTS).format(owner=owner,
+                    name=name)
+                readme = f"# {name} {badge}\n\n{body}"
+            if rng.random() < 0.1:
+                readme = readme.replace('\n', '\r\n')
+            readme_name = rng.choice(['README.md', 'README.md', 'readme.md',
+                'Readme.md'])
+            files[readme_name] = readme.encode('utf-8')
+        pushed_at = datetime.datetime(2020, 1, 1) + \
+            datetime.timedelta(minutes=rng.randrange(500000))
+        data.add_repo(FakeRepo(owner, name, files,
+            fork=(0.08 <= kind < 0.13), pushed_at=pushed_at))
+
+    # Every repo gets at least one app, and the rest are spread at random.
+    app_urls = []
+    for i in range(num_apps):
+        kind = rng.random()
+        if kind < 0.01:
+            app_urls.append("None")
+        elif kind < 0.03:
+            app_urls.append(f"https://github.com/{owner_prefix}/app-{i}")
+        else:
+            owner, name = coords[i] if i < len(coords) else rng.choice(coords)
+            if rng.random() < 0.5:
+                app_urls.append(f"https://share.streamlit.io/{owner}/{name}/main/streamlit_app.py")
+            else:
+                app_urls.append(f"https://share.streamlit.io/{owner}/{name}")
+    return pd.DataFrame({'app_url': app_urls}), data
+
+def _format_time(value: datetime.datetime) -> str:
+    return value.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+class _RateWindow:
+    """The calls left for one rate limit resource."""
+
+    def __init__(self, limit: int, window_seconds: float) -> None:
+        """Constructor."""
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.reset = time.time() + window_seconds
+        self.used = 0
+
+    def spend(self, count: bool) -> bool:
+        """Counts a call, unless count is False. Returns False if the call
+        is over the limit."""
+        now = time.time()
+        if now >= self.reset:
+            self.reset = now + self.window_seconds
+            self.used = 0
+        if self.used >= self.limit:
+            return False
+        if count:
+            self.used += 1
+        return True
+
+    def headers(self, resource: str) -> Dict[str, str]:
+        return {
+            'X-RateLimit-Limit': str(self.limit),
+            'X-RateLimit-Remaining': str(self.limit - self.used),
+            'X-RateLimit-Reset': str(int(self.reset)),
+            'X-RateLimit-Used': str(self.used),
+            'X-RateLimit-Resource': resource,
+        }
+
+    def to_json(self) -> dict:
+        return {'limit': self.limit, 'remaining': self.limit - self.used,
+            'reset': int(self.reset), 'used': self.used}
+
+# The routes we serve, as (verb, endpoint, handler method name). Endpoints
+# name the calls in the counts, and `:name` matches one path segment, or the
+# rest of the path for `:path`.
+ROUTES = [
+    ('GET', '/rate_limit', 'get_rate_limit'),
+    ('GET', '/user', 'get_user'),
+    ('GET', '/user/repos', 'list_user_repos'),
+    ('GET', '/users/:login', 'get_named_user'),
+    ('GET', '/search/code', 'search_code'),
+    ('GET', '/search/users', 'search_users'),
+    ('GET', '/search/issues', 'search_issues'),
+    ('GET', '/repos/:owner/:repo', 'get_repo'),
+    ('GET', '/repos/:owner/:repo/branches/:branch', 'get_branch'),
+    ('GET', '/repos/:owner/:repo/contents/:path', 'get_contents'),
+    ('PUT', '/repos/:owner/:repo/contents/:path', 'update_contents'),
+    ('POST', '/repos/:owner/:repo/forks', 'create_fork'),
+    ('POST', '/repos/:owner/:repo/merge-upstream', 'merge_upstream'),
+    ('GET', '/repos/:owner/:repo/pulls', 'get_pulls'),
+    ('POST', '/repos/:owner/:repo/pulls', 'create_pull'),
+    ('PATCH', '/repos/:owner/:repo/pulls/:number', 'edit_pull'),
+    ('POST', '/graphql', 'graphql'),
+]
+
+# The parts of the GraphQL queries `github_graphql` sends, which are one
+# aliased repository node per repo, with a root listing and README blobs.
+_GRAPHQL_REPO_PATTERN = re.compile(
+    r'(repo\d+): repository\(owner: \$(\w+), name: \$(\w+)\)')
+_GRAPHQL_README_PATTERN = re.compile(
+    r'(readme\d+): object\(expression: "HEAD:([^"]*)"\)')
+
+def _compile_route(endpoint: str) -> re.Pattern:
+    pattern = re.sub(r':path', r'(?P<path>.*)', endpoint)
+    pattern = re.sub(r':(\w+)', r'(?P<\1>[^/]+)', pattern)
+    return re.compile(f"^{pattern}$")
+
+_COMPILED_ROUTES = [(verb, endpoint, _compile_route(endpoint), handler)
+    for verb, endpoint, handler in ROUTES]
+
+class NotFound(Exception):
+    """Turns into a 404 response."""
+
+class FakeGithubServer:
+    """Serves a `FakeGithubData` catalog over HTTP on a local port.
+
+    Use it as a context manager, or call `start()` and `stop()`."""
+
+    def __init__(self, data: FakeGithubData,
+            options: FakeGithubOptions = None) -> None:
+        """Constructor."""
+        self.data = data
+        self.options = options or FakeGithubOptions()
+        self.calls = collections.Counter()
+        self.statuses = collections.Counter()
+        self.bytes_sent = collections.Counter()
+        self._lock = threading.Lock()
+        self._windows = {}
+        self._thread_local = threading.local()
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'FakeGithubServer':
+        server = self
+
+        class Handler(_RequestHandler):
+            fake_github = server
+
+        self._httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever,
+            daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> 'FakeGithubServer':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def reset_counts(self) -> None:
+        with self._lock:
+            self.calls.clear()
+            self.statuses.clear()
+            self.bytes_sent.clear()
+
+    def get_counts(self) -> Tuple[collections.Counter, collections.Counter]:
+        """Returns copies of the calls per endpoint and per status code."""
+        with self._lock:
+            return collections.Counter(self.calls), \
+                collections.Counter(self.statuses)
+
+    def get_bytes_sent(self) -> collections.Counter:
+        """Returns a copy of the response body bytes sent per endpoint."""
+        with self._lock:
+            return collections.Counter(self.bytes_sent)
+
+    def _get_windows(self, authorization: Optional[str]) -> dict:
+        """Returns the rate limit windows of this access token, since each
+        token has its own limits, as on Github. Call with the lock held."""
+        if authorization not in self._windows:
+            self._windows[authorization] = {
+                'core': _RateWindow(self.options.core_limit,
+                    self.options.window_seconds),
+                'search': _RateWindow(self.options.search_limit,
+                    self.options.window_seconds),
+                'graphql': _RateWindow(self.options.graphql_limit,
+                    self.options.window_seconds),
+            }
+        return self._windows[authorization]
+
+    def handle(self, verb: str, raw_url: str, headers,
+            body: bytes) -> Tuple[int, dict, Optional[bytes]]:
+        """Returns the status, headers and body for one request."""
+        time.sleep(self.options.latency_seconds)
+        url = urllib.parse.urlsplit(raw_url)
+        path = urllib.parse.unquote(url.path)
+        if verb == 'GET' and path.startswith('/raw/'):
+            return self._get_raw(path, headers)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        for route_verb, endpoint, pattern, handler in _COMPILED_ROUTES:
+            match = pattern.match(path)
+            if route_verb == verb and match:
+                break
+        else:
+            endpoint, match, handler = f"{path} (unknown)", None, None
+
+        # Spend the rate limit. As on Github, conditional requests which
+        # come back 304 Not Modified are free, so we decide that first.
+        resource = 'search' if path.startswith('/search/') else \
+            'graphql' if path == '/graphql' else 'core'
+        self._thread_local.authorization = headers.get('Authorization')
+        try:
+            if handler is None:
+                raise NotFound()
+            payload = json.loads(body) if body else {}
+            result = getattr(self, handler)(query=query, body=payload,
+                **match.groupdict())
+        except NotFound:
+            result = 404, {'message': 'Not Found'}
+
+        # Handlers return the status, the JSON response and maybe headers.
+        status, response = result[:2]
+        response_headers = {'Content-Type': 'application/json; charset=utf-8'}
+        response_headers.update(result[2] if len(result) > 2 else {})
+        response_body = json.dumps(response).encode('utf-8')
+        if verb == 'GET' and status == 200:
+            etag = f'"{hashlib.sha1(response_body).hexdigest()}"'
+            response_headers['ETag'] = etag
+            if headers.get('If-None-Match') == etag:
+                status, response_body = 304, None
+
+        with self._lock:
+            window = self._get_windows(headers.get('Authorization'))[resource]
+            if handler != 'get_rate_limit' and \
+                    not window.spend(count=(status != 304)):
+                status = 403
+                response_body = json.dumps(
+                    {'message': RATE_LIMIT_MESSAGE}).encode('utf-8')
+                if resource == 'graphql':
+                    # GraphQL reports the rate limit as an error instead.
+                    status = 200
+                    response_body = json.dumps({'data': None, 'errors': [{
+                        'type': 'RATE_LIMITED',
+                        'message': RATE_LIMIT_MESSAGE}]}).encode('utf-8')
+            response_headers.update(window.headers(resource))
+            self.calls[f"{verb} {endpoint}"] += 1
+            self.statuses[status] += 1
+            self.bytes_sent[f"{verb} {endpoint}"] += len(response_body or b'')
+        return status, response_headers, response_body
+
+    def _get_raw(self, path: str, headers) -> Tuple[int, dict, bytes]:
+        """Serves a raw file, like raw.githubusercontent.com, honouring a
+        single `Range: bytes=start-end` header. Raw files don't count
+        against the rate limit."""
+        status, response_headers, response_body = 404, {}, b'404: Not Found'
+        match = re.match(r'^/raw/([^/]+)/([^/]+)/([^/]+)/(.+)$', path)
+        repo = match and self.data.get_repo(match.group(1), match.group(2))
+        if repo and match.group(3) == repo.default_branch and \
+                match.group(4) in repo.files:
+            contents = repo.files[match.group(4)]
+            status, response_body = 200, contents
+            response_headers = {'Content-Type': 'text/plain; charset=utf-8',
+                'Accept-Ranges': 'bytes'}
+            byte_range = re.match(r'^bytes=(\d+)-(\d*)$',
+                headers.get('Range') or '')
+            if byte_range:
+                start = int(byte_range.group(1))
+                end = min(int(byte_range.group(2) or len(contents) - 1),
+                    len(contents) - 1)
+                if start >= len(contents):
+                    status, response_body = 416, b''
+                    response_headers['Content-Range'] = \
+                        f"bytes */{len(contents)}"
+                else:
+                    status, response_body = 206, contents[start:end + 1]
+                    response_headers['Content-Range'] = \
+                        f"bytes {start}-{end}/{len(contents)}"
+
+        endpoint = 'GET /raw/:owner/:repo/:branch/:path'
+        with self._lock:
+            self.calls[endpoint] += 1
+            self.statuses[status] += 1
+            self.bytes_sent[endpoint] += len(response_body)
+        return status, response_headers, response_body
+
+    # Helpers which build the JSON Github returns.
+
+    def _user_json(self, login: str) -> dict:
+        return {'login': login, 'id': abs(hash(login)) % 10 ** 8,
+            'type': 'User', 'url': f"{self.url}/users/{login}",
+            'html_url': f"https://github.com/{login}"}
+
+    def _repo_json(self, repo: FakeRepo) -> dict:
+        return {
+            'id': abs(hash(repo.full_name)) % 10 ** 8,
+            'name': repo.name,
+            'full_name': repo.full_name,
+            'owner': self._user_json(repo.owner),
+            'private': False,
+            'fork': repo.fork,
+            'default_branch': repo.default_branch,
+            'created_at': _format_time(repo.created_at),
+            'pushed_at': _format_time(repo.pushed_at),
+            'updated_at': _format_time(repo.updated_at),
+            'url': f"{self.url}/repos/{repo.full_name}",
+            'html_url': f"https://github.com/{repo.full_name}",
+        }
+
+    def _file_json(self, repo: FakeRepo, path: str,
+            with_content: bool) -> dict:
+        contents = repo.files[path]
+        file_json = {
+            'type': 'file',
+            'name': path.split('/')[-1],
+            'path': path,
+            'sha': hashlib.sha1(contents).hexdigest(),
+            'size': len(contents),
+            'url': f"{self.url}/repos/{repo.full_name}/contents/{path}"
+                f"?ref={repo.default_branch}",
+            'html_url': f"https://github.com/{repo.full_name}/blob/"
+                f"{repo.default_branch}/{path}",
+            'download_url': f"{self.url}/raw/{repo.full_name}/"
+                f"{repo.default_branch}/{path}",
+        }
+        if with_content:
+            file_json['content'] = base64.b64encode(contents).decode('ascii')
+            file_json['encoding'] = 'base64'
+        return file_json
+
+    def _page(self, items: list, query: dict, path: str) -> Tuple[list, dict]:
+        """Returns one page of items, and a Link header for the next page
+        if there is one."""
+        per_page = min(int(query.get('per_page', self.options.page_size)),
+            self.options.max_page_size)
+        page = int(query.get('page', 1))
+        start = (page - 1) * per_page
+        headers = {}
+        if start + per_page < len(items):
+            next_query = urllib.parse.urlencode({**query, 'page': page + 1})
+            headers['Link'] = f'<{self.url}{path}?{next_query}>; rel="next"'
+        return items[start:start + per_page], headers
+
+    def _get_repo(self, owner: str, repo: str,
+            require_ready: bool = False) -> FakeRepo:
+        fake_repo = self.data.get_repo(owner, repo)
+        if fake_repo is None or (require_ready and not fake_repo.is_ready()):
+            raise NotFound()
+        return fake_repo
+
+    # The handlers for each route.
+
+    def get_rate_limit(self, query, body):
+        with self._lock:
+            windows = self._get_windows(self._thread_local.authorization)
+            resources = {resource: window.to_json()
+                for resource, window in windows.items()}
+        return 200, {'resources': resources, 'rate': resources['core']}
+
+    def get_user(self, query, body):
+        return 200, self._user_json(self.options.bot_login)
+
+    def get_named_user(self, query, body, login):
+        if login not in self.data.emails:
+            raise NotFound()
+        return 200, {**self._user_json(login), 'email': self.data.emails[login]}
+
+    def search_code(self, query, body):
+        logins = re.findall(r'user:(\S+)', query.get('q', ''))
+        size_range = re.search(r'size:(\d+)\.\.(\d+)', query.get('q', ''))
+        low, high = map(int, size_range.groups()) if size_range else (0, 2 ** 32)
+        items = []
+        for login in logins:
+            for repo in self.data.get_user_repos(login):
+                for path, contents in repo.files.items():
+                    if path.endswith('.py') and low <= len(contents) <= high:
+                        item = self._file_json(repo, path, False)
+                        item['repository'] = self._repo_json(repo)
+                        items.append(item)
+        page, headers = self._page(items[:MAX_SEARCH_RESULTS], query,
+            '/search/code')
+        return 200, {'total_count': len(items), 'incomplete_results': False,
+            'items': page}, headers
+
+    def search_users(self, query, body):
+        terms = query.get('q', '').split()
+        logins = [login for login, email in self.data.emails.items()
+            if email in terms]
+        items = [self._user_json(login) for login in logins]
+        page, headers = self._page(items, query, '/search/users')
+        return 200, {'total_count': len(items), 'incomplete_results': False,
+            'items': page}, headers
+
+    def list_user_repos(self, query, body):
+        repos = sorted(self.data.get_user_repos(self.options.bot_login),
+            key=lambda repo: repo.updated_at, reverse=True)
+        page, headers = self._page([self._repo_json(repo) for repo in repos],
+            query, '/user/repos')
+        return 200, page, headers
+
+    def get_repo(self, query, body, owner, repo):
+        fake_repo = self._get_repo(owner, repo)
+        repo_json = self._repo_json(fake_repo)
+        parent = fake_repo.parent and self.data.get_repo(
+            *fake_repo.parent.split('/'))
+        if parent:
+            # Like Github, only a single repo says what it forks.
+            repo_json['parent'] = repo_json['source'] = self._repo_json(parent)
+        return 200, repo_json
+
+    def get_branch(self, query, body, owner, repo, branch):
+        fake_repo = self._get_repo(owner, repo, require_ready=True)
+        if branch != fake_repo.default_branch:
+            raise NotFound()
+        sha = hashlib.sha1(_format_time(fake_repo.pushed_at).encode()).hexdigest()
+        return 200, {'name': branch, 'protected': False,
+            'commit': {'sha': sha,
+                'url': f"{self.url}/repos/{fake_repo.full_name}/commits/{sha}"}}
+
+    def get_contents(self, query, body, owner, repo, path):
+        fake_repo = self._get_repo(owner, repo, require_ready=True)
+        path = path.strip('/')
+        if path == '':
+            return 200, [self._file_json(fake_repo, file_path, False)
+                for file_path in sorted(fake_repo.files)]
+        if path not in fake_repo.files:
+            raise NotFound()
+        return 200, self._file_json(fake_repo, path, True)
+
+    def update_contents(self, query, body, owner, repo, path):
+        fake_repo = self._get_repo(owner, repo, require_ready=True)
+        if path in fake_repo.files and \
+                body.get('sha') != self._file_json(fake_repo, path, False)['sha']:
+            return 409, {'message': f"{path} does not match {body.get('sha')}"}
+        fake_repo.files[path] = base64.b64decode(body['content'])
+        fake_repo.pushed_at = fake_repo.updated_at = datetime.datetime.utcnow()
+        sha = hashlib.sha1(fake_repo.files[path]).hexdigest()
+        return 200, {'content': self._file_json(fake_repo, path, False),
+            'commit': {'sha': sha, 'message': body.get('message'),
+                'url': f"{self.url}/repos/{fake_repo.full_name}/git/commits/{sha}"}}
+
+    def create_fork(self, query, body, owner, repo):
+        source = self._get_repo(owner, repo)
+        fork = self.data.get_repo(self.options.bot_login, source.name)
+        if fork is None:
+            # Like Github, we hand back the fork before it can be read.
+            fork = FakeRepo(self.options.bot_login, source.name,
+                dict(source.files), fork=True, pushed_at=source.pushed_at,
+                parent=source.full_name)
+            fork.created_at = fork.updated_at = datetime.datetime.utcnow()
+            fork.ready_at = time.time() + self.options.fork_ready_seconds
+            self.data.add_repo(fork)
+        return 202, self._repo_json(fork)
+
+    def merge_upstream(self, query, body, owner, repo):
+        fork = self._get_repo(owner, repo, require_ready=True)
+        parent = fork.parent and self.data.get_repo(*fork.parent.split('/'))
+        if parent is None:
+            raise NotFound()
+        # Bring over the parent's files, keeping the fork's own changes.
+        for path, contents in parent.files.items():
+            fork.files.setdefault(path, contents)
+        fork.pushed_at = fork.updated_at = datetime.datetime.utcnow()
+        return 200, {'message': f"Successfully fetched and fast-forwarded "
+            f"from upstream {parent.full_name}:{parent.default_branch}.",
+            'merge_type': 'fast-forward', 'base_branch': parent.full_name}
+
+    def get_pulls(self, query, body, owner, repo):
+        fake_repo = self._get_repo(owner, repo)
+        pulls = fake_repo.pulls
+        if query.get('state', 'open') != 'all':
+            pulls = [pull for pull in pulls
+                if pull['state'] == query.get('state', 'open')]
+        page, headers = self._page(pulls, query,
+            f"/repos/{fake_repo.full_name}/pulls")
+        return 200, page, headers
+
+    def create_pull(self, query, body, owner, repo):
+        fake_repo = self._get_repo(owner, repo)
+        # Like Github, refuse a second open pull request for the same branch.
+        if any(pull['state'] == 'open'
+                and pull['head']['label'] == body.get('head')
+                and pull['base']['ref'] == body.get('base')
+                for pull in fake_repo.pulls):
+            return 422, {'message': 'Validation Failed', 'errors': [{
+                'resource': 'PullRequest', 'code': 'custom',
+                'message': f"A pull request already exists for "
+                    f"{body.get('head')}."}]}
+        return 201, self.add_pull(fake_repo, body.get('title'),
+            body.get('body'), body.get('head'), body.get('base'))
+
+    def add_pull(self, fake_repo: FakeRepo, title: str, body: str, head: str,
+            base: str) -> dict:
+        """Opens a pull request by the bot, e.g. to set up a benchmark."""
+        number = len(fake_repo.pulls) + 1
+        now = _format_time(datetime.datetime.utcnow())
+        pull = {
+            'number': number,
+            'state': 'open',
+            'title': title,
+            'body': body,
+            'user': self._user_json(self.options.bot_login),
+            'head': {'label': head},
+            'base': {'ref': base},
+            'merged': False,
+            'created_at': now,
+            'updated_at': now,
+            'url': f"{self.url}/repos/{fake_repo.full_name}/pulls/{number}",
+            'html_url': f"https://github.com/{fake_repo.full_name}/pull/{number}",
+            'closed_at': None,
+            'repository_url': f"{self.url}/repos/{fake_repo.full_name}",
+            'pull_request': {
+                'url': f"{self.url}/repos/{fake_repo.full_name}/pulls/{number}",
+                'merged_at': None},
+        }
+        fake_repo.pulls.append(pull)
+        return pull
+
+    def edit_pull(self, query, body, owner, repo, number):
+        fake_repo = self._get_repo(owner, repo)
+        if not 1 <= int(number) <= len(fake_repo.pulls):
+            raise NotFound()
+        pull = fake_repo.pulls[int(number) - 1]
+        now = _format_time(datetime.datetime.utcnow())
+        for field in ['title', 'body', 'state']:
+            if field in body:
+                pull[field] = body[field]
+        pull['closed_at'] = now if pull['state'] == 'closed' else None
+        pull['updated_at'] = now
+        return 200, pull
+
+    def merge_pull(self, fake_repo: FakeRepo, number: int) -> dict:
+        """Merges one of the bot's pull requests, as its repo's owner would."""
+        pull = fake_repo.pulls[number - 1]
+        now = _format_time(datetime.datetime.utcnow())
+        pull['state'], pull['merged'] = 'closed', True
+        pull['closed_at'] = pull['updated_at'] = now
+        pull['pull_request']['merged_at'] = now
+        return pull
+
+    def graphql(self, query, body):
+        """Answers the repository queries of `github_graphql`, one aliased
+        node per repo, with a NOT_FOUND error for each missing repo."""
+        text, variables = body.get('query', ''), body.get('variables', {})
+        nodes = list(_GRAPHQL_REPO_PATTERN.finditer(text))
+        data, errors = {}, []
+        for node, next_node in zip(nodes, nodes[1:] + [None]):
+            alias = node.group(1)
+            owner, name = variables[node.group(2)], variables[node.group(3)]
+            fields = text[node.end():next_node.start() if next_node else None]
+            repo = self.data.get_repo(owner, name)
+            if repo is None:
+                data[alias] = None
+                errors.append({'type': 'NOT_FOUND', 'path': [alias],
+                    'message': "Could not resolve to a Repository with the "
+                        f"name '{owner}/{name}'."})
+                continue
+            repo_data = {}
+            if 'isFork' in fields:
+                repo_data.update(isFork=repo.fork,
+                    pushedAt=_format_time(repo.pushed_at),
+                    updatedAt=_format_time(repo.updated_at),
+                    defaultBranchRef={'name': repo.default_branch})
+            if 'root: object' in fields:
+                names = dict.fromkeys(path.split('/')[0] for path in repo.files)
+                repo_data['root'] = {'entries': [{'name': entry_name,
+                    'type': 'blob' if entry_name in repo.files else 'tree'}
+                    for entry_name in names]}
+            for readme_alias, path in _GRAPHQL_README_PATTERN.findall(fields):
+                contents = repo.files.get(path)
+                repo_data[readme_alias] = None if contents is None else {
+                    'oid': hashlib.sha1(contents).hexdigest(),
+                    'text': contents.decode('utf-8')}
+            data[alias] = repo_data
+        response = {'data': data}
+        if errors:
+            response['errors'] = errors
+        return 200, response
+
+    def search_issues(self, query, body):
+        q = query.get('q', '')
+        author = re.search(r'author:(\S+)', q)
+        state = re.search(r'is:(open|closed)', q)
+        created = re.search(r'created:(\S+)\.\.(\S+)', q)
+        updated = re.search(r'updated:>=(\S+)', q)
+        phrase = re.search(r'"([^"]*)"', q)
+        words = phrase.group(1).lower().split() if phrase else []
+        items = []
+        for fake_repo in list(self.data.repos.values()):
+            for pull in fake_repo.pulls:
+                if author and pull['user']['login'] != author.group(1):
+                    continue
+                if state and pull['state'] != state.group(1):
+                    continue
+                if 'is:merged' in q and not pull['merged']:
+                    continue
+                if updated and pull['updated_at'] < updated.group(1):
+                    continue
+                if created and not (created.group(1) <=
+                        pull['created_at'][:10] <= created.group(2)):
+                    continue
+                title_words = (pull['title'] or '').lower().split()
+                if all(word in title_words for word in words):
+                    items.append(pull)
+        items.sort(key=lambda pull: pull['created_at'])
+        page, headers = self._page(items[:MAX_SEARCH_RESULTS], query,
+            '/search/issues')
+        return 200, {'total_count': len(items), 'incomplete_results': False,
+            'items': page}, headers
+
+class _RequestHandler(http.server.BaseHTTPRequestHandler):
+    """Hands each request to the `FakeGithubServer`."""
+
+    # Keep connections alive, like Github does.
+    protocol_version = 'HTTP/1.1'
+
+    fake_github = None
+
+    def _respond(self) -> None:
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        status, headers, response_body = self.fake_github.handle(
+            self.command, self.path, self.headers, body)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(response_body or b'')))
+        self.end_headers()
+        if response_body:
+            self.wfile.write(response_body)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _respond
+
+    def log_message(self, format, *args) -> None:
+        # Don't print a line per request.
+        pass
@@ -0,0 +1,274 @@
+"""A local index of the forks the bot account already has.
+
+Forking a repo the bot already forked still costs a fork call, which counts
+against the secondary rate limits, and then a wait until the fork can be
+read. Instead we list the bot's repos, 100 per page, and keep its forks in
+SQLite. Later refreshes list the most recently updated repos first and stop
+at the first one we've already seen, so they usually cost a single call.
+
+Listings don't say which repo a fork was forked from, so we match forks to
+their parents by name, and look up the parent once, the first time we need
+it. A fork is only reused while it's up to date, i.e. it was created or
+synced after its parent was last pushed to. Stale forks are synced with
+Github's merge-upstream call rather than forked again.
+See: https://docs.github.com/en/rest/reference/repos#list-repositories-for-the-authenticated-user
+"""
+
+import datetime
+import threading
+import time
+import reporting
+import streamlit_github
+import sqlite_store
+from github import MainClass as GithubMainClass
+from github import GithubException
+from github import UnknownObjectException
+from typing import List, NamedTuple, Optional
+
+# Where the index lives on disk.
+FORK_INVENTORY_PATH = 'fork_inventory.sqlite'
+
+# How many repos we ask for per page.
+PAGE_SIZE = 100
+
+# How often we list every repo again, to forget forks which were deleted.
+FULL_REFRESH_SECONDS = 60 * 60 * 24 * 7
+
+# How Github formats times in JSON.
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+class ForkRecord(NamedTuple):
+    """What we know about one of the bot's forks. Times are ISO strings in
+    UTC, and parent is None until we've looked it up."""
+    full_name: str
+    parent: Optional[str]
+    default_branch: str
+    created_at: str
+    pushed_at: str
+    updated_at: str
+    synced_at: str
+
+    def get_snapshot(self) -> streamlit_github.RepoSnapshot:
+        """Returns a snapshot of the fork, without any API calls."""
+        owner, name = self.full_name.split('/')
+        freshness = streamlit_github.format_freshness(
+            datetime.datetime.fromisoformat(self.pushed_at),
+            datetime.datetime.fromisoformat(self.updated_at))
+        return streamlit_github.RepoSnapshot(owner, name, True,
+            self.default_branch, freshness)
+
+def _parse_time(value: str) -> str:
+    return datetime.datetime.strptime(value, TIME_FORMAT).isoformat()
+
+def _now() -> str:
+    return datetime.datetime.utcnow().replace(microsecond=0).isoformat()
+
+class ForkInventory(sqlite_store.SqliteStore):
+    """The bot's forks keyed by full name, stored in SQLite."""
+
+    SCHEMA = ["""
+        CREATE TABLE IF NOT EXISTS forks (
+            full_name TEXT PRIMARY KEY,
+            name TEXT,
+            parent TEXT,
+            default_branch TEXT,
+            created_at TEXT,
+            pushed_at TEXT,
+            updated_at TEXT,
+            synced_at TEXT
+        )""", """
+        CREATE TABLE IF NOT EXISTS refreshes (
+            kind TEXT PRIMARY KEY,
+            high_water TEXT,
+            refreshed_at REAL
+        )"""]
+
+    def __init__(self, path: str) -> None:
+        """Constructor. Creates the tables if needed."""
+        sqlite_store.SqliteStore.__init__(self, path)
+        self._refresh_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM forks").fetchone()[0]
+
+    def _get_refresh(self, kind: str):
+        return self._connection.execute(
+            "SELECT high_water, refreshed_at FROM refreshes WHERE kind = ?",
+            (kind,)).fetchone()
+
+    def refresh(self, github: GithubMainClass.Github, full: bool = False) -> int:
+        """Lists the bot's repos and updates the index with its forks.
+        Unless full is True, or it's been a while since the last full
+        refresh, we stop at the first repo we've already seen. Returns how
+        many forks were added or updated."""
+        with self._refresh_lock:
+            with self._lock:
+                last_full = self._get_refresh('full')
+                last = self._get_refresh('incremental')
+            full = full or last is None or last_full is None or \
+                time.time() - last_full[1] > FULL_REFRESH_SECONDS
+            high_water = None if full else last[0]
+
+            # Newest first, so we can stop once we reach what we've seen.
+            requester = github._Github__requester
+            listed, new_high_water, page = [], high_water, 1
+            while True:
+                headers, repos = requester.requestJsonAndCheck('GET',
+                    '/user/repos', parameters={'affiliation': 'owner',
+                        'sort': 'updated', 'direction': 'desc',
+                        'per_page': PAGE_SIZE, 'page': page})
+                for repo in repos:
+                    updated_at = _parse_time(repo['updated_at'])
+                    if high_water is not None and updated_at < high_water:
+                        break
+                    new_high_water = max(new_high_water or updated_at,
+                        updated_at)
+                    if repo['fork']:
+                        listed.append(repo)
+                else:
+                    if 'rel="next"' in headers.get('link', ''):
+                        page += 1
+                        continue
+                break
+
+            with self._lock, self._connection:
+                for repo in listed:
+                    self._put_listed(repo)
+                if full:
+                    # Forget the forks which weren't listed, i.e. deleted.
+                    listed_names = {repo['full_name'] for repo in listed}
+                    for (full_name,) in self._connection.execute(
+                            "SELECT full_name FROM forks").fetchall():
+                        if full_name not in listed_names:
+                            self._connection.execute(
+                                "DELETE FROM forks WHERE full_name = ?",
+                                (full_name,))
+                kinds = ['full', 'incremental'] if full else ['incremental']
+                for kind in kinds:
+                    self._connection.execute(
+                        "INSERT OR REPLACE INTO refreshes VALUES (?, ?, ?)",
+                        (kind, new_high_water, time.time()))
+        return len(listed)
+
+    def _put_listed(self, repo: dict) -> None:
+        """Stores a fork from a listing, keeping what we knew about it."""
+        row = self._connection.execute(
+            "SELECT parent, synced_at FROM forks WHERE full_name = ?",
+            (repo['full_name'],)).fetchone()
+        created_at = _parse_time(repo['created_at'])
+        parent, synced_at = None, created_at
+        if row is not None:
+            parent, synced_at = row[0], max(row[1], created_at)
+        self._connection.execute(
+            "INSERT OR REPLACE INTO forks VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (repo['full_name'], repo['name'].lower(), parent,
+                repo['default_branch'], created_at,
+                _parse_time(repo['pushed_at']), _parse_time(repo['updated_at']),
+                synced_at))
+
+    def add_fork(self, fork: streamlit_github.RepoSnapshot,
+            parent: streamlit_github.RepoSnapshot) -> None:
+        """Adds a fork we just created."""
+        now = _now()
+        pushed_at, updated_at = (fork.freshness or f"{now} / {now}").split(' / ')
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO forks VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (fork.full_name, fork.name.lower(), parent.full_name.lower(),
+                    fork.default_branch, now, pushed_at, updated_at, now))
+
+    def mark_pushed(self, full_name: str, synced: bool = False) -> None:
+        """Notes that we just pushed to this fork, so snapshots taken from
+        the index get a new key. If synced is True, the push brought it up
+        to date with its parent."""
+        now = _now()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE forks SET pushed_at = ?, updated_at = ? "
+                "WHERE full_name = ?", (now, now, full_name))
+            if synced:
+                self._connection.execute(
+                    "UPDATE forks SET synced_at = ? WHERE full_name = ?",
+                    (now, full_name))
+
+    def find_fork(self, github: GithubMainClass.Github,
+            repo: streamlit_github.RepoSnapshot) -> Optional[ForkRecord]:
+        """Returns our fork of this repo, or None if we have none. The first
+        time we match a fork by name, this costs one call to look up its
+        parent."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT full_name, parent, default_branch, created_at, "
+                "pushed_at, updated_at, synced_at FROM forks "
+                "WHERE parent = ? OR (parent IS NULL AND name = ?)",
+                (repo.full_name.lower(), repo.name.lower())).fetchall()
+        for record in map(ForkRecord._make, rows):
+            if record.parent is None:
+                try:
+                    fork = github.get_repo(record.full_name)
+                except UnknownObjectException:
+                    self._forget(record.full_name)
+                    continue
+                parent = fork.parent.full_name.lower() if fork.parent else ''
+                with self._lock, self._connection:
+                    self._connection.execute(
+                        "UPDATE forks SET parent = ? WHERE full_name = ?",
+                        (parent, record.full_name))
+                record = record._replace(parent=parent)
+            if record.parent == repo.full_name.lower():
+                return record
+        return None
+
+    def list_forks(self) -> List[ForkRecord]:
+        """Returns every fork we know about."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT full_name, parent, default_branch, created_at, "
+                "pushed_at, updated_at, synced_at FROM forks "
+                "ORDER BY full_name").fetchall()
+        return [ForkRecord._make(row) for row in rows]
+
+    def get(self, full_name: str) -> Optional[ForkRecord]:
+        """Returns what we know about this fork, or None."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT full_name, parent, default_branch, created_at, "
+                "pushed_at, updated_at, synced_at FROM forks "
+                "WHERE full_name = ?", (full_name,)).fetchone()
+        return None if row is None else ForkRecord._make(row)
+
+    def _forget(self, full_name: str) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM forks WHERE full_name = ?", (full_name,))
+
+    @staticmethod
+    def is_up_to_date(record: ForkRecord,
+            repo: streamlit_github.RepoSnapshot) -> bool:
+        """True if the fork was created or synced after its parent was last
+        pushed to."""
+        pushed_at = repo.freshness and repo.freshness.split(' / ')[0]
+        return pushed_at is None or record.synced_at >= pushed_at
+
+    def sync_fork(self, github: GithubMainClass.Github,
+            record: ForkRecord) -> Optional[ForkRecord]:
+        """Brings the fork's default branch up to date with its parent,
+        which costs one call, and returns the updated record. Returns None
+        if Github couldn't, e.g. because of a conflict."""
+        requester = github._Github__requester
+        try:
+            requester.requestJsonAndCheck('POST',
+                f'/repos/{record.full_name}/merge-upstream',
+                input={'branch': record.default_branch})
+        except GithubException as e:
+            reporting.get_reporter().warning(
+                f"Couldn't sync `{record.full_name}` with its parent: {e}")
+            return None
+        self.mark_pushed(record.full_name, synced=True)
+        return self.get(record.full_name)
+
+def get_inventory(path: str = FORK_INVENTORY_PATH) -> ForkInventory:
+    """Returns the shared index at this path."""
+    return sqlite_store.get_shared(ForkInventory, path)
@@ -0,0 +1,142 @@
+"""A crash-safe, append-only journal of what `batch_fork_repos` has done.
+
+Forking, committing and opening pull requests are expensive write calls, and
+repeating them after a crash risks duplicate pull requests. So we append one
+JSON line per finished stage to a journal on disk, flushing it to disk each
+time, and resume from it on the next run. A crash can at worst truncate the
+last line, which we skip when loading.
+"""
+
+import json
+import os
+import threading
+import time
+import pandas as pd
+import sqlite_store
+from typing import Tuple
+
+# Where the journal lives on disk.
+FORK_JOURNAL_PATH = 'fork_journal.jsonl'
+
+# The stages of forking an app, in order.
+FORKED = 'forked'
+BADGE_COMMITTED = 'badge_committed'
+PULL_REQUEST_OPENED = 'pull_request_opened'
+STAGES = [FORKED, BADGE_COMMITTED, PULL_REQUEST_OPENED]
+
+# The entry we write when a stage fails.
+FAILED = 'failed'
+
+class RepoJournal:
+    """Everything the journal says about one repo."""
+
+    def __init__(self) -> None:
+        """Constructor."""
+        # Details of each stage which finished, keyed by stage.
+        self.finished = {}
+
+        # The last failure, unless a later stage finished since.
+        self.failure = None
+
+        # The app url we were forking.
+        self.app_url = None
+
+    def is_finished(self, stage: str) -> bool:
+        return stage in self.finished
+
+    def apply(self, entry: dict) -> None:
+        """Updates this state with one journal entry."""
+        self.app_url = entry.get('app_url', self.app_url)
+        if entry['stage'] == FAILED:
+            self.failure = entry
+        else:
+            self.finished[entry['stage']] = entry
+            self.failure = None
+
+def _key(owner: str, repo: str) -> Tuple[str, str]:
+    """Github names are case insensitive, so we key them lowercased."""
+    return owner.lower(), repo.lower()
+
+class ForkJournal:
+    """An append-only JSON lines journal of fork stages, keyed by repo."""
+
+    def __init__(self, path: str) -> None:
+        """Constructor. Loads whatever is already in the journal."""
+        self.path = path
+        self._lock = threading.Lock()
+        self._repos = {}
+
+        # If a crash cut off the last line, the next entry needs a new line.
+        self._needs_newline = False
+        if os.path.exists(path):
+            with open(path) as journal_file:
+                line = ''
+                for line in journal_file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A line which was cut off by a crash.
+                        continue
+                    self._apply(entry)
+                self._needs_newline = bool(line) and not line.endswith('\n')
+
+    def _apply(self, entry: dict) -> None:
+        key = _key(entry['owner'], entry['repo'])
+        self._repos.setdefault(key, RepoJournal()).apply(entry)
+
+    def record(self, owner: str, repo: str, app_url: str, stage: str,
+            **details) -> None:
+        """Appends an entry for this repo, and makes sure it's on disk
+        before returning."""
+        entry = {'time': time.time(), 'owner': owner, 'repo': repo,
+            'app_url': app_url, 'stage': stage, **details}
+        with self._lock:
+            with open(self.path, 'a') as journal_file:
+                if self._needs_newline:
+                    journal_file.write('\n')
+                    self._needs_newline = False
+                journal_file.write(json.dumps(entry) + '\n')
+                journal_file.flush()
+                os.fsync(journal_file.fileno())
+            self._apply(entry)
+
+    def record_failure(self, owner: str, repo: str, app_url: str, stage: str,
+            reason: str) -> None:
+        """Appends an entry saying this stage failed, and why."""
+        self.record(owner, repo, app_url, FAILED, failed_stage=stage,
+            reason=reason)
+
+    def get(self, owner: str, repo: str) -> RepoJournal:
+        """Returns what the journal says about this repo."""
+        with self._lock:
+            return self._repos.get(_key(owner, repo), RepoJournal())
+
+    def get_failed_apps(self) -> pd.DataFrame:
+        """Returns the apps whose last entry was a failure, with the stage
+        which failed and why, so they can be replayed in bulk."""
+        with self._lock:
+            failures = [(repo.app_url, repo.failure['failed_stage'],
+                    repo.failure['reason'])
+                for repo in self._repos.values() if repo.failure is not None]
+        return pd.DataFrame(failures,
+            columns=['app_url', 'failed_stage', 'reason'])
+
+    def to_frame(self) -> pd.DataFrame:
+        """Returns the furthest stage reached by each repo in the journal."""
+        rows = []
+        with self._lock:
+            for (owner, repo), repo_journal in self._repos.items():
+                finished = [stage for stage in STAGES
+                    if repo_journal.is_finished(stage)]
+                if repo_journal.failure is not None:
+                    stage = FAILED
+                elif finished:
+                    stage = finished[-1]
+                else:
+                    stage = None
+                rows.append((owner, repo, repo_journal.app_url, stage))
+        return pd.DataFrame(rows, columns=['owner', 'repo', 'app_url', 'stage'])
+
+def get_journal(path: str = FORK_JOURNAL_PATH) -> ForkJournal:
+    """Returns the shared journal at this path."""
+    return sqlite_store.get_shared(ForkJournal, path)
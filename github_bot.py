@@ -4,15 +4,33 @@ against the GitHub API. It provides three major pieces of functionality:
 1. A map API which lets you run operations against GitHub (wrapping PyGithub)
 2. Automatic caching and rate limiting to prevent too many GitHub API calls.
 3. Graphical output to the Streamlit app.
+
+`GitHubBot.map` runs a function over many items across a bounded pool of
+threads. Every call shares the rate limit budgets in `github_rate_limit`,
+failed items are retried according to a `RetryPolicy`, and each item's
+outcome is stored in `map_results`, so a re-run only redoes the items which
+didn't succeed. Progress goes to the current `reporting.Reporter`.
 """
 
+import concurrent.futures
+import random
+import time
+import pandas as pd
+import requests
 import streamlit as st
 import github
-from typing import Any
+import github_transport
+import github_etag_cache
+import github_completion
+import github_metrics
+import github_rate_limit
+import github_token_pool
+import map_results
+import reporting
+from typing import Any, Callable, Iterable, Optional, Sequence, Tuple
 
 def _dont_hash(x: Any) -> None:
     """Streamit hash function which completely ingnores whateve x is."""
-    st.write(f"Calling _dont_hash on an object of type {type(x)}")
     return None
 
 # These are the hash functions which enable us to hash these types properly
@@ -20,6 +38,61 @@ _HASH_FUNCS = {
     "github_bot.GitHubBot": _dont_hash,
 }
 
+# The budgets a rate limited call may have run out of, if we don't know which.
+RATE_LIMIT_RESOURCES = ['core', 'search', 'graphql']
+
+def _is_rate_limited(exception: Exception) -> bool:
+    """True for both the primary and the secondary rate limits."""
+    if isinstance(exception, github.RateLimitExceededException):
+        return True
+    if isinstance(exception, github.GithubException) and \
+            exception.status in (403, 429):
+        data = exception.data if isinstance(exception.data, dict) else {}
+        message = str(data.get('message', '')).lower()
+        return 'rate limit' in message or 'abuse' in message
+    return False
+
+class RetryPolicy:
+    """Which failures of a mapped function to retry, and how long to wait.
+
+    Rate limits are waited out until the shared budget resets. Server errors
+    and network errors are retried with exponential backoff and jitter.
+    Anything else, like a 404 or a 422, fails the item straight away."""
+
+    # Github's server errors, which are usually transient.
+    RETRY_STATUSES = (500, 502, 503, 504)
+
+    def __init__(self, max_attempts: int = 3, first_backoff_seconds: float = 1.0,
+            max_backoff_seconds: float = 60.0,
+            max_rate_limit_wait_seconds: float = 60.0 * 60.0) -> None:
+        """Constructor."""
+        self.max_attempts = max_attempts
+        self.first_backoff_seconds = first_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.max_rate_limit_wait_seconds = max_rate_limit_wait_seconds
+
+    def get_wait_seconds(self, exception: Exception, attempt: int,
+            resource: Optional[str] = None) -> Optional[float]:
+        """Returns how long to wait before trying again after this attempt
+        failed, or None if we shouldn't. If we were rate limited, we wait
+        for the budget of resource, the one the failed request counted
+        against, or for every budget if we don't know which."""
+        if attempt >= self.max_attempts:
+            return None
+        if _is_rate_limited(exception):
+            resources = [resource] if resource else RATE_LIMIT_RESOURCES
+            wait_seconds = max(github_rate_limit.seconds_until_available(
+                resource) for resource in resources)
+            return min(max(wait_seconds, self.first_backoff_seconds),
+                self.max_rate_limit_wait_seconds)
+        if isinstance(exception, requests.RequestException) or \
+                (isinstance(exception, github.GithubException) and
+                exception.status in self.RETRY_STATUSES):
+            backoff = self.first_backoff_seconds * 2 ** (attempt - 1)
+            return min(backoff, self.max_backoff_seconds) * \
+                random.uniform(0.5, 1.0)
+        return None
+
 class GitHubBot:
     @staticmethod
     def from_user_defined_token() -> "GitHubBot":
@@ -31,16 +104,99 @@ class GitHubBot:
 
     @staticmethod
     @st.cache(hash_funcs=_HASH_FUNCS)
-    def from_access_token(access_token: str) -> "GitHubBot":
+    def from_access_token(access_token: str,
+            read_tokens: Tuple[str, ...] = ()) -> "GitHubBot":
         """Returns a ghitub object from an access token."""
-        return GitHubBot(access_token)
-
-    def __init__(self, access_token: str) -> None:
-        """The construtor takes an access token."""
-        self.github = github.Github(access_token) 
-        
-        # Outputting the type so that I can figure out the right type for _HASH_FUNCS:
-        st.write(f"self.github has type `{type(self.github)}`")
+        return GitHubBot(access_token, read_tokens=read_tokens)
+
+    def __init__(self, access_token: str,
+            base_url: str = github.MainClass.DEFAULT_BASE_URL,
+            read_tokens: Sequence[str] = ()) -> None:
+        """The construtor takes an access token. Pass base_url to talk to
+        another server, like `fake_github`. Reads are spread over the access
+        token and any read_tokens, while the bot's writes always come from
+        the access token."""
+        github_transport.install()
+        github_etag_cache.install()
+        github_metrics.install()
+        github_completion.install()
+        github_token_pool.use_tokens(access_token, read_tokens)
+        self.github = github.Github(access_token, base_url=base_url)
+
+    def map(self, inputs: Iterable[Any],
+            func: Callable[[github.Github, Any], Any],
+            name: Optional[str] = None,
+            key: Callable[[Any], str] = str,
+            retry: Optional[RetryPolicy] = None,
+            num_workers: int = 8,
+            stage_limit: Optional[github_rate_limit.StageLimit] = None,
+            results_path: str = map_results.MAP_RESULTS_PATH) -> pd.DataFrame:
+        """Calls `func(github, item)` for every item in inputs, and returns
+        a DataFrame with one row per item, in order, with columns key,
+        status, result, error, attempts and cached.
+
+        Items are told apart by `key(item)`, and results are stored under
+        name, which defaults to the function's name, so a re-run with the
+        same name skips every item which already succeeded, returning its
+        stored result with cached set. Results must be JSON serializable,
+        or they're stored as strings. Failed items are retried according
+        to retry, and then recorded with the error. If given, stage_limit
+        paces the calls, e.g. for content-creating writes."""
+        name = name or func.__name__
+        retry = retry or RetryPolicy()
+        reporter = reporting.get_reporter()
+        store = map_results.get_results(results_path)
+        inputs = list(inputs)
+        keys = [key(item) for item in inputs]
+        stored = store.get_many(name, list(dict.fromkeys(keys)))
+
+        def call_with_retries(item_and_key):
+            item, item_key = item_and_key
+            previous = stored.get(item_key)
+            if previous is not None and previous.status == map_results.SUCCEEDED:
+                return item_key, previous.status, previous.result, None, \
+                    previous.attempts, True
+            attempt = 0
+            while True:
+                attempt += 1
+                try:
+                    if stage_limit is None:
+                        result = func(self.github, item)
+                    else:
+                        with stage_limit.slot():
+                            result = func(self.github, item)
+                    store.put(name, item_key, map_results.SUCCEEDED, result,
+                        None, attempt)
+                    return item_key, map_results.SUCCEEDED, result, None, \
+                        attempt, False
+                except Exception as e:
+                    # The failed call's last request is the one which was
+                    # rate limited, if any was.
+                    wait_seconds = retry.get_wait_seconds(e, attempt,
+                        github_rate_limit.get_last_resource())
+                    if wait_seconds is None:
+                        store.put(name, item_key, map_results.FAILED, None,
+                            repr(e), attempt)
+                        return item_key, map_results.FAILED, None, repr(e), \
+                            attempt, False
+                    reporter.debug(f"`{name}` retrying `{item_key}` in "
+                        f"{wait_seconds:.1f}s after {e!r}")
+                    time.sleep(wait_seconds)
+                    github_metrics.get_metrics().record_sleep(
+                        f'retry_{name}', wait_seconds)
+
+        rows = []
+        with concurrent.futures.ThreadPoolExecutor(num_workers) as executor:
+            for row in executor.map(call_with_retries, zip(inputs, keys)):
+                rows.append(row)
+                reporter.progress(len(rows), len(inputs), name)
+        results = pd.DataFrame(rows, columns=['key', 'status', 'result',
+            'error', 'attempts', 'cached'])
+        num_failed = (results.status == map_results.FAILED).sum()
+        reporter.info(f"`{name}`: {len(results) - num_failed} succeeded "
+            f"({results.cached.sum()} from earlier runs), {num_failed} failed.")
+        reporter.flush()
+        return results
 
 # These are the name that are exposed when someone imports * from this module.
 __all__ = ["GitHubBot"]
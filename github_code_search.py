@@ -0,0 +1,136 @@
+"""Streaming, sharded and checkpointed Github code search.
+
+Github stops returning results after the first 1000 of any search, and
+PyGithub's paginated lists fetch 30 results per page. So large searches are
+split into shards by file size (`size:low..high`), halving the range until
+each shard has at most 1000 results, and each shard is fetched 100 results
+per page. Every page is checkpointed in SQLite as it arrives, so a crawl
+which is interrupted, e.g. by the rate limit, resumes where it left off.
+See: https://docs.github.com/en/rest/reference/search#search-code
+"""
+
+import json
+import math
+import time
+import reporting
+import sqlite_store
+from github import ContentFile
+from github import MainClass as GithubMainClass
+from typing import Iterator, List, Optional, Tuple
+
+# Github returns at most this many results for any one search.
+MAX_RESULTS = 1000
+
+# The most results Github returns per page.
+PAGE_SIZE = 100
+
+# Github only indexes files smaller than this, in bytes.
+MAX_FILE_SIZE = 384 * 1024
+
+# Where the checkpoints live on disk.
+CHECKPOINT_PATH = 'code_search_checkpoints.sqlite'
+
+# Pages older than this are fetched again.
+CHECKPOINT_TTL_SECONDS = 60 * 60 * 24
+
+class SearchCheckpoints(sqlite_store.SqliteStore):
+    """Pages of search results we've already fetched, stored in SQLite."""
+
+    SCHEMA = ["""
+        CREATE TABLE IF NOT EXISTS pages (
+            query TEXT,
+            page INTEGER,
+            total_count INTEGER,
+            items TEXT,
+            fetched_at REAL,
+            PRIMARY KEY (query, page)
+        )"""]
+
+    def get(self, query: str, page: int) -> Optional[Tuple[int, List[dict]]]:
+        """Returns the (total_count, items) we fetched for this page of this
+        query, or None if we haven't fetched it recently."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT total_count, items FROM pages "
+                "WHERE query = ? AND page = ? AND fetched_at > ?",
+                (query, page, time.time() - CHECKPOINT_TTL_SECONDS)).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def put(self, query: str, page: int, total_count: int,
+            items: List[dict]) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)",
+                (query, page, total_count, json.dumps(items), time.time()))
+
+    def clear(self, query_prefix: str = '') -> None:
+        """Forgets every page of every query starting with this prefix."""
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM pages WHERE substr(query, 1, ?) = ?",
+                (len(query_prefix), query_prefix))
+
+def get_checkpoints(path: str = CHECKPOINT_PATH) -> SearchCheckpoints:
+    """Returns the shared checkpoints at this path."""
+    return sqlite_store.get_shared(SearchCheckpoints, path)
+
+def _get_page(github: GithubMainClass.Github, query: str, page: int,
+        checkpoints: SearchCheckpoints) -> Tuple[int, List[dict]]:
+    """Returns the total count and items of one page of results, from the
+    checkpoints if we can."""
+    checkpoint = checkpoints.get(query, page)
+    if checkpoint is not None:
+        return checkpoint
+    requester = github._Github__requester
+    _, response = requester.requestJsonAndCheck('GET', '/search/code',
+        parameters={'q': query, 'per_page': PAGE_SIZE, 'page': page})
+    total_count, items = response['total_count'], response['items']
+    checkpoints.put(query, page, total_count, items)
+    return total_count, items
+
+def _search_shard(github: GithubMainClass.Github, query: str,
+        size_range: Optional[Tuple[int, int]],
+        checkpoints: SearchCheckpoints) -> Iterator[List[dict]]:
+    """Yields pages of results for the query, restricted to files in this
+    size range, splitting the range in two while it has too many results."""
+    shard_query = query
+    if size_range is not None:
+        shard_query = f"{query} size:{size_range[0]}..{size_range[1]}"
+    total_count, items = _get_page(github, shard_query, 1, checkpoints)
+    if total_count > MAX_RESULTS:
+        low, high = size_range or (0, MAX_FILE_SIZE)
+        if low < high:
+            middle = (low + high) // 2
+            yield from _search_shard(github, query, (low, middle), checkpoints)
+            yield from _search_shard(github, query, (middle + 1, high),
+                checkpoints)
+            return
+        reporting.get_reporter().warning(f"Only the first {MAX_RESULTS} of "
+            f"{total_count} results are available for `{shard_query}`.")
+
+    yield items
+    num_pages = math.ceil(min(total_count, MAX_RESULTS) / PAGE_SIZE)
+    for page in range(2, num_pages + 1):
+        _, items = _get_page(github, shard_query, page, checkpoints)
+        if not items:
+            break
+        yield items
+
+def search_code(github: GithubMainClass.Github, query: str,
+        checkpoints: SearchCheckpoints = None) -> Iterator[ContentFile.ContentFile]:
+    """Yields every file matching this code search, a page at a time, even
+    past Github's 1000 result limit. Pages already in the checkpoints don't
+    cost any API calls."""
+    checkpoints = checkpoints or get_checkpoints()
+    requester = github._Github__requester
+
+    # Results can shift between pages while we crawl, so skip repeats.
+    seen = set()
+    for items in _search_shard(github, query, None, checkpoints):
+        for item in items:
+            if item['html_url'] in seen:
+                continue
+            seen.add(item['html_url'])
+            yield ContentFile.ContentFile(requester, {}, item, completed=False)
@@ -0,0 +1,104 @@
+"""Detects, and can forbid, the API calls PyGithub hides in attribute reads.
+
+PyGithub objects are completed lazily. An object built from a listing, a
+search result or a nested field only has the fields which came with it, and
+reading any other field quietly GETs the whole object, e.g. the `content`
+of a file from a directory listing, or the login of `github.get_user()`.
+Those calls don't show up in the code, so they're easy to add by accident
+and hard to find in the metrics.
+
+`install` wraps PyGithub's completion so that every one is counted by class,
+and, depending on the mode, reported or refused with `LazyCompletionError`.
+The pipeline only reads fields which come with the responses it asks for,
+so with completions forbidden, a run makes exactly the calls it spells out.
+"""
+
+import collections
+import contextlib
+import threading
+import reporting
+from github.GithubObject import CompletableGithubObject
+from typing import Dict
+
+# What happens when PyGithub wants to complete an object.
+ALLOW = 'allow'
+WARN = 'warn'
+FORBID = 'forbid'
+MODES = [ALLOW, WARN, FORBID]
+
+class LazyCompletionError(RuntimeError):
+    """Raised when a field read would cost a hidden API call while hidden
+    calls are forbidden."""
+
+    def __init__(self, class_name: str, url: str) -> None:
+        RuntimeError.__init__(self, f"Reading this field of a {class_name} "
+            f"would GET {url}. Ask for the field explicitly instead.")
+        self.class_name = class_name
+        self.url = url
+
+# The mode for every thread, unless one sets its own with `completion_mode`.
+_mode = ALLOW
+_thread_local = threading.local()
+
+# How many completions we've seen, by class name.
+_completions = collections.Counter()
+_lock = threading.Lock()
+
+# PyGithub's own completion, which we wrap.
+_original_complete = None
+
+def _complete(self) -> None:
+    """Stands in for `CompletableGithubObject.__complete`."""
+    class_name = type(self).__name__
+    url = self._url.value
+    with _lock:
+        _completions[class_name] += 1
+    mode = get_mode()
+    if mode == FORBID:
+        raise LazyCompletionError(class_name, url)
+    elif mode == WARN:
+        reporting.get_reporter().warning(
+            f"Hidden API call to complete a {class_name}: GET {url}")
+    _original_complete(self)
+
+def install() -> None:
+    """Counts every lazy completion from now on. Safe to call often."""
+    global _original_complete
+    if _original_complete is None:
+        _original_complete = \
+            CompletableGithubObject._CompletableGithubObject__complete
+        CompletableGithubObject._CompletableGithubObject__complete = _complete
+
+def set_mode(mode: str) -> None:
+    """Sets whether lazy completions are allowed, reported as warnings or
+    forbidden, for every thread."""
+    global _mode
+    if mode not in MODES:
+        raise ValueError(f"Unknown lazy completion mode: {mode}")
+    _mode = mode
+
+def get_mode() -> str:
+    """Returns the mode for the current thread."""
+    return getattr(_thread_local, 'mode', None) or _mode
+
+@contextlib.contextmanager
+def completion_mode(mode: str):
+    """Context manager which sets the mode for the current thread only."""
+    if mode not in MODES:
+        raise ValueError(f"Unknown lazy completion mode: {mode}")
+    previous_mode = getattr(_thread_local, 'mode', None)
+    _thread_local.mode = mode
+    try:
+        yield
+    finally:
+        _thread_local.mode = previous_mode
+
+def get_completions() -> Dict[str, int]:
+    """Returns how many objects of each class were completed, or refused."""
+    with _lock:
+        return dict(_completions)
+
+def reset() -> None:
+    """Forgets the completions counted so far."""
+    with _lock:
+        _completions.clear()
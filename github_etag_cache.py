@@ -0,0 +1,168 @@
+"""A persistent HTTP cache which turns repeat Github GETs into conditional
+requests.
+
+Github doesn't count `304 Not Modified` responses against the rate limit.
+So we store every GET response which carries an ETag or Last-Modified header
+on disk, keyed by URL, send If-None-Match / If-Modified-Since the next time
+the same URL is requested, and serve the stored body when Github answers
+304. Re-scanning repos which haven't changed then costs almost nothing.
+See: https://docs.github.com/en/rest/overview/resources-in-the-rest-api#conditional-requests
+
+The cache is bounded in size, and evicts the least recently used responses.
+"""
+
+import json
+import time
+import github_transport
+import sqlite_store
+
+# Where the cache lives on disk.
+CACHE_PATH = 'github_http_cache.sqlite'
+
+# The maximum total size of the cached bodies.
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+
+# Once over the limit, we evict down to this fraction of it so that we
+# don't have to evict on every insert.
+EVICT_TO_FRACTION = 0.9
+
+class ResponseCache(sqlite_store.SqliteStore):
+    """Stores Github responses on disk with their validators."""
+
+    SCHEMA = ["""
+        CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            headers TEXT NOT NULL,
+            body TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            last_access REAL NOT NULL
+        )""", """
+        CREATE INDEX IF NOT EXISTS responses_by_access
+        ON responses (last_access)"""]
+
+    def __init__(self, path: str, max_bytes: int) -> None:
+        """Constructor."""
+        sqlite_store.SqliteStore.__init__(self, path)
+        self.max_bytes = max_bytes
+        self._total_bytes = self._connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, key: str):
+        """Returns (etag, last_modified, headers, body) or None."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT etag, last_modified, headers, body FROM responses "
+                "WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, headers, body = row
+        return etag, last_modified, json.loads(headers), body
+
+    def touch(self, key: str) -> None:
+        """Marks this entry as recently used."""
+        with self._lock:
+            self._connection.execute("UPDATE responses SET last_access = ? "
+                "WHERE key = ?", (time.time(), key))
+            self._connection.commit()
+
+    def put(self, key: str, etag: str, last_modified: str,
+            headers: dict, body: str) -> None:
+        """Stores a response, evicting old ones if we're over the limit."""
+        size = len(body)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old_size = self._connection.execute(
+                "SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if old_size is not None:
+                self._total_bytes -= old_size[0]
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, etag, last_modified, json.dumps(headers), body, size,
+                    time.time()))
+            self._total_bytes += size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+            self._connection.commit()
+
+    def _evict(self) -> None:
+        """Deletes the least recently used responses. Must hold the lock."""
+        target_bytes = self.max_bytes * EVICT_TO_FRACTION
+        rows = self._connection.execute(
+            "SELECT key, size FROM responses ORDER BY last_access")
+        evicted = []
+        for key, size in rows:
+            if self._total_bytes <= target_bytes:
+                break
+            evicted.append((key,))
+            self._total_bytes -= size
+        self._connection.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+def _get_key(request) -> str:
+    """The cache key for a request. The Accept header is included since it
+    changes the shape of the response. The token is deliberately not: Github
+    computes ETags from the response body, so a stored validator simply won't
+    match if another token would see something different."""
+    return f"{request.host}{request.url} {request.headers.get('Accept', '')}"
+
+class ConditionalRequestHook(github_transport.TransportHook):
+    """Makes GETs conditional, and serves the cached body on a 304."""
+
+    def __init__(self, cache: ResponseCache) -> None:
+        """Constructor."""
+        self.cache = cache
+
+    def before_request(self, request) -> None:
+        request.cached_response = None
+        if request.verb != 'GET':
+            return
+        # PyGithub's own `update()` sends conditional requests itself, and
+        # expects to see the 304.
+        if 'If-None-Match' in request.headers or \
+                'If-Modified-Since' in request.headers:
+            return
+        cached_response = self.cache.get(_get_key(request))
+        if cached_response is None:
+            return
+        etag, last_modified, _, _ = cached_response
+        if etag:
+            request.headers['If-None-Match'] = etag
+        if last_modified:
+            request.headers['If-Modified-Since'] = last_modified
+        request.cached_response = cached_response
+
+    def after_response(self, request, response):
+        if request.verb != 'GET':
+            return response
+        key = _get_key(request)
+        if response.status == 304 and request.cached_response is not None:
+            # Serve the stored body, but keep the fresh headers since they
+            # carry the current rate limit.
+            _, _, headers, body = request.cached_response
+            headers.update(response.headers)
+            self.cache.touch(key)
+            response = github_transport.Response(200, headers, body)
+            response.from_cache = True
+        elif response.status == 200:
+            etag = response.headers.get('etag')
+            last_modified = response.headers.get('last-modified')
+            if etag or last_modified:
+                self.cache.put(key, etag, last_modified,
+                    dict(response.headers), response.text)
+        return response
+
+def install(path: str = CACHE_PATH, max_bytes: int = MAX_CACHE_BYTES) -> None:
+    """Puts the cache underneath every PyGithub client. Safe to call often."""
+    existing_hook = github_transport.get_hook('etag_cache')
+    if existing_hook is not None and existing_hook.cache.path == path:
+        existing_hook.cache.max_bytes = max_bytes
+        return
+    cache = ResponseCache(path, max_bytes)
+
+    # Make requests conditional before the rate limit paces them, since a
+    # 304 is free. The cache key ignores the token, so it doesn't matter
+    # whether the token pool has swapped it yet.
+    github_transport.register_hook('etag_cache', ConditionalRequestHook(cache),
+        first=True)
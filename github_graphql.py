@@ -0,0 +1,190 @@
+"""Batched repo lookups through the Github GraphQL API.
+
+Working out an app's status over REST costs several calls per repo: the repo
+itself, the root contents listing, and the README blob. GraphQL lets us ask
+for all of that, for up to 100 repos at a time, in a single request by
+aliasing one `repository(owner:, name:)` node per repo.
+See: https://docs.github.com/en/graphql
+"""
+
+import github_metrics
+import streamlit_github
+from datetime import datetime
+from github import MainClass as GithubMainClass
+from github import RateLimitExceededException
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+# The most repos we put in one query. Github limits queries to 500,000 nodes,
+# and root tree listings can be large, so we stay well under that.
+MAX_BATCH_SIZE = 100
+
+# We ask for these README names directly, since they cover almost every
+# repo. Any other capitalization costs a follow-up query.
+COMMON_README_NAMES = ['README.md', 'readme.md']
+
+_REPO_FIELDS = """
+    isFork
+    pushedAt
+    updatedAt
+    defaultBranchRef { name }
+    root: object(expression: "HEAD:") {
+        ... on Tree { entries { name type } }
+    }
+"""
+
+_README_FIELD = """
+    readme%(index)d: object(expression: "HEAD:%(name)s") {
+        ... on Blob { oid text }
+    }
+"""
+
+class GraphQLError(RuntimeError):
+    """Raised when Github couldn't answer part of a query for some other
+    reason than a repo not existing, e.g. rate limiting or a timeout, so
+    that no repo is mistaken for a missing one."""
+
+    def __init__(self, errors: list) -> None:
+        RuntimeError.__init__(self, "GraphQL query failed: " +
+            '; '.join(error.get('message', str(error)) for error in errors))
+        self.errors = errors
+
+def graphql(github: GithubMainClass.Github, query: str,
+        variables: dict) -> Tuple[dict, list]:
+    """Runs a GraphQL query with the client's credentials and returns
+    (data, errors). Github returns partial data alongside errors, e.g. when
+    one of several repos doesn't exist, so errors aren't raised here."""
+    requester = github._Github__requester
+    _, response = requester.requestJsonAndCheck('POST', '/graphql',
+        input={'query': query, 'variables': variables})
+    return response.get('data') or {}, response.get('errors') or []
+
+def _repo_query(repos: List[Tuple[str, str]], fields: List[str]) -> Tuple[str, dict]:
+    """Builds a query with one aliased repository node per repo. `fields`
+    holds the GraphQL fields to fetch for each repo, in the same order."""
+    params, nodes, variables = [], [], {}
+    for i, ((owner, name), repo_fields) in enumerate(zip(repos, fields)):
+        params.append(f'$owner{i}: String!, $name{i}: String!')
+        nodes.append(f'repo{i}: repository(owner: $owner{i}, name: $name{i}) '
+            f'{{ {repo_fields} }}')
+        variables[f'owner{i}'] = owner
+        variables[f'name{i}'] = name
+    query = f"query({', '.join(params)}) {{ {' '.join(nodes)} }}"
+    return query, variables
+
+def _get_missing_repos(data: dict, errors: list, num_repos: int) -> Set[str]:
+    """Returns the aliases of the repos in a `_repo_query` which don't
+    exist, i.e. which Github answered with a NOT_FOUND error of their own.
+    Raises GraphQLError if there are any other errors, or if any other repo
+    is missing from the data."""
+    # A missing repo's error points at its alias, not at a field inside it.
+    is_not_found = lambda error: error.get('type') == 'NOT_FOUND' \
+        and len(error.get('path') or []) == 1
+    missing = {error['path'][0] for error in errors if is_not_found(error)}
+    other_errors = [error for error in errors if not is_not_found(error)]
+    if other_errors:
+        raise GraphQLError(other_errors)
+    unanswered = [f'repo{i}' for i in range(num_repos)
+        if data.get(f'repo{i}') is None and f'repo{i}' not in missing]
+    if unanswered:
+        raise GraphQLError([{'message': f"No data for {', '.join(unanswered)}"}])
+    return missing
+
+def _readme_fields(names: List[str]) -> str:
+    return ''.join(_README_FIELD % {'index': i, 'name': name}
+        for i, name in enumerate(names))
+
+def _find_readme_name(repo_data: dict) -> Optional[str]:
+    """Returns the name of the README in the repo root, matching `get_readme`."""
+    root = repo_data.get('root') or {}
+    for entry in root.get('entries', []):
+        if entry['type'] == 'blob' and entry['name'].lower() == 'readme.md':
+            return entry['name']
+    return None
+
+def _parse_datetime(value: Optional[str]) -> Optional[datetime]:
+    """Parses a GraphQL timestamp into a naive UTC datetime, like PyGithub."""
+    if value is None:
+        return None
+    return datetime.strptime(value, '%Y-%m-%dT%H:%M:%SZ')
+
+def _summarize(repo_data: Optional[dict]) -> Optional[dict]:
+    """Turns a repository node into a summary, or None if it doesn't exist."""
+    if repo_data is None:
+        return None
+    default_branch = repo_data['defaultBranchRef']
+    summary = {
+        'fork': repo_data['isFork'],
+        'default_branch': default_branch and default_branch['name'],
+        'pushed_at': _parse_datetime(repo_data['pushedAt']),
+        'updated_at': _parse_datetime(repo_data['updatedAt']),
+        'readme_path': _find_readme_name(repo_data),
+        'readme_sha': None,
+        'readme_text': None,
+    }
+    for i, name in enumerate(COMMON_README_NAMES):
+        readme = repo_data.get(f'readme{i}')
+        if readme and name == summary['readme_path']:
+            summary['readme_sha'] = readme['oid']
+            summary['readme_text'] = readme['text']
+    return summary
+
+@streamlit_github.rate_limit('graphql')
+def _query_repos(github: GithubMainClass.Github, repos: List[Tuple[str, str]],
+        fields: List[str]) -> dict:
+    """Runs a `_repo_query` and returns its data, in which repos which don't
+    exist are None. If Github rate limits us, we wait for the budget to
+    reset and try again. Raises GraphQLError for any other error."""
+    query, variables = _repo_query(repos, fields)
+    data, errors = graphql(github, query, variables)
+    if any(error.get('type') == 'RATE_LIMITED' for error in errors):
+        raise RateLimitExceededException(403, {'errors': errors})
+    _get_missing_repos(data, errors, len(repos))
+    return data
+
+@github_metrics.helper
+def get_batch_summaries(github: GithubMainClass.Github,
+        repos: List[Tuple[str, str]]) -> Dict[Tuple[str, str], Optional[dict]]:
+    """Returns a summary for each (owner, name) in repos, of which there
+    may be up to MAX_BATCH_SIZE, or None for repos which don't exist. This
+    costs one query, plus one for any READMEs with unusual names. Raises
+    GraphQLError if the batch fails for any reason besides rate limits.
+    Each summary holds `fork`, `default_branch`, `pushed_at`, `updated_at`
+    and the README `readme_path`, `readme_sha` and `readme_text`, which are
+    None if there is no README."""
+    fields = _REPO_FIELDS + _readme_fields(COMMON_README_NAMES)
+    data = _query_repos(github, repos, [fields] * len(repos))
+    summaries = {repo: _summarize(data.get(f'repo{i}'))
+        for i, repo in enumerate(repos)}
+
+    # Fetch READMEs with unusual names in a single follow-up query.
+    missing = [repo for repo in repos if summaries[repo]
+        and summaries[repo]['readme_path']
+        and summaries[repo]['readme_text'] is None]
+    if not missing:
+        return summaries
+    readme_fields = [_readme_fields([summaries[repo]['readme_path']])
+        for repo in missing]
+    data = _query_repos(github, missing, readme_fields)
+    for i, repo in enumerate(missing):
+        readme = (data.get(f'repo{i}') or {}).get('readme0')
+        if readme:
+            summaries[repo]['readme_sha'] = readme['oid']
+            summaries[repo]['readme_text'] = readme['text']
+    return summaries
+
+def iter_batches(repos: List[Tuple[str, str]],
+        batch_size: int = MAX_BATCH_SIZE) -> Iterator[List[Tuple[str, str]]]:
+    """Splits repos into batches for `get_batch_summaries`."""
+    batch_size = min(batch_size, MAX_BATCH_SIZE)
+    for start in range(0, len(repos), batch_size):
+        yield repos[start:start + batch_size]
+
+def get_repo_summaries(github: GithubMainClass.Github,
+        repos: List[Tuple[str, str]],
+        batch_size: int = MAX_BATCH_SIZE) -> Dict[Tuple[str, str], Optional[dict]]:
+    """Returns `get_batch_summaries` for any number of repos, looking them
+    up batch_size at a time."""
+    summaries = {}
+    for batch in iter_batches(repos, batch_size):
+        summaries.update(get_batch_summaries(github, batch))
+    return summaries
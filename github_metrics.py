@@ -0,0 +1,302 @@
+"""Counts where the badge bot's Github time and rate limit actually go.
+
+A transport hook times every request and counts it by endpoint, by the
+helper which made it (see `helper` and `cached_helper`) and by status. The
+helpers also count how often their Streamlit cache hits. Together with the
+rate limit budgets and the time spent sleeping, all of this can be exported
+as a JSON snapshot or in the Prometheus text format.
+See: https://prometheus.io/docs/instrumenting/exposition_formats/
+"""
+
+import collections
+import functools
+import json
+import threading
+import time
+import urllib.parse
+import github_transport
+import github_rate_limit
+from typing import Callable, List
+
+# The upper bounds of the latency histogram buckets, in seconds.
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+# Requests made outside of any helper are counted under this name.
+NO_HELPER = 'none'
+
+# The rate limit resources whose budgets we report.
+RESOURCES = ['core', 'search', 'graphql']
+
+# Path segments which name the segment after them, e.g. /branches/:branch.
+_SEGMENT_NAMES = {
+    'branches': ':branch',
+    'pulls': ':number',
+    'issues': ':number',
+    'commits': ':sha',
+    'blobs': ':sha',
+    'trees': ':sha',
+    'users': ':user',
+}
+
+def get_endpoint(verb: str, url: str) -> str:
+    """Returns the endpoint a request url is for, with names and ids
+    replaced by placeholders, e.g. "GET /repos/:owner/:repo/contents/:path"."""
+    parts = urllib.parse.urlsplit(url).path.strip('/').split('/')
+    if parts[0] == 'repos' and len(parts) >= 3:
+        parts[1:3] = [':owner', ':repo']
+    for i in range(1, len(parts)):
+        if parts[i - 1] in ('contents', 'refs'):
+            # These take the rest of the path.
+            parts[i:] = [':path']
+            break
+        elif parts[i - 1] in _SEGMENT_NAMES and not parts[i].startswith(':'):
+            parts[i] = _SEGMENT_NAMES[parts[i - 1]]
+    return f"{verb} /{'/'.join(parts)}"
+
+class Histogram:
+    """A cumulative latency histogram, like a Prometheus histogram."""
+
+    def __init__(self, buckets: List[float] = LATENCY_BUCKETS) -> None:
+        """Constructor."""
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        for i, bucket in enumerate(self.buckets):
+            if value <= bucket:
+                self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+    def to_json(self) -> dict:
+        return {'buckets': dict(zip(map(str, self.buckets), self.counts)),
+            'count': self.count, 'sum': self.sum}
+
+class Metrics:
+    """Everything we count. Safe to update from any thread."""
+
+    def __init__(self) -> None:
+        """Constructor."""
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Forgets everything counted so far."""
+        with self._lock:
+            # Requests keyed by (endpoint, helper, status).
+            self.requests = collections.Counter()
+            self.latency = collections.defaultdict(Histogram)
+            self.helper_calls = collections.Counter()
+            self.cache_misses = collections.Counter()
+            self.http_cache = collections.Counter()
+            self.sleep_seconds = collections.Counter()
+
+    def record_request(self, endpoint: str, helper: str, status: int,
+            seconds: float, cache_result: str = None) -> None:
+        with self._lock:
+            self.requests[endpoint, helper, status] += 1
+            self.latency[endpoint].observe(seconds)
+            if cache_result is not None:
+                self.http_cache[cache_result] += 1
+
+    def record_helper_call(self, helper: str) -> None:
+        with self._lock:
+            self.helper_calls[helper] += 1
+
+    def record_cache_miss(self, helper: str) -> None:
+        with self._lock:
+            self.cache_misses[helper] += 1
+
+    def record_sleep(self, reason: str, seconds: float) -> None:
+        with self._lock:
+            self.sleep_seconds[reason] += seconds
+
+    def snapshot(self) -> dict:
+        """Returns everything we've counted, and the current rate limit
+        budgets, as plain JSON-serializable data."""
+        with self._lock:
+            requests = [{'endpoint': endpoint, 'helper': helper,
+                    'status': status, 'count': count}
+                for (endpoint, helper, status), count
+                in sorted(self.requests.items())]
+            latency = {endpoint: histogram.to_json()
+                for endpoint, histogram in sorted(self.latency.items())}
+            helpers = {}
+            for helper, calls in sorted(self.helper_calls.items()):
+                helpers[helper] = {'calls': calls}
+                if helper in _cached_helpers:
+                    helpers[helper]['cache_misses'] = self.cache_misses[helper]
+                    helpers[helper]['cache_hits'] = \
+                        calls - self.cache_misses[helper]
+            http_cache = dict(self.http_cache)
+            sleep_seconds = dict(self.sleep_seconds)
+
+        # The budgets sleep to pace requests, and keep their own totals.
+        # With a token pool, each token has its own, which we add up.
+        budgets = {}
+        for resource in RESOURCES:
+            token_budgets = github_rate_limit.get_budgets(resource)
+            limits = [budget.limit for budget in token_budgets
+                if budget.limit is not None]
+            remaining = [budget.remaining for budget in token_budgets
+                if budget.remaining is not None]
+            budgets[resource] = {'tokens': len(token_budgets),
+                'limit': sum(limits) if limits else None,
+                'remaining': sum(remaining) if remaining else None,
+                'reset': min((budget.reset for budget in token_budgets),
+                    default=0.0)}
+            seconds_slept = sum(budget.seconds_slept
+                for budget in token_budgets)
+            if seconds_slept:
+                sleep_seconds[f'pace_{resource}'] = seconds_slept
+        return {
+            'time': time.time(),
+            'requests': requests,
+            'latency_seconds': latency,
+            'helpers': helpers,
+            'http_cache': http_cache,
+            'rate_limit': budgets,
+            'sleep_seconds': sleep_seconds,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self) -> str:
+        """Returns a snapshot in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = []
+
+        def metric(name, metric_type, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for suffix, labels, value in samples:
+                if value is None:
+                    continue
+                label_text = ','.join(f'{key}="{_escape(label_value)}"'
+                    for key, label_value in labels.items())
+                label_text = label_text and f"{{{label_text}}}"
+                lines.append(f"{name}{suffix}{label_text} {value}")
+
+        metric('github_requests_total', 'counter',
+            "Github API requests by endpoint, helper and status.",
+            [('', {'endpoint': r['endpoint'], 'helper': r['helper'],
+                'status': r['status']}, r['count'])
+                for r in snapshot['requests']])
+        latency_samples = []
+        for endpoint, histogram in snapshot['latency_seconds'].items():
+            for bucket, count in histogram['buckets'].items():
+                latency_samples.append(('_bucket',
+                    {'endpoint': endpoint, 'le': bucket}, count))
+            latency_samples.append(('_bucket',
+                {'endpoint': endpoint, 'le': '+Inf'}, histogram['count']))
+            latency_samples.append(('_sum', {'endpoint': endpoint},
+                histogram['sum']))
+            latency_samples.append(('_count', {'endpoint': endpoint},
+                histogram['count']))
+        metric('github_request_seconds', 'histogram',
+            "Github API request latency by endpoint.", latency_samples)
+        metric('github_helper_calls_total', 'counter',
+            "Calls to each Github helper, cached or not.",
+            [('', {'helper': helper}, counts['calls'])
+                for helper, counts in snapshot['helpers'].items()])
+        metric('github_helper_cache_misses_total', 'counter',
+            "Calls to each Github helper which missed the Streamlit cache.",
+            [('', {'helper': helper}, counts['cache_misses'])
+                for helper, counts in snapshot['helpers'].items()
+                if 'cache_misses' in counts])
+        metric('github_http_cache_total', 'counter',
+            "Conditional GETs which Github answered with 304 (hit) or not.",
+            [('', {'result': result}, count)
+                for result, count in snapshot['http_cache'].items()])
+        metric('github_sleep_seconds_total', 'counter',
+            "Seconds spent sleeping to stay under the rate limits.",
+            [('', {'reason': reason}, seconds)
+                for reason, seconds in snapshot['sleep_seconds'].items()])
+        for field, help_text in [('limit', "Calls allowed per window."),
+                ('remaining', "Calls left in this window."),
+                ('reset', "When this window resets, in Unix time.")]:
+            metric(f'github_rate_limit_{field}', 'gauge', help_text,
+                [('', {'resource': resource}, budget[field])
+                    for resource, budget in snapshot['rate_limit'].items()])
+        return '\n'.join(lines) + '\n'
+
+def _escape(value) -> str:
+    """Escapes a Prometheus label value."""
+    return str(value).replace('\\', r'\\').replace('"', r'\"') \
+        .replace('\n', r'\n')
+
+# Everything is counted here.
+_metrics = Metrics()
+
+def get_metrics() -> Metrics:
+    """Returns the shared metrics."""
+    return _metrics
+
+# The names of the helpers which are cached.
+_cached_helpers = set()
+
+# The helpers running on each thread, innermost last.
+_thread_local = threading.local()
+
+def _get_helpers() -> List[str]:
+    if not hasattr(_thread_local, 'helpers'):
+        _thread_local.helpers = []
+    return _thread_local.helpers
+
+def current_helper() -> str:
+    """Returns the innermost helper running on this thread."""
+    helpers = _get_helpers()
+    return helpers[-1] if helpers else NO_HELPER
+
+def helper(func: Callable) -> Callable:
+    """Decorator which counts calls to a helper, and attributes the requests
+    it makes to it."""
+    @functools.wraps(func)
+    def wrapped_func(*args, **kwargs):
+        _metrics.record_helper_call(func.__name__)
+        helpers = _get_helpers()
+        helpers.append(func.__name__)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            helpers.pop()
+    return wrapped_func
+
+def cached_helper(cache_decorator: Callable) -> Callable:
+    """Like `helper`, but for helpers cached with `cache_decorator`, e.g.
+    `st.cache(...)`. Calls which run the helper body are cache misses."""
+    def decorator(func):
+        _cached_helpers.add(func.__name__)
+
+        @functools.wraps(func)
+        def missed_func(*args, **kwargs):
+            _metrics.record_cache_miss(func.__name__)
+            return func(*args, **kwargs)
+        return helper(cache_decorator(missed_func))
+    return decorator
+
+class MetricsHook(github_transport.TransportHook):
+    """Times every request, and counts it by endpoint and helper."""
+
+    def before_request(self, request) -> None:
+        request.metrics_start = time.time()
+
+    def after_response(self, request, response):
+        seconds = time.time() - request.metrics_start
+
+        # Whichever order the hooks run in, a 304 is an HTTP cache hit.
+        cache_result = None
+        if response.status == 304 or getattr(response, 'from_cache', False):
+            cache_result = 'hit'
+        elif request.verb == 'GET':
+            cache_result = 'miss'
+        _metrics.record_request(get_endpoint(request.verb, request.url),
+            current_helper(), response.status, seconds, cache_result)
+        return response
+
+def install() -> None:
+    """Counts all Github traffic. Safe to call often."""
+    github_transport.register_hook('metrics', MetricsHook())
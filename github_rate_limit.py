@@ -0,0 +1,223 @@
+"""Proactive Github rate limiting shared by every thread and client.
+
+Github reports the state of the rate limit on every response through the
+X-RateLimit-* headers. We track a `RateBudget` for each limited resource
+("core", "search", "graphql") and access token from those headers, since
+each token has its own limits (see `github_token_pool`), and before each
+request we wait just long enough to spread that token's remaining calls
+evenly over the time left until the limit resets. This keeps throughput
+steady near the limit instead of bursting until Github refuses us and then
+stalling for an hour.
+See: https://docs.github.com/en/rest/overview/resources-in-the-rest-api#rate-limiting
+"""
+
+import contextlib
+import hashlib
+import threading
+import time
+import github_transport
+from typing import List, Optional
+
+# We allow this fraction of the remaining budget to be spent in a burst before
+# pacing kicks in, so that short runs aren't slowed down for no reason.
+BURST_FRACTION = 0.1
+
+# Extra seconds to wait past a reset, since our clock may not match Github's.
+RESET_MARGIN_SECONDS = 1.0
+
+class RateBudget:
+    """The remaining calls for one Github rate limit resource."""
+
+    def __init__(self, resource: str, token_key: Optional[str] = None) -> None:
+        """Constructor."""
+        self.resource = resource
+        self.token_key = token_key
+        self.limit = None
+        self.remaining = None
+        self.reset = 0.0
+        self.seconds_slept = 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def update(self, remaining: int, limit: int, reset: float) -> None:
+        """Updates this budget from the headers of a response."""
+        with self._lock:
+            if reset > self.reset:
+                # This is a new rate limit window.
+                self.reset = reset
+                self.remaining = remaining
+            elif reset == self.reset and self.remaining is not None:
+                # Responses from concurrent threads can arrive out of order,
+                # so the lowest count for this window is the most recent.
+                self.remaining = min(remaining, self.remaining)
+            self.limit = limit
+
+    def exhaust(self, until: float) -> None:
+        """Marks this budget empty until the given time, e.g. when Github
+        tells us we've been rate limited."""
+        with self._lock:
+            self.remaining = 0
+            self.reset = max(self.reset, until)
+
+    def get_remaining(self) -> Optional[int]:
+        """Returns the calls left in this window, or None if we don't know,
+        without waiting."""
+        with self._lock:
+            if time.time() >= self.reset + RESET_MARGIN_SECONDS:
+                return None
+            return self.remaining
+
+    def seconds_until_reset(self) -> float:
+        """Seconds until this budget resets, or 0 if we don't know."""
+        with self._lock:
+            return max(0.0, self.reset + RESET_MARGIN_SECONDS - time.time())
+
+    def acquire(self, conditional: bool = False) -> float:
+        """Blocks until the next call may be made against this budget.
+        Returns the number of seconds we waited. Conditional requests are
+        free when Github answers 304, so they only wait while the budget is
+        exhausted, and don't take a slot from the calls which cost."""
+        with self._lock:
+            now = time.time()
+            if now >= self.reset + RESET_MARGIN_SECONDS:
+                # The window has passed, so we know nothing until the next
+                # response tells us about the new one.
+                self.remaining = None
+            if self.remaining is None:
+                # We haven't seen any headers for this window, so can't pace.
+                return 0.0
+            if self.remaining <= 0:
+                slot = max(self._next_slot, self.reset + RESET_MARGIN_SECONDS)
+                interval = 0.0
+            elif conditional:
+                # If it turns out to cost a call after all, the response's
+                # headers will tell us.
+                return 0.0
+            else:
+                # Spread the remaining calls evenly over the window, but let
+                # a small burst through at the start of it.
+                interval = (self.reset - now) / self.remaining
+                burst = max(1.0, BURST_FRACTION * self.remaining)
+                slot = max(self._next_slot, now - burst * interval)
+                self.remaining -= 1
+            self._next_slot = slot + interval
+            wait_seconds = max(0.0, slot - now)
+            self.seconds_slept += wait_seconds
+        if wait_seconds > 0.0:
+            time.sleep(wait_seconds)
+        return wait_seconds
+
+# One budget per resource and token, shared by every thread.
+_budgets = {}
+_budgets_lock = threading.Lock()
+
+def get_token_key(authorization: Optional[str]) -> Optional[str]:
+    """Returns a short fingerprint of the token in this Authorization header,
+    so we don't keep tokens around in the budgets, or None if there is none."""
+    if not authorization:
+        return None
+    return hashlib.sha256(authorization.encode('utf-8')).hexdigest()[:12]
+
+def get_budget(resource: str, token_key: Optional[str] = None) -> RateBudget:
+    """Returns the shared budget for this resource and token."""
+    with _budgets_lock:
+        if (resource, token_key) not in _budgets:
+            _budgets[resource, token_key] = RateBudget(resource, token_key)
+        return _budgets[resource, token_key]
+
+def get_budgets(resource: str) -> List[RateBudget]:
+    """Returns the budgets of every token we've used for this resource."""
+    with _budgets_lock:
+        return [budget for (budget_resource, _), budget in _budgets.items()
+            if budget_resource == resource]
+
+def seconds_until_available(resource: str) -> float:
+    """Seconds until some token may call this resource again, i.e. 0 unless
+    every token we've used is exhausted."""
+    budgets = get_budgets(resource)
+    if not budgets or any(budget.get_remaining() != 0 for budget in budgets):
+        return 0.0
+    return min(budget.seconds_until_reset() for budget in budgets)
+
+# The resource of the last response each thread received.
+_thread_local = threading.local()
+
+def get_last_resource() -> Optional[str]:
+    """Returns the resource which this thread's last response counted
+    against, e.g. to know which budget a rate limited call ran out of, or
+    None if it hasn't had one."""
+    return getattr(_thread_local, 'last_resource', None)
+
+def get_resource(url: str) -> str:
+    """Returns which rate limit resource this request url counts against."""
+    path = url.split('?')[0]
+    if '/search/' in path:
+        return 'search'
+    elif path.endswith('/graphql'):
+        return 'graphql'
+    elif path.endswith('/rate_limit'):
+        # Checking the rate limit is free.
+        return None
+    else:
+        return 'core'
+
+class StageLimit:
+    """Limits how many calls of one kind run at once, and how often they
+    start. Github's secondary rate limits punish bursts of content creation,
+    like forks, commits and pull requests, even with plenty of budget left.
+    See: https://docs.github.com/en/rest/guides/best-practices-for-integrators#dealing-with-secondary-rate-limits
+    """
+
+    def __init__(self, max_concurrent: int, min_interval_seconds: float) -> None:
+        """Constructor."""
+        self.min_interval_seconds = min_interval_seconds
+        self._semaphore = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+
+    @contextlib.contextmanager
+    def slot(self):
+        """Context manager which blocks until this kind of call may start."""
+        with self._semaphore:
+            with self._lock:
+                start = max(time.time(), self._next_start)
+                self._next_start = start + self.min_interval_seconds
+            time.sleep(max(0.0, start - time.time()))
+            yield
+
+# The headers which make a request conditional, e.g. from `github_etag_cache`,
+# which runs before us.
+CONDITIONAL_HEADERS = ('If-None-Match', 'If-Modified-Since')
+
+class RateBudgetHook(github_transport.TransportHook):
+    """Paces every request which may cost a call, and updates the budgets
+    from every response."""
+
+    def before_request(self, request) -> None:
+        resource = get_resource(request.url)
+        if resource is not None:
+            token_key = get_token_key(request.headers.get('Authorization'))
+            conditional = any(header in request.headers
+                for header in CONDITIONAL_HEADERS)
+            get_budget(resource, token_key).acquire(conditional)
+
+    def after_response(self, request, response):
+        headers = response.headers
+        resource = headers.get('x-ratelimit-resource', get_resource(request.url))
+        if resource is None:
+            return response
+        _thread_local.last_resource = resource
+        token_key = get_token_key(request.headers.get('Authorization'))
+        budget = get_budget(resource, token_key)
+        if 'x-ratelimit-remaining' in headers and 'x-ratelimit-reset' in headers:
+            budget.update(
+                int(headers['x-ratelimit-remaining']),
+                int(headers.get('x-ratelimit-limit', 0)),
+                float(headers['x-ratelimit-reset']))
+
+        # Secondary rate limits tell us how long to back off directly.
+        if response.status in (403, 429) and 'retry-after' in headers:
+            budget.exhaust(time.time() + float(headers['retry-after']))
+        return response
+
+github_transport.register_hook('rate_limit', RateBudgetHook())
@@ -0,0 +1,112 @@
+"""Spreads Github reads over several access tokens.
+
+Each access token has its own rate limits, 5000 core calls and 30 searches a
+minute, so scanning thousands of repos with one token spends most of its
+time waiting for resets. A `TokenPool` sits in the transport and, for every
+read, swaps in whichever of its tokens has the most budget left for that
+resource, so an exhausted token only pauses itself while the others carry
+on. Writes, like forks, commits and pull requests, and anything about the
+authenticated user, must come from the bot's own identity, so they always go
+out with the pool's write token.
+See: https://docs.github.com/en/rest/overview/resources-in-the-rest-api#rate-limiting
+"""
+
+import threading
+import github_rate_limit
+import github_transport
+from typing import List, Optional, Sequence
+
+# The verbs which only read. Graphql queries are POSTs too, and we only
+# ever use Graphql to read.
+READ_VERBS = ('GET', 'HEAD')
+
+# How PyGithub sends a token.
+AUTHORIZATION_FORMAT = 'token {}'
+
+def is_read(verb: str, url: str) -> bool:
+    """True if any of the pool's tokens may make this request."""
+    path = url.split('?')[0]
+    if path == '/user' or path.startswith('/user/'):
+        # These describe whoever the token belongs to.
+        return False
+    return verb in READ_VERBS or path.endswith('/graphql')
+
+class TokenPool(github_transport.TransportHook):
+    """Routes the reads of every client using one of these tokens to the
+    token with the most budget left, and its writes to the write token."""
+
+    def __init__(self, tokens: Sequence[str],
+            write_token: Optional[str] = None) -> None:
+        """Constructor. The write token defaults to the first token."""
+        if not tokens:
+            raise ValueError("A token pool needs at least one token.")
+        self.write_token = write_token or tokens[0]
+        self._authorizations = [AUTHORIZATION_FORMAT.format(token)
+            for token in dict.fromkeys([self.write_token, *tokens])]
+        self._token_keys = [github_rate_limit.get_token_key(authorization)
+            for authorization in self._authorizations]
+        self._lock = threading.Lock()
+        self._next = 0
+
+    def choose(self, resource: str) -> str:
+        """Returns the Authorization header of the token with the most budget
+        left for this resource. Tokens we know nothing about yet come first,
+        so we learn their budgets, and if every token is exhausted we pick
+        the one which resets soonest."""
+        budgets = [github_rate_limit.get_budget(resource, token_key)
+            for token_key in self._token_keys]
+        remaining = [budget.get_remaining() for budget in budgets]
+
+        # Start from a different token each time, so ties are spread out.
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(budgets)
+        order = [(start + i) % len(budgets) for i in range(len(budgets))]
+        available = [i for i in order if remaining[i] != 0]
+        if available:
+            best = max(available, key=lambda i: float('inf')
+                if remaining[i] is None else remaining[i])
+        else:
+            best = min(order, key=lambda i: budgets[i].seconds_until_reset())
+        return self._authorizations[best]
+
+    def before_request(self, request) -> None:
+        # Leave alone clients which don't use one of our tokens.
+        if request.headers.get('Authorization') not in self._authorizations:
+            return
+        resource = github_rate_limit.get_resource(request.url)
+        if resource is not None and is_read(request.verb, request.url):
+            request.headers['Authorization'] = self.choose(resource)
+        else:
+            request.headers['Authorization'] = self._authorizations[0]
+
+def install(tokens: Sequence[str],
+        write_token: Optional[str] = None) -> TokenPool:
+    """Routes the traffic of every client using one of these tokens through
+    a pool of them, replacing any previous pool. Safe to call often."""
+    pool = TokenPool(tokens, write_token)
+    existing_pool = github_transport.get_hook('token_pool')
+    if existing_pool is not None and \
+            existing_pool._authorizations == pool._authorizations:
+        return existing_pool
+
+    # The pool picks the token before the other hooks, like the budgets,
+    # look at the request.
+    github_transport.register_hook('token_pool', pool, first=True)
+    return pool
+
+def uninstall() -> None:
+    """Removes the pool, if any, so every client sends its own token again."""
+    github_transport.unregister_hook('token_pool')
+
+def use_tokens(access_token: str, read_tokens: Sequence[str]) -> None:
+    """Spreads reads over access_token and read_tokens, or stops pooling
+    tokens if there are no read_tokens. Safe to call often."""
+    if read_tokens:
+        install([access_token, *read_tokens])
+    else:
+        uninstall()
+
+def parse_tokens(tokens: Optional[str]) -> List[str]:
+    """Splits a comma or whitespace separated list of tokens."""
+    return (tokens or '').replace(',', ' ').split()
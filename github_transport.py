@@ -0,0 +1,144 @@
+"""The HTTP transport which sits underneath PyGithub.
+
+PyGithub normally reuses one connection object per client, and that object
+stores each request on itself between `request()` and `getresponse()`. This
+is not safe once several threads share a client, so we swap in connection
+classes which hold a whole request / response cycle per instance, and which
+share pooled `requests` sessions per thread.
+
+The transport is also the one place which sees every request and response,
+so other modules register hooks here (see `register_hook`) to observe or
+modify Github traffic."""
+
+import threading
+import requests
+from github.Requester import Requester
+
+# Each thread gets its own session so that keep-alive connections are pooled
+# without being shared across threads.
+_thread_local = threading.local()
+
+def get_session() -> requests.Session:
+    """Returns the requests session for the current thread, which can also
+    be used for requests outside the Github API, e.g. raw files."""
+    if not hasattr(_thread_local, 'session'):
+        _thread_local.session = requests.Session()
+    return _thread_local.session
+
+# Hooks which see every request and response, keyed by name. Registering a
+# hook under an existing name replaces it, so modules can safely register
+# their hooks at import time, even when Streamlit reloads them.
+_hooks = {}
+
+class TransportHook:
+    """Base class for objects which observe or modify Github traffic.
+
+    `before_request` is called on hooks in registration order and may modify
+    the request headers. `after_response` is called in reverse order and
+    returns the response to hand on, so hooks nest like middleware."""
+
+    def before_request(self, request: '_Connection') -> None:
+        pass
+
+    def after_response(self, request: '_Connection',
+            response: 'Response') -> 'Response':
+        return response
+
+def register_hook(name: str, hook: TransportHook, first: bool = False) -> None:
+    """Adds a hook which sees all Github traffic. If first is True, its
+    `before_request` is called before every other hook's, e.g. so that the
+    others see the request as it will be sent."""
+    global _hooks
+    if first:
+        # Swap in a reordered copy, so requests in flight see all the hooks.
+        hooks = {name: hook}
+        hooks.update((other, other_hook) for other, other_hook in _hooks.items()
+            if other != name)
+        _hooks = hooks
+    else:
+        _hooks[name] = hook
+
+def unregister_hook(name: str) -> None:
+    """Removes the hook registered under this name, if there is one."""
+    global _hooks
+    # Swap in a copy, as in `register_hook`.
+    _hooks = {other: other_hook for other, other_hook in _hooks.items()
+        if other != name}
+
+def get_hook(name: str) -> TransportHook:
+    """Returns the hook registered under this name, or None."""
+    return _hooks.get(name)
+
+class Response:
+    """Mimics the httplib response object which PyGithub expects."""
+
+    def __init__(self, status: int, headers: dict, text: str) -> None:
+        """Constructor. The header names must be lowercase."""
+        self.status = status
+        self.headers = headers
+        self.text = text
+
+    def getheaders(self):
+        return self.headers.items()
+
+    def read(self):
+        return self.text
+
+class _Connection:
+    """Mimics the httplib connection object which PyGithub expects.
+
+    PyGithub creates a new one of these for every request once connection
+    classes have been injected, so no state is shared between requests."""
+
+    protocol = None
+    default_port = None
+
+    def __init__(self, host, port=None, strict=False, timeout=None, retry=None,
+            **kwargs) -> None:
+        """Constructor. We don't use PyGithub's `retry` option."""
+        self.host = host
+        self.port = port if port else self.default_port
+        self.timeout = timeout
+        self.verify = kwargs.get('verify', True)
+
+    def request(self, verb, url, input, headers) -> None:
+        self.verb = verb
+        self.url = url
+        self.input = input
+        self.headers = headers
+
+    def getresponse(self) -> Response:
+        hooks = list(_hooks.values())
+        for hook in hooks:
+            hook.before_request(self)
+        response = self._send()
+        for hook in reversed(hooks):
+            response = hook.after_response(self, response)
+        return response
+
+    def _send(self) -> Response:
+        """Actually sends the request over the network."""
+        url = f"{self.protocol}://{self.host}:{self.port}{self.url}"
+        r = get_session().request(self.verb, url,
+            headers=self.headers,
+            data=self.input,
+            timeout=self.timeout,
+            verify=self.verify,
+            allow_redirects=False)
+        headers = {k.lower(): v for k, v in r.headers.items()}
+        return Response(r.status_code, headers, r.text)
+
+    def close(self) -> None:
+        return
+
+class HTTPConnection(_Connection):
+    protocol = 'http'
+    default_port = 80
+
+class HTTPSConnection(_Connection):
+    protocol = 'https'
+    default_port = 443
+
+def install() -> None:
+    """Makes every PyGithub client use this transport. Safe to call often."""
+    Requester.injectConnectionClasses(HTTPConnection, HTTPSConnection)
@@ -0,0 +1,172 @@
+"""Resolves many emails to Github users with as few searches as we can.
+
+The search API only allows 30 calls a minute, so rather than searching for
+one email at a time, we OR together as many emails as Github's query limits
+allow. A search with no results rules out every email in it at once. When a
+search does find users, we match their public profile emails (which costs
+core calls, not search calls) and split whatever is left in half until each
+email is settled. Both hits and misses are stored with a TTL, so reruns only
+search for emails we haven't seen recently.
+See: https://docs.github.com/en/rest/reference/search#limitations-on-query-length
+"""
+
+import json
+import time
+import sqlite_store
+import pandas as pd
+from github import MainClass as GithubMainClass
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+# Github rejects search queries longer than this, or with more operators.
+MAX_QUERY_LENGTH = 256
+MAX_OPERATORS = 5
+
+# The qualifiers we add to every search.
+QUERY_QUALIFIERS = 'type:user in:email'
+
+# If a search finds more users than this, we split it rather than looking
+# up every user's profile.
+MAX_PROFILE_LOOKUPS = 10
+
+# What we found for an email.
+FOUND = 'found'
+NOT_FOUND = 'not found'
+AMBIGUOUS = 'ambiguous'
+
+# How long we trust what we found. Misses expire sooner, since people add
+# emails to their profiles.
+FOUND_TTL_SECONDS = 60 * 60 * 24 * 30
+NOT_FOUND_TTL_SECONDS = 60 * 60 * 24 * 7
+
+# Where the lookups live on disk.
+EMAIL_LOOKUPS_PATH = 'email_lookups.sqlite'
+
+class EmailLookup(NamedTuple):
+    """What we found for one email."""
+    status: str
+    logins: List[str]
+    checked_at: float
+
+    def is_fresh(self, now: float = None) -> bool:
+        now = time.time() if now is None else now
+        ttl = NOT_FOUND_TTL_SECONDS if self.status == NOT_FOUND \
+            else FOUND_TTL_SECONDS
+        return now - self.checked_at < ttl
+
+class EmailLookups(sqlite_store.SqliteStore):
+    """Email lookups keyed by lowercased email, stored in SQLite."""
+
+    SCHEMA = ["""
+        CREATE TABLE IF NOT EXISTS emails (
+            email TEXT PRIMARY KEY,
+            status TEXT,
+            logins TEXT,
+            checked_at REAL
+        )"""]
+
+    def get_many(self, emails: List[str]) -> Dict[str, EmailLookup]:
+        """Returns the lookups we have for these emails."""
+        lookups = {}
+        with self._lock:
+            for start in range(0, len(emails), 400):
+                batch = emails[start:start + 400]
+                rows = self._connection.execute(
+                    "SELECT email, status, logins, checked_at FROM emails "
+                    f"WHERE email IN ({', '.join('?' * len(batch))})",
+                    batch).fetchall()
+                for email, status, logins, checked_at in rows:
+                    lookups[email] = EmailLookup(status, json.loads(logins),
+                        checked_at)
+        return lookups
+
+    def put(self, email: str, status: str, logins: List[str]) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO emails VALUES (?, ?, ?, ?)",
+                (email, status, json.dumps(logins), time.time()))
+
+def get_lookups(path: str = EMAIL_LOOKUPS_PATH) -> EmailLookups:
+    """Returns the shared lookups at this path."""
+    return sqlite_store.get_shared(EmailLookups, path)
+
+def _make_query(emails: List[str]) -> str:
+    return f"{' OR '.join(emails)} {QUERY_QUALIFIERS}"
+
+def _make_groups(emails: List[str]) -> List[List[str]]:
+    """Packs the emails into as few queries as Github's limits allow."""
+    groups = [[]]
+    for email in emails:
+        group = groups[-1] + [email]
+        if len(group) > MAX_OPERATORS + 1 or \
+                len(_make_query(group)) > MAX_QUERY_LENGTH:
+            groups.append([email])
+        else:
+            groups[-1] = group
+    return [group for group in groups if group]
+
+def _search(github: GithubMainClass.Github, emails: List[str]) -> List[str]:
+    """Returns the logins of the users matching any of these emails."""
+    requester = github._Github__requester
+    _, response = requester.requestJsonAndCheck('GET', '/search/users',
+        parameters={'q': _make_query(emails), 'per_page': 100})
+    return [item['login'] for item in response['items']]
+
+def _resolve_group(github: GithubMainClass.Github, emails: List[str],
+        lookups: EmailLookups) -> None:
+    """Settles every email in this group, and stores what we found."""
+    logins = _search(github, emails)
+    if not logins:
+        for email in emails:
+            lookups.put(email, NOT_FOUND, [])
+        return
+    if len(emails) == 1:
+        lookups.put(emails[0], FOUND if len(logins) == 1 else AMBIGUOUS, logins)
+        return
+
+    # See which emails the users we found have on their profiles.
+    remaining = emails
+    if len(logins) <= MAX_PROFILE_LOOKUPS:
+        matches = {email: [] for email in emails}
+        for login in logins:
+            email = (github.get_user(login).email or '').lower()
+            if email in matches:
+                matches[email].append(login)
+        for email, matched_logins in matches.items():
+            if len(matched_logins) > 0:
+                lookups.put(email,
+                    FOUND if len(matched_logins) == 1 else AMBIGUOUS,
+                    matched_logins)
+        remaining = [email for email in emails if not matches[email]]
+
+    # Split up whatever we couldn't settle.
+    if remaining == emails:
+        middle = len(emails) // 2
+        _resolve_group(github, emails[:middle], lookups)
+        _resolve_group(github, emails[middle:], lookups)
+    elif remaining:
+        _resolve_group(github, remaining, lookups)
+
+def resolve_emails(github: GithubMainClass.Github, emails: Iterable[str],
+        lookups: Optional[EmailLookups] = None) -> pd.DataFrame:
+    """Returns a DataFrame with the email, status, login and candidates for
+    each email. The status is one of FOUND, NOT_FOUND or AMBIGUOUS. Logins
+    are only given for FOUND emails, while candidates lists every login
+    which matched an AMBIGUOUS one, so those can be settled by hand.
+    Emails which we looked up recently don't cost any API calls."""
+    lookups = lookups or get_lookups()
+    emails = list(dict.fromkeys(email.strip().lower() for email in emails
+        if isinstance(email, str) and email.strip()))
+    stored = lookups.get_many(emails)
+    unresolved = [email for email in emails
+        if email not in stored or not stored[email].is_fresh()]
+    for group in _make_groups(unresolved):
+        _resolve_group(github, group, lookups)
+
+    rows = []
+    stored = lookups.get_many(emails)
+    for email in emails:
+        lookup = stored[email]
+        login = lookup.logins[0] if lookup.status == FOUND else None
+        rows.append((email, lookup.status, login, ', '.join(lookup.logins)))
+    return pd.DataFrame(rows,
+        columns=['email', 'status', 'login', 'candidates'])
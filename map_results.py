@@ -0,0 +1,78 @@
+"""A durable store of per-item results for `GitHubBot.map`.
+
+Bulk operations over thousands of repos or pull requests get interrupted,
+by the rate limit, a crash or a closed laptop. So `GitHubBot.map` stores the
+outcome of each item as it finishes, keyed by the map's name and the item's
+key, and a re-run skips every item which already succeeded.
+"""
+
+import json
+import time
+import sqlite_store
+from typing import Any, Dict, List, NamedTuple, Optional
+
+# Where the results live on disk.
+MAP_RESULTS_PATH = 'map_results.sqlite'
+
+# The status of an item.
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+class MapResult(NamedTuple):
+    """What happened when we mapped over one item."""
+    status: str
+    result: Any
+    error: Optional[str]
+    attempts: int
+    finished_at: float
+
+class MapResults(sqlite_store.SqliteStore):
+    """Map results keyed by map name and item key, stored in SQLite."""
+
+    SCHEMA = ["""
+        CREATE TABLE IF NOT EXISTS results (
+            map_name TEXT,
+            key TEXT,
+            status TEXT,
+            result TEXT,
+            error TEXT,
+            attempts INTEGER,
+            finished_at REAL,
+            PRIMARY KEY (map_name, key)
+        )"""]
+
+    def get_many(self, map_name: str, keys: List[str]) -> Dict[str, MapResult]:
+        """Returns the results we have for these keys."""
+        results = {}
+        with self._lock:
+            for start in range(0, len(keys), 400):
+                batch = keys[start:start + 400]
+                rows = self._connection.execute(
+                    "SELECT key, status, result, error, attempts, finished_at "
+                    "FROM results WHERE map_name = ? AND "
+                    f"key IN ({', '.join('?' * len(batch))})",
+                    [map_name] + batch).fetchall()
+                for key, status, result, error, attempts, finished_at in rows:
+                    results[key] = MapResult(status, json.loads(result), error,
+                        attempts, finished_at)
+        return results
+
+    def put(self, map_name: str, key: str, status: str, result: Any,
+            error: Optional[str], attempts: int) -> None:
+        """Stores an item's result, which must be JSON serializable, or is
+        stored as its string."""
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (map_name, key, status, json.dumps(result, default=str), error,
+                    attempts, time.time()))
+
+    def clear(self, map_name: str) -> None:
+        """Forgets every result of this map."""
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM results WHERE map_name = ?", (map_name,))
+
+def get_results(path: str = MAP_RESULTS_PATH) -> MapResults:
+    """Returns the shared store at this path."""
+    return sqlite_store.get_shared(MapResults, path)
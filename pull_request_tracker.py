@@ -0,0 +1,158 @@
+"""Tracks whether the badge pull requests we've opened were merged.
+
+Checking each pull request with `repo.get_pull` would cost a core call per
+pull request per refresh. Instead `batch_fork_repos` records every pull
+request it opens here, and a refresh finds everything which changed since
+the last one with a single issue search, `is:pr author:<bot> updated:>=`,
+100 per page. States are kept in SQLite, so the merge rate of each cohort,
+the pull requests opened in the same week, is one local query.
+"""
+
+import datetime
+import pandas as pd
+import bulk_pull_requests
+import streamlit_github
+import sqlite_store
+from github import MainClass as GithubMainClass
+from typing import Optional
+
+# Where the tracker lives on disk.
+PULL_REQUEST_TRACKER_PATH = 'pull_requests.sqlite'
+
+# The states of a pull request.
+OPEN = 'open'
+CLOSED = 'closed'
+MERGED = 'merged'
+
+# Each refresh looks back this far past the last one, in case Github's
+# clock and ours disagree.
+SYNC_OVERLAP = datetime.timedelta(minutes=5)
+
+# How Github formats times in JSON.
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+def get_cohort(created_at: str) -> str:
+    """The cohort of a pull request is the ISO week it was opened in."""
+    year, week, _ = datetime.datetime.strptime(created_at,
+        TIME_FORMAT).isocalendar()
+    return f"{year}-W{week:02d}"
+
+class PullRequestTracker(sqlite_store.SqliteStore):
+    """The state of each pull request keyed by url, stored in SQLite."""
+
+    SCHEMA = ["""
+        CREATE TABLE IF NOT EXISTS pulls (
+            url TEXT PRIMARY KEY,
+            repo TEXT,
+            number INTEGER,
+            app_url TEXT,
+            title TEXT,
+            state TEXT,
+            cohort TEXT,
+            created_at TEXT,
+            updated_at TEXT,
+            closed_at TEXT
+        )""", """
+        CREATE TABLE IF NOT EXISTS syncs (
+            author TEXT PRIMARY KEY,
+            synced_at TEXT
+        )"""]
+
+    def _upsert(self, url: str, repo: str, number: int, app_url: Optional[str],
+            title: str, state: str, created_at: str, updated_at: str,
+            closed_at: Optional[str]) -> None:
+        """Stores a pull request, keeping the app url we already had."""
+        self._connection.execute("""
+            INSERT INTO pulls VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (url) DO UPDATE SET
+                app_url = COALESCE(pulls.app_url, excluded.app_url),
+                title = excluded.title,
+                state = excluded.state,
+                updated_at = excluded.updated_at,
+                closed_at = excluded.closed_at""",
+            (url, repo, number, app_url, title, state, get_cohort(created_at),
+                created_at, updated_at, closed_at))
+
+    def record_opened(self, url: str, repo: str, number: int, app_url: str,
+            title: str, created_at: datetime.datetime) -> None:
+        """Records a pull request we just opened."""
+        created_at = created_at.strftime(TIME_FORMAT)
+        with self._lock, self._connection:
+            self._upsert(url, repo, number, app_url, title, OPEN, created_at,
+                created_at, None)
+
+    def get_open_url(self, repo: str) -> Optional[str]:
+        """Returns the url of our newest open pull request on this repo, or
+        None if we don't know of one."""
+        with self._lock:
+            row = self._connection.execute("""
+                SELECT url FROM pulls
+                WHERE lower(repo) = lower(?) AND state = ?
+                ORDER BY created_at DESC LIMIT 1""", (repo, OPEN)).fetchone()
+        return row and row[0]
+
+    def refresh(self, github: GithubMainClass.Github,
+            author: Optional[str] = None) -> int:
+        """Updates every pull request by author, which defaults to us, which
+        changed since the last refresh, including ones we didn't record
+        opening. Returns how many changed."""
+        author = author or streamlit_github.get_login(github)
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT synced_at FROM syncs WHERE author = ?",
+                (author,)).fetchone()
+        synced_at = (datetime.datetime.utcnow() - SYNC_OVERLAP).strftime(
+            TIME_FORMAT)
+        query = f"is:pr author:{author}"
+        if row is not None:
+            query += f" updated:>={row[0]}"
+
+        # Search results say when a pull request was merged. If they don't,
+        # we ask for the merged ones separately.
+        items = {item['html_url']: item
+            for item in bulk_pull_requests.search_issues(github, query)}
+        merged_urls = {url for url, item in items.items()
+            if item.get('pull_request', {}).get('merged_at')}
+        if any('merged_at' not in item.get('pull_request', {})
+                for item in items.values() if item['state'] == CLOSED):
+            merged_urls.update(item['html_url'] for item in
+                bulk_pull_requests.search_issues(github, f"{query} is:merged"))
+
+        with self._lock, self._connection:
+            for url, item in items.items():
+                state = MERGED if url in merged_urls else item['state']
+                repo = item['repository_url'].split('/repos/')[-1]
+                self._upsert(url, repo, item['number'], None, item['title'],
+                    state, item['created_at'], item['updated_at'],
+                    item.get('closed_at'))
+            self._connection.execute(
+                "INSERT OR REPLACE INTO syncs VALUES (?, ?)",
+                (author, synced_at))
+        return len(items)
+
+    def to_frame(self) -> pd.DataFrame:
+        """Returns every pull request we track as a DataFrame."""
+        with self._lock:
+            return pd.read_sql_query(
+                "SELECT * FROM pulls ORDER BY created_at", self._connection)
+
+    def get_cohorts(self) -> pd.DataFrame:
+        """Returns how many pull requests each cohort opened, how many are
+        still open, were merged or were closed without merging, and the
+        merge rate of the ones which were decided."""
+        with self._lock:
+            cohorts = pd.read_sql_query(f"""
+                SELECT cohort,
+                    COUNT(*) AS opened,
+                    SUM(state = '{OPEN}') AS open,
+                    SUM(state = '{MERGED}') AS merged,
+                    SUM(state = '{CLOSED}') AS closed
+                FROM pulls GROUP BY cohort ORDER BY cohort""",
+                self._connection)
+        decided = cohorts.merged + cohorts.closed
+        cohorts['merge_rate'] = (cohorts.merged / decided.where(decided > 0))
+        return cohorts
+
+def get_tracker(path: str = PULL_REQUEST_TRACKER_PATH) -> PullRequestTracker:
+    """Returns the shared tracker at this path."""
+    return sqlite_store.get_shared(PullRequestTracker, path)
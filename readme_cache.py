@@ -0,0 +1,78 @@
+"""A durable cache of readme contents, keyed by the readme's git sha.
+
+A blob's sha changes whenever its contents do, so cached contents never go
+stale and never need a TTL. Readmes are read from their raw download urls,
+which don't count against the API rate limit, so filling the cache for a
+whole catalog is cheap, and dry runs over it cost nothing at all.
+"""
+
+import time
+import requests
+import github_transport
+import sqlite_store
+from github import ContentFile
+from github import MainClass as GithubMainClass
+from typing import Optional
+
+# Where the cache lives on disk.
+README_CACHE_PATH = 'readme_cache.sqlite'
+
+# How long to wait for a raw readme.
+TIMEOUT_SECONDS = 30.0
+
+class ReadmeCache(sqlite_store.SqliteStore):
+    """Readme contents keyed by repo and sha, stored in SQLite."""
+
+    SCHEMA = ["""
+        CREATE TABLE IF NOT EXISTS readmes (
+            full_name TEXT,
+            sha TEXT,
+            path TEXT,
+            contents BLOB,
+            fetched_at REAL,
+            PRIMARY KEY (full_name, sha)
+        )"""]
+
+    def get(self, full_name: str, sha: str) -> Optional[bytes]:
+        """Returns the contents of this version of the repo's readme, or None
+        if we haven't read it."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT contents FROM readmes WHERE full_name = ? AND sha = ?",
+                (full_name.lower(), sha)).fetchone()
+        return None if row is None else bytes(row[0])
+
+    def put(self, full_name: str, sha: str, path: str, contents: bytes) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO readmes VALUES (?, ?, ?, ?, ?)",
+                (full_name.lower(), sha, path, contents, time.time()))
+
+def get_cache(path: str = README_CACHE_PATH) -> ReadmeCache:
+    """Returns the shared cache at this path."""
+    return sqlite_store.get_shared(ReadmeCache, path)
+
+def read_contents(github: GithubMainClass.Github, full_name: str,
+        path: str) -> bytes:
+    """Reads a file through the contents API, which costs one core call.
+    Files from a directory listing come without their contents, so this is
+    the explicit version of reading their `decoded_content`."""
+    return github.get_repo(full_name, lazy=True).get_contents(path) \
+        .decoded_content
+
+def get_contents(full_name: str, readme: ContentFile.ContentFile,
+        cache: ReadmeCache, github: GithubMainClass.Github) -> bytes:
+    """Returns the readme's contents, from the cache if we can. Otherwise
+    this reads the raw file, falling back to the contents API."""
+    contents = cache.get(full_name, readme.sha)
+    if contents is not None:
+        return contents
+    try:
+        response = github_transport.get_session().get(readme.download_url,
+            timeout=TIMEOUT_SECONDS)
+        response.raise_for_status()
+        contents = response.content
+    except requests.RequestException:
+        contents = read_contents(github, full_name, readme.path)
+    cache.put(full_name, readme.sha, readme.path, contents)
+    return contents
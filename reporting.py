@@ -0,0 +1,222 @@
+"""Reporters decide how, or whether, to show what the badge bot is doing.
+
+The batch core in `badge_batch` and the helpers in `streamlit_github` never
+write to Streamlit directly. Instead they send messages to a `Reporter`, so
+the same code can drive the Streamlit app, log from a cron job, or run
+silently. Every reporter method may be called from worker threads.
+
+Messages have a level, which is one of 'debug', 'info', 'success',
+'warning', 'error', or 'text' for preformatted blocks like READMEs.
+"""
+
+import collections
+import logging
+import threading
+import time
+import streamlit as st
+import app_reports
+from typing import List, Optional, Tuple
+
+# The levels which can sum up an app, most severe first.
+APP_STATUS_LEVELS = ['error', 'warning', 'success', 'info']
+
+def get_app_status(messages: List[Tuple[str, str]]) -> str:
+    """Sums up an app's messages as the most severe level among them."""
+    levels = {level for level, _ in messages}
+    for level in APP_STATUS_LEVELS:
+        if level in levels:
+            return level
+    return 'info'
+
+class Reporter:
+    """The interface for reporters. This base class shows nothing."""
+
+    def log(self, level: str, message: str) -> None:
+        pass
+
+    def debug(self, message: str) -> None:
+        self.log('debug', message)
+
+    def info(self, message: str) -> None:
+        self.log('info', message)
+
+    def success(self, message: str) -> None:
+        self.log('success', message)
+
+    def warning(self, message: str) -> None:
+        self.log('warning', message)
+
+    def error(self, message: str) -> None:
+        self.log('error', message)
+
+    def progress(self, done: int, total: int, label: str = '') -> None:
+        """Reports that `done` out of `total` items are finished."""
+        pass
+
+    def report_app(self, app_url: str, messages: List[Tuple[str, str]],
+            status: Optional[str] = None) -> None:
+        """Reports everything that happened to one app, as (level, message)
+        pairs, and its status, which defaults to `get_app_status`."""
+        for level, message in messages:
+            self.log(level, f"{app_url}: {message}")
+
+    def flush(self) -> None:
+        """Makes sure everything reported so far is shown."""
+        pass
+
+class NullReporter(Reporter):
+    """Silently drops everything."""
+
+    def report_app(self, app_url: str, messages: List[Tuple[str, str]],
+            status: Optional[str] = None) -> None:
+        pass
+
+class LoggingReporter(Reporter):
+    """Sends everything to the standard logging module, e.g. for cron jobs."""
+
+    LEVELS = {
+        'debug': logging.DEBUG,
+        'text': logging.DEBUG,
+        'info': logging.INFO,
+        'success': logging.INFO,
+        'warning': logging.WARNING,
+        'error': logging.ERROR,
+    }
+
+    # Log progress at most this often.
+    PROGRESS_INTERVAL_SECONDS = 5.0
+
+    def __init__(self, logger: logging.Logger = None) -> None:
+        """Constructor."""
+        self.logger = logger or logging.getLogger('badge_bot')
+        self._last_progress = 0.0
+
+    def log(self, level: str, message: str) -> None:
+        self.logger.log(self.LEVELS[level], message)
+
+    def progress(self, done: int, total: int, label: str = '') -> None:
+        now = time.time()
+        if done < total and now - self._last_progress < self.PROGRESS_INTERVAL_SECONDS:
+            return
+        self._last_progress = now
+        self.logger.info(f"{label} {done} / {total}".strip())
+
+class StreamlitReporter(Reporter):
+    """Shows progress in the Streamlit app without flooding the browser.
+
+    Rather than adding an element per app or message, a progress bar, the
+    throughput, running counts and the most recent messages are redrawn in
+    two placeholders, at most every `min_interval_seconds`. Each app's
+    status and messages are stored in `app_reports` under this reporter's
+    run, to be paged through on demand. Worker threads can't write to the
+    app, so only the thread which created the reporter draws; reports from
+    other threads are shown the next time it does."""
+
+    # How many recent messages we show.
+    MAX_LINES = 10
+
+    # Reports from worker threads are stored in batches of up to this many.
+    SAVE_BATCH_SIZE = 500
+
+    def __init__(self, min_interval_seconds: float = 0.5,
+            show_debug: bool = False,
+            reports_path: str = app_reports.APP_REPORTS_PATH) -> None:
+        """Constructor. Adds the placeholders to the app."""
+        self.min_interval_seconds = min_interval_seconds
+        self.show_debug = show_debug
+        self.run = app_reports.new_run_name()
+        self._reports = app_reports.get_reports(reports_path)
+        self._owner = threading.current_thread()
+        self._lock = threading.Lock()
+        self._lines = collections.deque(maxlen=self.MAX_LINES)
+        self._counts = collections.Counter()
+        self._statuses = collections.Counter()
+        self._unsaved = []
+        self._num_reports = 0
+        self._progress = None
+        self._progress_start = None
+        self._last_draw = 0.0
+        self._progress_placeholder = st.empty()
+        self._log_placeholder = st.empty()
+
+    def log(self, level: str, message: str) -> None:
+        if level in ('debug', 'text') and not self.show_debug:
+            return
+        with self._lock:
+            self._lines.append(f"{level.upper()}: {message}")
+            self._counts[level] += 1
+        self._maybe_draw()
+
+    def progress(self, done: int, total: int, label: str = '') -> None:
+        with self._lock:
+            # Throughput is measured from when this label started counting.
+            if self._progress is None or self._progress[2] != label or \
+                    done < self._progress[0]:
+                self._progress_start = (time.time(), done)
+            self._progress = (done, total, label)
+        self._maybe_draw()
+
+    def report_app(self, app_url: str, messages: List[Tuple[str, str]],
+            status: Optional[str] = None) -> None:
+        status = status or get_app_status(messages)
+        with self._lock:
+            self._unsaved.append((self._num_reports, app_url, status, messages))
+            self._num_reports += 1
+            self._statuses[status] += 1
+            self._lines.append(f"{status.upper()}: {app_url}")
+            save = len(self._unsaved) >= self.SAVE_BATCH_SIZE
+        if save:
+            self._save()
+        self._maybe_draw()
+
+    def _save(self) -> None:
+        """Stores the app reports we haven't yet."""
+        with self._lock:
+            unsaved, self._unsaved = self._unsaved, []
+        if unsaved:
+            self._reports.put_many(self.run, unsaved)
+
+    def _maybe_draw(self) -> None:
+        if time.time() - self._last_draw >= self.min_interval_seconds:
+            self.flush()
+
+    def flush(self) -> None:
+        if threading.current_thread() is not self._owner:
+            return
+        self._save()
+        self._last_draw = time.time()
+        with self._lock:
+            progress = self._progress
+            progress_start = self._progress_start
+            lines = list(self._lines)
+            counts = dict(self._counts)
+            statuses = dict(self._statuses)
+        summary = []
+        if progress is not None:
+            done, total, label = progress
+            self._progress_placeholder.progress(min(done / max(total, 1), 1.0))
+            started_at, started_done = progress_start
+            elapsed = time.time() - started_at
+            rate = (done - started_done) / elapsed if elapsed > 0 else 0.0
+            summary.append(f"{label} {done} / {total}, {rate:.1f} per second."
+                .strip())
+        if statuses:
+            summary.append("Apps: " + ", ".join(f"{count} {status}"
+                for status, count in sorted(statuses.items())))
+        if counts:
+            summary.append("Messages: " + ", ".join(f"{count} {level}"
+                for level, count in counts.items()))
+        if summary or lines:
+            self._log_placeholder.text("\n".join(summary + lines))
+
+# The reporter used by helpers which aren't handed one explicitly.
+_reporter = LoggingReporter()
+
+def get_reporter() -> Reporter:
+    """Returns the current default reporter."""
+    return _reporter
+
+def set_reporter(reporter: Reporter) -> None:
+    """Sets the default reporter, e.g. to a StreamlitReporter in the app."""
+    global _reporter
+    _reporter = reporter
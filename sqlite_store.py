@@ -0,0 +1,45 @@
+"""The plumbing shared by the files the bot keeps its state in.
+
+Every store, like the status store, the fork inventory or the app reports,
+is one file on disk which all the worker threads and every Streamlit rerun
+share. A `SqliteStore` holds a single SQLite connection, which threads may
+share as long as they take turns, so every query holds the store's lock.
+Subclasses only define their tables, in `SCHEMA`, and their queries. Use
+`get_shared` to get the one open store of a class at a path.
+"""
+
+import sqlite3
+import threading
+from typing import Type, TypeVar
+
+class SqliteStore:
+    """A store in one SQLite file, shared by every thread."""
+
+    # The statements which create the store's tables and indexes if needed.
+    SCHEMA = []
+
+    def __init__(self, path: str) -> None:
+        """Constructor. Creates the tables if needed."""
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            for statement in self.SCHEMA:
+                self._connection.execute(statement)
+
+# The open stores, keyed by class name and path.
+_stores = {}
+_stores_lock = threading.Lock()
+
+Store = TypeVar('Store')
+
+def get_shared(store_class: Type[Store], path: str) -> Store:
+    """Returns the open store of this class at this path, opening it the
+    first time, so every thread and rerun shares one. Any class constructed
+    from just a path works, like the fork journal. The class is keyed by
+    name, since Streamlit reloads modules when their source changes."""
+    key = (f"{store_class.__module__}.{store_class.__qualname__}", path)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = store_class(path)
+        return _stores[key]
@@ -0,0 +1,100 @@
+"""A durable, per-repo store of app statuses.
+
+`compute_app_status` used to be cached as a whole, keyed on the entire apps
+DataFrame, so selecting a different range of apps threw every result away.
+Instead we keep one row per repo in SQLite, holding the repo's freshness
+fingerprint, its status and when we checked it. Only repos which are
+missing or stale cost API calls, and past results can be queried directly.
+"""
+
+import time
+import sqlite_store
+import pandas as pd
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+# Where the store lives on disk.
+STATUS_STORE_PATH = 'app_status.sqlite'
+
+# Statuses younger than this are trusted without asking Github at all.
+# Older ones are re-checked, but if the repo's fingerprint hasn't changed
+# the stored status is reused.
+STATUS_TTL_SECONDS = 60 * 60 * 6
+
+class StoredStatus(NamedTuple):
+    """A status we computed earlier for a repo."""
+    fingerprint: Optional[str]
+    status: str
+    checked_at: float
+
+    def is_fresh(self, now: float = None) -> bool:
+        now = time.time() if now is None else now
+        return now - self.checked_at < STATUS_TTL_SECONDS
+
+def _key(owner: str, repo: str) -> Tuple[str, str]:
+    """Github names are case insensitive, so we store them lowercased."""
+    return owner.lower(), repo.lower()
+
+class StatusStore(sqlite_store.SqliteStore):
+    """App statuses keyed by owner / repo, stored in SQLite."""
+
+    SCHEMA = ["""
+        CREATE TABLE IF NOT EXISTS statuses (
+            owner TEXT NOT NULL,
+            repo TEXT NOT NULL,
+            fingerprint TEXT,
+            status TEXT NOT NULL,
+            checked_at REAL NOT NULL,
+            PRIMARY KEY (owner, repo)
+        )"""]
+
+    def get(self, owner: str, repo: str) -> Optional[StoredStatus]:
+        """Returns the stored status for this repo, or None."""
+        return self.get_many([(owner, repo)]).get(_key(owner, repo))
+
+    def get_many(self, repos: Iterable[Tuple[str, str]]
+            ) -> Dict[Tuple[str, str], StoredStatus]:
+        """Returns the stored statuses for these repos, keyed by lowercased
+        (owner, repo). Repos we've never checked are left out."""
+        keys = list({_key(owner, repo) for owner, repo in repos})
+        results = {}
+        with self._lock:
+            # Stay under SQLite's limit on the number of query parameters.
+            for start in range(0, len(keys), 400):
+                batch = keys[start:start + 400]
+                where = ' OR '.join(['(owner = ? AND repo = ?)'] * len(batch))
+                params = [name for key in batch for name in key]
+                rows = self._connection.execute(
+                    "SELECT owner, repo, fingerprint, status, checked_at "
+                    f"FROM statuses WHERE {where}", params)
+                for owner, repo, fingerprint, status, checked_at in rows:
+                    results[owner, repo] = \
+                        StoredStatus(fingerprint, status, checked_at)
+        return results
+
+    def put(self, owner: str, repo: str, fingerprint: Optional[str],
+            status: str) -> None:
+        """Stores the status we just computed for this repo."""
+        self.put_many([(owner, repo, fingerprint, status)])
+
+    def put_many(self, rows: Iterable[Tuple[str, str, Optional[str], str]]) -> None:
+        """Stores (owner, repo, fingerprint, status) rows."""
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO statuses VALUES (?, ?, ?, ?, ?)",
+                [(*_key(owner, repo), fingerprint, status, now)
+                    for owner, repo, fingerprint, status in rows])
+
+    def query(self, where: str = "1", params: tuple = ()) -> pd.DataFrame:
+        """Returns the stored statuses matching an SQL WHERE clause, e.g.
+        `store.query("status = ?", ("No badge",))`, without any API calls."""
+        with self._lock:
+            statuses = pd.read_sql_query(
+                f"SELECT * FROM statuses WHERE {where}", self._connection,
+                params=params)
+        statuses['checked_at'] = pd.to_datetime(statuses['checked_at'], unit='s')
+        return statuses
+
+def get_store(path: str = STATUS_STORE_PATH) -> StatusStore:
+    """Returns the shared status store at this path."""
+    return sqlite_store.get_shared(StatusStore, path)
@@ -1,169 +1,80 @@
 """A script which lets you batch-add badges to the READMEs of
 Streamlit sharing apps."""
 
+# These imports stay at the top. Streamlit itself already imports pandas,
+# pyarrow and numpy, and the sidebar needs `badge_batch`, which imports
+# PyGithub and every store. All of that adds about 0.13s to the first run
+# of a new process, and reruns reuse the loaded modules.
+import math
 import streamlit as st
 import streamlit_github
-import numpy as np
+import app_catalog
+import app_reports
+import badge_batch
+import github_graphql
+import fork_journal
+import github_metrics
+import github_token_pool
+import pull_request_tracker
+import reporting
+import status_store
 import pandas as pd
+import pyarrow as pa
 from github import MainClass as GithubMainClass
-from github import ContentFile
-from github.GithubException import UnknownObjectException
-from github import GithubException
-from typing import Iterator
 
 # This is where we will store all the forked repositories
 FORK_BASE_PATH = 'forks'
 
-# This is the commit message when we add a new badge.
-COMMIT_MESSAGE = "Added Streamlit app badge for discoverability"
+# Every Streamlit sharing app, which `app_catalog` converts to Arrow.
+S4A_APPS_CSV = 'sharing_apps_2.csv'
 
-# This is the title we give the pull request.
-OLD_BADGE_PULL_REQUEST_TITLE = "Add a Stremlit app badge to readme"
-BADGE_PULL_REQUEST_TITLE = "Add a Streamlit app badge to README"
-
-# This is the body of the pull request.
-BADGE_PULL_REQUEST_BODY = """
-Hi 👋!
-
-Thank you for making this awesome Streamlit app!
-
-I noticed that your project's README doesn't have a Streamlit badge.
-Adding one would let people directly click into your app when
-browsing your GitHub repo. Cool, right?!
-
-This pull request automatically adds a beautiful Streamlit badge to your
-README. Just go ahead and click `Merge pull request` below to get it!
-
-Happy app creating 🎈
-
-~ StreamlitBadgeBot 🤖
-___
-For more information about how pull requests work, please [click here](https://docs.github.com/en/free-pro-team@latest/github/collaborating-with-issues-and-pull-requests/merging-a-pull-request).
-"""
-
-
-class ForkAppError(Exception):
-    """Represents a mistake that could happen when trying to fork an app."""
-
-    def __init__(self, reason):
-        """Constructor."""
-        Exception.__init__(self, reason)
-        self.reason = reason
-
-class ConfigOptions:
+class ConfigOptions(badge_batch.BatchOptions):
     """Returns all the config information to run the app."""
 
     def __init__(self) -> None:
         """Adds UI elements which give us some config information."""
+        badge_batch.BatchOptions.__init__(self)
         self.access_token = st.sidebar.text_input("Github access token", type="password")
+        self.read_tokens = tuple(github_token_pool.parse_tokens(
+            st.sidebar.text_input("More tokens for reads (comma separated)",
+                type="password")))
         self.use_debug_repos = st.sidebar.checkbox('Use a debug repo list')
-        self.auto_expand = st.sidebar.checkbox('Auto-expand app display')
         self.auto_process_apps = st.sidebar.checkbox("Auto-process apps")
         self.show_readmes = st.sidebar.checkbox("Show readme contents")
         self.do_pull_requests = st.sidebar.checkbox("Send pull reuqests")
+        self.num_workers = st.sidebar.slider("Parallel workers", 1, 32, 8)
+        self.resume_forks = st.sidebar.checkbox("Resume from fork journal", True)
+        self.replay_failed_forks = st.sidebar.checkbox("Only replay failed forks")
+        self.status_backend = st.sidebar.radio("Status backend", ["REST", "GraphQL"])
+        self.graphql_batch_size = st.sidebar.slider("GraphQL batch size",
+            1, github_graphql.MAX_BATCH_SIZE, github_graphql.MAX_BATCH_SIZE)
     
-def coords_iter(apps: pd.DataFrame) -> Iterator[streamlit_github.GithubCoords]:
-    """Takes a list of apps and iterate over that list, yielding GithubCoord objects."""
-
-    for app in apps.itertuples():
-        if hasattr(app, "app_url"):
-            coords = streamlit_github.GithubCoords.from_app_url(app.app_url)
-            app_url = app.app_url
-        else:
-            coords = streamlit_github.GithubCoords.from_github_url(app.github_url)
-            app_url = app.github_url
-        yield coords, app_url
+def get_s4a_apps() -> pa.Table:
+    """Returns every app, as the memory-mapped catalog."""
+    return app_catalog.get_table(S4A_APPS_CSV)
 
-@st.cache
-def get_s4a_apps() -> pd.DataFrame:
-    apps = pd.read_csv('sharing_apps_2.csv')
-    apps.drop('Unnamed: 0', axis=1, inplace=True)
-    return apps
-
-def filter_apps(apps: pd.DataFrame) -> pd.DataFrame:
+def filter_apps(apps: pa.Table) -> pd.DataFrame:
     """Give the user a selection interface with which to select a set
     of apps to process. Displays and returns the selected apps."""
 
     # Let the user filter app URLs
     filter_text = st.text_input('Filter URLs')
     if filter_text:
-        apps = apps[apps.app_url.str.contains(filter_text)]
+        apps = app_catalog.filter_urls(apps, filter_text)
 
-    # Let the user select a numerical range of apps to work on
+    # Let the user select a numerical range of apps to work on, and only
+    # copy those out of the catalog
     first_app_index, last_app_index = \
-       st.slider("Select apps", 0, len(apps), (0, 1))
+       st.slider("Select apps", 0, apps.num_rows, (0, 1))
     if first_app_index >= last_app_index:
         raise RuntimeError('Must select at least one app.')
-    selected_apps = apps[first_app_index:last_app_index].copy()
-    st.write(f"Selected `{len(selected_apps)} / {len(apps)}` apps.")
+    selected_apps = app_catalog.to_frame(
+        apps.slice(first_app_index, last_app_index - first_app_index))
+    st.write(f"Selected `{len(selected_apps)} / {apps.num_rows}` apps.")
     st.write(selected_apps)
 
     return selected_apps
 
-@st.cache(hash_funcs=streamlit_github.GITHUB_HASH_FUNCS, persist=True,
-            suppress_st_warning=True, ttl=(60 * 60 * 6)) 
-def compute_app_status(apps: pd.DataFrame, config: ConfigOptions, github: GithubMainClass.Github):
-    """Adds a "status" column to the app DataFrame which indicates that
-    whether the app has a badge or not and / or whether there was an
-    error processing the app for some reason."""
-
-    st.write("## Computing app status")
-
-    # These are the additional columns which we're going to add
-    status_column = []
-
-    for app in apps.itertuples():
-        with st.beta_expander(app.app_url, expanded=config.auto_expand):
-            try:
-                st.write(app)
-                
-                if app.app_url is None or app.app_url == "None":
-                    raise ForkAppError("No URL")
-
-                # Parse out the coordinates for this repo.
-                coords = streamlit_github.GithubCoords.from_app_url(app.app_url)
-                if coords == None:
-                    raise ForkAppError("Unable to parse URL")
-                st.write({attr:getattr(coords, attr)
-                    for attr in ['owner', 'repo', 'branch', 'path']})
-
-                # Get the repo.
-                repo = coords.get_repo(github)
-                st.write("repo", repo)
-                # Show the readme if possible.
-                if repo is None:
-                    raise ForkAppError("Repo does not exist")
-
-                readme = streamlit_github.get_readme(github, repo)
-                if readme is None:
-                    raise ForkAppError("Readme does not exist")
-
-                if config.show_readmes:
-                    readme_contents = readme.decoded_content.decode('utf-8')
-                    st.beta_columns((1, 20))[1].text(readme_contents)
-    
-                # st.write(dir(repo))
-                if repo.fork:
-                    raise ForkAppError("Repo forks another.")
-
-                if streamlit_github.has_streamlit_badge(github, repo):
-                    app_status = "Has badge"
-                else:
-                    app_status = "No badge"
-            except ForkAppError as e:
-                app_status = f"ForkAppError: {e.reason}"
-            # except Exception as e:
-            #     app_status = str(type(e))
-
-            st.write(f"app_status: '{app_status}'")
-
-            # Fill in the status column
-            status_column.append(app_status)
-        
-    # Assign these new columns to the app DataFrame.
-    apps = apps.assign(status=status_column)
-    return apps
-
 def display_badge_statistics(apps: pd.DataFrame) -> None:
     """Displays a bunch of statistics about apps with and without badges."""
     with st.beta_expander("Badge statistics"):
@@ -172,15 +83,90 @@ def display_badge_statistics(apps: pd.DataFrame) -> None:
         error_apps = ~(no_badges | yes_badges)
         st.bar_chart(apps.status.value_counts())
     
+def display_stored_statuses() -> None:
+    """Lets the user look through every status we've computed before,
+    without making any API calls."""
+    with st.beta_expander("Stored app statuses"):
+        statuses = status_store.get_store().query()
+        st.write(f"`{len(statuses)}` repos checked so far.")
+        st.bar_chart(statuses.status.value_counts())
+        status_filter = st.selectbox("Show repos with status",
+            ["All"] + sorted(statuses.status.unique()))
+        if status_filter != "All":
+            statuses = statuses[statuses.status == status_filter]
+        st.write(statuses)
+
+def display_app_reports() -> None:
+    """Lets the user page through what happened to each app in a run, from
+    the reports on disk, rather than drawing every app at once."""
+    with st.beta_expander("App reports"):
+        reports = app_reports.get_reports()
+        runs = reports.list_runs()
+        if len(runs) == 0:
+            st.write("No apps reported yet.")
+            return
+        apps_per_run = runs.set_index('run').apps
+        run = st.selectbox("Run", runs.run,
+            format_func=lambda run: f"{run} ({apps_per_run[run]} apps)")
+        status_counts = reports.get_status_counts(run)
+        st.bar_chart(status_counts)
+        status = st.selectbox("Show apps with status",
+            ["All"] + list(status_counts.index))
+        status = None if status == "All" else status
+        num_apps = int(status_counts.sum() if status is None
+            else status_counts[status])
+        num_pages = max(1, math.ceil(num_apps / app_reports.PAGE_SIZE))
+        page = st.number_input(f"Page (of {num_pages})", 1, num_pages, 1) - 1
+        page_reports = reports.get_page(run, page, status).set_index('seq')
+        st.dataframe(page_reports)
+        if len(page_reports) > 0:
+            seq = st.selectbox("Show the messages of", page_reports.index,
+                format_func=lambda seq: page_reports.app_url[seq])
+            for level, message in reports.get_messages(run, seq):
+                getattr(st, 'write' if level == 'debug' else level)(message)
+
+def display_api_metrics() -> None:
+    """Shows how many API calls we've made, where, and how long they took."""
+    with st.beta_expander("API metrics"):
+        metrics = github_metrics.get_metrics()
+        snapshot = metrics.snapshot()
+        requests = pd.DataFrame(snapshot['requests'],
+            columns=['endpoint', 'helper', 'status', 'count'])
+        st.write(f"`{requests['count'].sum()}` API calls so far.")
+        st.write(requests)
+        st.write("Helpers", pd.DataFrame(snapshot['helpers']).T)
+        st.json({key: snapshot[key]
+            for key in ['http_cache', 'rate_limit', 'sleep_seconds']})
+        if st.checkbox("Show Prometheus metrics"):
+            st.text(metrics.to_prometheus())
+
+def display_pull_requests(github: GithubMainClass.Github) -> None:
+    """Shows how many of the pull requests we've opened were merged, by the
+    week they were opened, from the tracker on disk."""
+    with st.beta_expander("Pull requests"):
+        tracker = pull_request_tracker.get_tracker()
+        if st.button("Refresh pull request states"):
+            num_changed = tracker.refresh(github)
+            st.write(f"`{num_changed}` pull requests changed.")
+        cohorts = tracker.get_cohorts()
+        st.write(cohorts)
+        if len(cohorts) > 0:
+            st.bar_chart(cohorts.set_index('cohort')[['open', 'merged', 'closed']])
+        if st.checkbox("Show every pull request"):
+            st.write(tracker.to_frame())
+
 def parse_app_from_file(config: ConfigOptions, github: GithubMainClass.Github):
     # Get the app dataframe
     apps = get_s4a_apps()
+    display_stored_statuses()
     apps = filter_apps(apps)
 
     # Don't do anything until the use clicks this button.
     if not (config.auto_process_apps or st.button('Process apps')):
         return
-    apps = compute_app_status(apps, config, github)
+    st.write("## Computing app status")
+    apps = badge_batch.compute_app_status(apps, config, github,
+        reporting.get_reporter())
 
     # Write out the results
     st.write("### Processed apps")
@@ -213,99 +199,6 @@ def create_debug_app_list():
     apps.loc[:,'status'] = "No badge"
     return apps
 
-def add_badge_to_readme(readme: ContentFile.ContentFile, app_url: str) -> str:
-    """Adds a Streamlit badge to the URL."""
-
-    # Get the contents from the readme.
-    readme_contents = readme.decoded_content.decode('utf-8')
-    st.text(readme_contents)
-
-    # Don't add the badge twice
-    badge_image = "https://static.streamlit.io/badges/streamlit_badge_black_white.svg"
-    if badge_image in readme_contents:
-        st.warning("Readme already has badge, skipping...")
-        return None
-
-    # Compute the badge location.
-    st.write(f"app_url: `{app_url}`")
-    badge_markdown = f"[![Open in Streamlit]({badge_image})]({app_url})"
-    st.write(f"badge markdown:")
-    st.text(badge_markdown)
-
-    # Plan A is to add the badge to the end of the title readme,
-    # but if that doesn't work, then we just prepend the badge to the
-    # beginning of the readme.
-    prepend_badge = False
-    if '\r' in readme_contents:
-        # If we see weird line endings, then don't do anything fancy.
-        prepend_badge = True
-    else:
-        lines = readme_contents.split('\n')
-        if len(lines) < 1:
-            prepend_badge = True
-        else:
-            first_line = lines[0]
-            if first_line.startswith('#') and '[' not in first_line:
-                lines[0] = f"{first_line} {badge_markdown}"
-                new_contents = '\n'.join(lines)
-                st.write("New first line:")
-                st.text(lines[0])
-            else:
-                prepend_badge = True
-    st.write(f"Prepend badge: `{prepend_badge}`")
-    if prepend_badge:
-        new_contents = f"{badge_markdown}\n\n{readme_contents}"
-    st.write("New readme contents")
-    st.text(new_contents)
-    return new_contents
-
-
-def batch_fork_repos(
-        apps: pd.DataFrame,
-        config: ConfigOptions,
-        github: GithubMainClass.Github):
-    """Goes through a list of apps and forks them all and then
-    add badges to them and issues pull requests."""
-    for coords, app_url in coords_iter(apps):
-        with st.beta_expander(app_url, expanded=config.auto_expand):
-            # Fork the repo.
-            st.write("App to fork")
-            st.write({attr:getattr(coords, attr)
-                for attr in ['owner', 'repo', 'branch', 'path']})
-            repo = coords.get_repo(github)
-            forked_repo = streamlit_github.fork_repo(repo)
-
-            # Add a badge to the readme.
-            st.write(forked_repo, forked_repo._streamlit_hash)
-            readme = streamlit_github.get_readme(github, forked_repo)
-            new_contents = add_badge_to_readme(readme, app_url)
-            if new_contents is None:
-                st.warning("No extra commit since badge already exists.")
-            else:
-                forked_repo.update_file(readme.path, COMMIT_MESSAGE,
-                        new_contents, readme.sha)
-                st.success("Just added a badge to the readme.")
-
-            # If we haven't allowed pull requesting, then nothing more to do.
-            if not config.do_pull_requests:
-                st.warning("Skipping this pull request.")
-                continue
-
-            # Create a pull request
-            pull_request_args = {
-                'title': BADGE_PULL_REQUEST_TITLE,
-                'head': f"{forked_repo.owner.login}:{repo.default_branch}",
-                'base': repo.default_branch,
-                'body': BADGE_PULL_REQUEST_BODY,
-            }
-            st.write("Creating pull request", pull_request_args)
-            try:
-                pull_request = repo.create_pull(**pull_request_args)
-                st.write("Created pull request", pull_request)
-            except GithubException as e:
-                st.error("Error creating the pull request.")
-                st.json(e.data)
-
 
 def main():
     """Execution starts here."""
@@ -315,10 +208,21 @@ def main():
 
     # These are all the options the user can set
     config = ConfigOptions()
-    github = streamlit_github.from_access_token(config.access_token)
+    reporting.set_reporter(reporting.StreamlitReporter())
+    github = streamlit_github.from_access_token(config.access_token,
+        config.read_tokens)
+
+    # The client is cached, so pool the tokens on every rerun, in case the
+    # read tokens went back to ones we had before.
+    github_token_pool.use_tokens(config.access_token, config.read_tokens)
 
     if config.use_debug_repos:
         apps = create_debug_app_list()
+    elif config.replay_failed_forks:
+        apps = fork_journal.get_journal().get_failed_apps()
+        st.write("## Failed forks to replay", apps)
+        if len(apps) == 0:
+            apps = None
     else:
         apps = parse_app_from_file(config, github)
 
@@ -329,10 +233,16 @@ def main():
     st.write("## Remaining apps to fork", apps)
     with st.beta_expander("Show last app"):
         st.write(apps['app_url'].iloc[-1])
+    with st.beta_expander("Fork journal"):
+        st.write(fork_journal.get_journal().to_frame())
         
     # When clicked for the given repos.
     if st.button('Fork repos'):
-        batch_fork_repos(apps, config, github)
+        badge_batch.batch_fork_repos(apps, config, github,
+            reporting.get_reporter())
+    display_app_reports()
+    display_pull_requests(github)
+    display_api_metrics()
 
 # Start execution at the main() function 
 if __name__ == '__main__':
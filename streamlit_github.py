@@ -1,15 +1,21 @@
 """Special utility functions to use PyGithub with Streamlit."""
 
 import streamlit as st
+import collections
+import contextlib
 import functools
 import os
 import tempfile
 import math
+import threading
 import time
 import datetime
+import random
 import shutil
+import sys
 import re
 import urllib.parse
+import pandas as pd
 from datetime import datetime
 from github import Github
 from github import NamedUser
@@ -20,6 +26,18 @@ from github import UnknownObjectException
 from github import BadCredentialsException
 from github import GithubException
 from github import MainClass as GithubMainClass
+from typing import Iterator, Optional, Tuple
+import badge_detector
+import github_code_search
+import github_transport
+import github_users
+import github_rate_limit
+import github_etag_cache
+import github_metrics
+import github_token_pool
+import github_completion
+import readme_cache
+import reporting
 
 def _get_attr_func(attr):
     """Returns a function which gets this attribute from an object."""
@@ -28,9 +46,8 @@ def _get_attr_func(attr):
         return getattr(obj, attr)
     return get_attr_func
 
-def hash_repo(repo):
-    st.warning(f"`hash_repo` -> `{repo._streamlit_hash}`")
-    return repo._streamlit_hash
+def hash_snapshot(snapshot):
+    return snapshot.key
 
 # This dictionary of hash functions allows you to safely intermix PyGithub
 # with Streamit caching.
@@ -38,40 +55,188 @@ GITHUB_HASH_FUNCS = {
     GithubMainClass.Github: lambda _: None,
     NamedUser.NamedUser: _get_attr_func('login'),
     ContentFile.ContentFile: _get_attr_func('download_url'),
-    Repository.Repository: hash_repo,
+    "streamlit_github.RepoSnapshot": hash_snapshot,
 }
 
 def rate_limit(limit_type: str):
     """Function decorator to try to handle Github search rate limits.
     See: https://developer.github.com/v3/search/#rate-limit
 
+    Calls are already paced by the shared budgets in `github_rate_limit`, so
+    this only fires if Github rate limits us anyway. In that case we wait
+    until one of our tokens' budgets resets, which we know from the rejected
+    responses' headers, and retry up to MAX_ATTEMPTS times.
+
     limit_type: 'core' for regular API calls | 'search' for search calls
     """
 
     # Willing to wait up to an hour to lift the limits.
     MAX_WAIT_SECONDS = 60.0 * 60.0
 
+    # How many times we try the call before giving up.
+    MAX_ATTEMPTS = 5
+
     def rate_limit_decorator(func):
         @functools.wraps(func)
         def wrapped_func(github, *args, **kwargs):
-            try:
-                return func(github, *args, **kwargs)
-            except RateLimitExceededException:
-                # We were rate limited by Github, Figure out how long to wait.
-                # Round up, and wait that long.
-                search_limit = getattr(github.get_rate_limit(), limit_type)
-                remaining = search_limit.reset - datetime.utcnow()
-                wait_seconds = math.ceil(remaining.total_seconds() + 1.0)
-                wait_seconds = min(wait_seconds, MAX_WAIT_SECONDS)
-                with st.spinner(f'Waiting {wait_seconds}s to avoid {limit_type} rate limit.'):
+            for attempt in range(1, MAX_ATTEMPTS + 1):
+                try:
+                    return func(github, *args, **kwargs)
+                except RateLimitExceededException:
+                    if attempt == MAX_ATTEMPTS:
+                        raise
+                    # We were rate limited by Github, so wait until one of
+                    # our tokens resets. Round up, and wait that long.
+                    wait_seconds = math.ceil(
+                        github_rate_limit.seconds_until_available(limit_type))
+                    wait_seconds = min(wait_seconds, MAX_WAIT_SECONDS)
+                    reporting.get_reporter().warning(
+                        f'Waiting {wait_seconds}s to avoid {limit_type} rate limit.')
                     time.sleep(wait_seconds)
-                return func(github, *args, **kwargs)
+                    github_metrics.get_metrics().record_sleep(
+                        f'rate_limit_{limit_type}', wait_seconds)
         return wrapped_func
     return rate_limit_decorator
 
 # The URL of the app badge to include in the apps README.md
 BADGE_URL = r"https://static.streamlit.io/badges/streamlit_badge_black_white.svg"
 
+# Every Streamlit sharing app URL starts with this.
+APP_URL_PREFIX = "https://share.streamlit.io/"
+
+# Parses a cannonical Streamlit sharing app URL into component parts.
+APP_URL_PATTERN = re.compile(
+    r"^https://share.streamlit.io/"
+    r"(?P<owner>\w[\w\-]*)/"
+    r"(?P<repo>\w[\w\-]*)/"
+    r"((?P<branch>\w[\w\-\.]*)/)?"
+    r"(?P<path>\w[\w\-/\.]*\w\.py)"
+)
+
+# The columns of the DataFrame returned by `parse_app_urls`.
+COORDS_COLUMNS = ['owner', 'repo', 'branch', 'path']
+
+class RepoSnapshot:
+    """The few fields of a repo which we actually read.
+
+    PyGithub repos carry their raw JSON, headers and requester around, so
+    they're big to keep and slow to pickle. Snapshots hold just what the
+    pipeline needs. Use `get_repo` to write to the repo."""
+
+    __slots__ = ('owner', 'name', 'fork', 'default_branch', 'freshness')
+
+    def __init__(self, owner: str, name: str, fork: bool, default_branch: str,
+            freshness: Optional[str]) -> None:
+        """Constructor."""
+        self.owner = owner
+        self.name = name
+        self.fork = fork
+        self.default_branch = default_branch
+        self.freshness = freshness
+
+    @staticmethod
+    def from_repo(repo: Repository.Repository) -> 'RepoSnapshot':
+        """Takes a snapshot of a PyGithub repo, without any API calls."""
+        owner, name = repo.full_name.split('/')
+        freshness = None
+        if repo.pushed_at is not None:
+            freshness = format_freshness(repo.pushed_at, repo.updated_at)
+        return RepoSnapshot(owner, name, repo.fork, repo.default_branch,
+            freshness)
+
+    @property
+    def full_name(self) -> str:
+        return f"{self.owner}/{self.name}"
+
+    @property
+    def key(self) -> str:
+        """A string which changes whenever the repo does. This is the cache
+        key for everything downstream of the repo."""
+        return f"{self.full_name} @ {self.freshness}"
+
+    def get_repo(self, github: GithubMainClass.Github) -> Repository.Repository:
+        """Returns the PyGithub repo, e.g. to write to it. This costs no API
+        calls until we read a field which the snapshot doesn't have."""
+        return github.get_repo(self.full_name, lazy=True)
+
+    def __repr__(self) -> str:
+        return f"<RepoSnapshot {self.key}>"
+
+# Hold repo snapshots for 6 hours, in up to this many bytes of memory.
+SNAPSHOT_TTL_SECONDS = 60 * 60 * 6
+MAX_SNAPSHOT_BYTES = 32 * 1024 * 1024
+
+def _get_snapshot_size(snapshot: Optional[RepoSnapshot]) -> int:
+    """Roughly how many bytes of memory this snapshot takes."""
+    if snapshot is None:
+        return sys.getsizeof(None)
+    return sys.getsizeof(snapshot) + sum(sys.getsizeof(getattr(snapshot, slot))
+        for slot in RepoSnapshot.__slots__)
+
+class SnapshotCache:
+    """An LRU cache of repo snapshots, keyed case insensitively by full
+    name, which evicts the least recently used snapshots once they take up
+    more than `max_bytes`. Repos which don't exist are cached as None."""
+
+    def __init__(self, max_bytes: int = MAX_SNAPSHOT_BYTES,
+            ttl_seconds: float = SNAPSHOT_TTL_SECONDS) -> None:
+        """Constructor."""
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.num_bytes = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, full_name: str) -> Tuple[bool, Optional[RepoSnapshot]]:
+        """Returns whether we have a fresh snapshot, and the snapshot."""
+        key = full_name.lower()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            snapshot, stored_at, size = entry
+            if time.time() - stored_at >= self.ttl_seconds:
+                del self._entries[key]
+                self.num_bytes -= size
+                return False, None
+            self._entries.move_to_end(key)
+            return True, snapshot
+
+    def put(self, full_name: str, snapshot: Optional[RepoSnapshot]) -> None:
+        key = full_name.lower()
+        size = _get_snapshot_size(snapshot)
+        with self._lock:
+            if key in self._entries:
+                self.num_bytes -= self._entries.pop(key)[2]
+            self._entries[key] = (snapshot, time.time(), size)
+            self.num_bytes += size
+            while self.num_bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self.num_bytes -= evicted_size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+# Every thread shares one snapshot cache.
+_snapshot_cache = SnapshotCache()
+
+def get_snapshot_cache() -> SnapshotCache:
+    """Returns the shared snapshot cache."""
+    return _snapshot_cache
+
+def cache_snapshots(func):
+    """Decorator which caches the snapshots returned by `func(coords,
+    github)` in the shared snapshot cache."""
+    @functools.wraps(func)
+    def wrapped_func(coords, github):
+        full_name = f"{coords.owner}/{coords.repo}"
+        hit, snapshot = _snapshot_cache.get(full_name)
+        if not hit:
+            snapshot = func(coords, github)
+            _snapshot_cache.put(full_name, snapshot)
+        return snapshot
+    return wrapped_func
+
 class GithubCoords:
     """The path of a Github file, consisting of owner, repo, branch, and path."""
 
@@ -96,7 +261,7 @@ class GithubCoords:
 
         # Convert the url intp a more cannonical form
         url = urllib.parse.unquote(url)
-        if not url.startswith("https://share.streamlit.io/"):
+        if not url.startswith(APP_URL_PREFIX):
             return None
         if url.endswith("/"):
             url = url + "streamlit_app.py"
@@ -104,16 +269,9 @@ class GithubCoords:
             url = url + "/streamlit_app.py"
 
         # Parse the Stremalit URL into component parts
-        streamlit_app_url = re.compile(
-            r"https://share.streamlit.io/"
-            r"(?P<owner>\w[\w\-]*)/"
-            r"(?P<repo>\w[\w\-]*)/"
-            r"((?P<branch>\w[\w\-\.]*)/)?"
-            r"(?P<path>\w[\w\-/\.]*\w\.py)"
-        )
-        matched_url = streamlit_app_url.match(url)
+        matched_url = APP_URL_PATTERN.match(url)
         if matched_url is None:
-            raise RuntimeError(f"Unable to parse {url} with {streamlit_app_url}")
+            raise RuntimeError(f"Unable to parse {url} with {APP_URL_PATTERN}")
 
         return GithubCoords(
             matched_url.group('owner'),
@@ -142,165 +300,229 @@ class GithubCoords:
             matched_url.group('path')
         )
 
-    # Hold repos in the cache for 6 hours.
-    @st.cache(hash_funcs=GITHUB_HASH_FUNCS, persist=True, suppress_st_warning=True,
-            ttl=(60 * 60 * 6)) 
-    def get_repo(self, github: GithubMainClass.Github) -> Repository.Repository:
-        """Returns a cached version of a PyGithub repository with additional
-        metadata which can be used for caching."""
-        # Insert some debug information here to see if we're in the cached function.
-        st.warning(f"In cached get_repo for `{self.owner}/{self.repo}`.")
+    @github_metrics.cached_helper(cache_snapshots)
+    def get_repo(self, github: GithubMainClass.Github) -> Optional['RepoSnapshot']:
+        """Returns a snapshot of this repo, or None if it doesn't exist.
+        Snapshots are held in the snapshot cache, so this usually costs no
+        API calls. Use `RepoSnapshot.get_repo` to write to the repo."""
+        reporting.get_reporter().debug(
+            f"Getting a snapshot of `{self.owner}/{self.repo}`.")
 
         # Get the underlying github repo, or None if it doesn't exist.
         try:
             repo = github.get_repo(f"{self.owner}/{self.repo}") 
         except (UnknownObjectException, BadCredentialsException):
             return None
-        
-        # Adds a string which lets us hash this repository quickly
-        add_streamlit_hash(repo)
-        return repo
+        return RepoSnapshot.from_repo(repo)
+
+def parse_app_urls(urls: pd.Series) -> pd.DataFrame:
+    """Parses a whole column of Streamlit app urls at once, the same way as
+    `GithubCoords.from_app_url`. Returns a DataFrame with the same index and
+    an owner, repo, branch and path column. Every column is None for urls
+    which can't be parsed."""
+
+    # Convert the urls into a more cannonical form
+    urls = urls.astype(str).map(urllib.parse.unquote)
+    is_app_url = urls.str.startswith(APP_URL_PREFIX)
+    urls = urls.where(~urls.str.endswith("/"), urls + "streamlit_app.py")
+    urls = urls.where(urls.str.endswith(".py"), urls + "/streamlit_app.py")
+
+    # Parse the Streamlit URLs into component parts
+    coords = urls.str.extract(APP_URL_PATTERN.pattern)[COORDS_COLUMNS]
+    coords = coords.astype(object).where(coords.notna(), None)
+    coords.loc[~is_app_url, :] = None
+    return coords
 
 class RepoHasNoBranches(Exception):
     def __init__(self, repo_name):
         Exception.__init__(self, repo_name)
         self.repo_name = repo_name
 
-def add_streamlit_hash(repo: Repository.Repository) -> None:
-    """Adds a string to the repo which reflects the most recent
-    modification time for the repo.
-
-    Raises RepoHasNoBranches if the repo doesn't have any branches
-    then this raises RepoHasNoBranches, which would probably happen
-    if they repo had been just created.
-    """
+class ForkOutOfDate(Exception):
+    def __init__(self, fork_name):
+        Exception.__init__(self, fork_name)
+        self.fork_name = fork_name
 
-    # A litle debug output
-    st.write("Owner:", repo.owner.login)
-    st.write("Name:", repo.name)
+def format_freshness(pushed_at: datetime, updated_at: datetime) -> str:
+    """Formats the freshness fingerprint the same way for every API."""
+    return f"{pushed_at.isoformat()} / {updated_at.isoformat()}"
 
-    # raise RuntimeError("Testing our abilitity to introspect repos.")
-    # raise RuntimeError("Testing add_streamlit_hash.")
-        
-    # Figure out the most recent modification time
+def check_default_branch(repo: Repository.Repository) -> None:
+    """Raises RepoHasNoBranches unless the repo's default branch can be
+    read, which costs one API call. Since `pushed_at` is copied over when a
+    repo is forked, this is how we tell that a new fork is ready."""
     try:
-        repo_last_modified = datetime.min
-        for branch in repo.get_branches():
-            try:
-                branch_last_modified = branch.commit.commit.committer.date
-            except GithubException:
-                raise RepoHasNoBranches(f"{repo.owner.login}/{repo.name}")
-            if branch_last_modified > repo_last_modified:
-                repo_last_modified = branch_last_modified  
-        st.warning(
-            f"adding hash repo_last_modified=`{repo_last_modified}` " + 
-            f"datetime.min=`{datetime.min}` " + 
-            f"equal=`{repo_last_modified == datetime.min}`")
-        if repo_last_modified == datetime.min:
-            raise RepoHasNoBranches(f"{repo.owner.login}/{repo.name}")
-    except UnknownObjectException:
-        raise RepoHasNoBranches(f"{repo.owner.login}/{repo.name}")
-
-    # Give this repo a hash which represents the most recent modification time.
-    repo._streamlit_hash = f"{repo.owner.login}/{repo.name} @ {repo_last_modified}"
-    st.write(f'repo._streamlit_hash: `{repo._streamlit_hash}`')
+        repo.get_branch(repo.default_branch)
+    except GithubException:
+        raise RepoHasNoBranches(repo.full_name)
 
 
 @st.cache(hash_funcs=GITHUB_HASH_FUNCS)
-def from_access_token(access_token):
+def from_access_token(access_token, read_tokens=()):
     """Returns a ghitub object from an access token."""
-
-    github = Github(access_token) 
+    return make_github(access_token, read_tokens=read_tokens)
+
+def make_github(access_token, base_url=GithubMainClass.DEFAULT_BASE_URL,
+        read_tokens=(), cache_path=github_etag_cache.CACHE_PATH):
+    """Returns a github object from an access token, without Streamlit
+    caching, e.g. for the command line. Pass base_url to talk to another
+    server, like `fake_github`, and cache_path to keep its responses apart.
+    Reads are spread over access_token and any read_tokens, while writes
+    always use access_token."""
+
+    # Use a transport which lets many threads share this client, and which
+    # turns repeat requests into conditional ones.
+    github_transport.install()
+    github_etag_cache.install(cache_path)
+    github_metrics.install()
+    github_completion.install()
+    github_token_pool.use_tokens(access_token, read_tokens)
+    github = Github(access_token, base_url=base_url)
     return github
 
+def get_login(github: GithubMainClass.Github) -> str:
+    """Returns who the access token belongs to, with one explicit call.
+    Reading `github.get_user().login` costs the same call, hidden in a lazy
+    completion."""
+    requester = github._Github__requester
+    _, user = requester.requestJsonAndCheck('GET', '/user')
+    return user['login']
+
 @rate_limit("search")
-@st.cache(hash_funcs=GITHUB_HASH_FUNCS, persist=True)
+@github_metrics.cached_helper(st.cache(hash_funcs=GITHUB_HASH_FUNCS, persist=True))
 def get_user_from_email(github, email):
     """Returns a user for that email or None."""
 
-    users = list(github.search_users(f'type:user {email} in:email'))
-    if len(users) == 0:
+    lookup = github_users.resolve_emails(github, [email]).iloc[0]
+    if lookup.status == github_users.NOT_FOUND:
         return None
-    elif len(users) == 1:
-        return users[0]
+    elif lookup.status == github_users.FOUND:
+        return github.get_user(lookup.login)
     else:
-        raise RuntimeError(f'{email} associated with {len(users)} users.')
+        raise RuntimeError(f'{email} associated with {lookup.candidates}.')
+
+@rate_limit("search")
+@github_metrics.helper
+def get_users_from_emails(github, emails) -> pd.DataFrame:
+    """Returns the login for each email, as a DataFrame with an email,
+    status, login and candidates column. Rather than raising, emails which
+    match several users get an "ambiguous" status, with every matching
+    login in candidates. See `github_users.resolve_emails`."""
+    return github_users.resolve_emails(github, emails)
 
 @rate_limit("search")
-@st.cache(hash_funcs=GITHUB_HASH_FUNCS, persist=True)
+@github_metrics.cached_helper(st.cache(hash_funcs=GITHUB_HASH_FUNCS, persist=True))
 def get_streamlit_files(github, github_login):
     """Returns every single file on github which imports streamlit."""
+    return list(iter_streamlit_files(github, github_login))
+
+def iter_streamlit_files(github, github_login) -> Iterator[ContentFile.ContentFile]:
+    """Yields every single file on github which imports streamlit, a page at
+    a time. If this is interrupted, the pages fetched so far are
+    checkpointed, so the next call picks up where this one left off."""
 
     try:
         SEARCH_QUERY = 'extension:py "import streamlit as st" user:'
-        files = github.search_code(SEARCH_QUERY + github_login)
-        return list(files)
+        yield from github_code_search.search_code(github,
+            SEARCH_QUERY + github_login)
     except RateLimitExceededException:
         raise
     except GithubException as e:
         if e.data['message'] == 'Validation Failed':
             # Then this user changed their permissions, I think.
-            # In any case, we just pretend they have no files.
-            return []
+            # In any case, we just pretend they have no more files.
+            return
         else:
             # In this case, we have no idea what's going on, so just raise again. 
             raise
 
 @rate_limit("core")
-@st.cache(hash_funcs=GITHUB_HASH_FUNCS, suppress_st_warning=True)
+@github_metrics.cached_helper(st.cache(hash_funcs=GITHUB_HASH_FUNCS,
+    suppress_st_warning=True))
 def get_readme(
        github: GithubMainClass.Github,
-       repo: Repository.Repository) -> ContentFile.ContentFile:
+       repo: RepoSnapshot) -> ContentFile.ContentFile:
     """Gets the readme for this repo, or None if the repo has none."""
     try:
-        contents = repo.get_contents("")
+        contents = repo.get_repo(github).get_contents("")
     except UnknownObjectException:
         return None
 
-    st.write(f"`get_readme`: `{type(contents)}` for `{repo}`")
+    reporting.get_reporter().debug(
+        f"`get_readme`: {len(contents)} files for `{repo.full_name}`")
     for content_file in contents:
-        st.write(f"`get_readme`: `{content_file.name}`")
         if content_file.name.lower() == "readme.md":
             return content_file
     return None
 
 @rate_limit("core")
-@st.cache(hash_funcs=GITHUB_HASH_FUNCS, suppress_st_warning=True)
+@github_metrics.cached_helper(st.cache(hash_funcs=GITHUB_HASH_FUNCS,
+    suppress_st_warning=True))
 def has_streamlit_badge(
         github: GithubMainClass.Github,
-        repo: Repository.Repository) -> bool:
+        repo: RepoSnapshot) -> bool:
+    """True if the readme has any kind of Streamlit badge or app link. Only
+    reads the raw readme as far as the first one."""
     readme = get_readme(github, repo)
     if readme:
-        readme_contents = readme.decoded_content.decode('utf-8')
-        return BADGE_URL in readme_contents
+        return badge_detector.scan_readme(readme,
+            lambda: readme_cache.read_contents(github, repo.full_name,
+                readme.path)) is not None
     else:
         return False
 
-def fork_repo(repo: Repository.Repository) -> Repository.Repository:
-    """Fork this repository and return a new version of it which 
-    has a _streamlit_hash tag."""
-    
-    # After a repo is forked, we may not immediately have access to it's
-    # branches. To combat this, we have this retry mechanism built in.
-    MAX_FETCH_RETRIES = 3
-    RETRY_TIMEOUT_SECONDS = 10.0
+@github_metrics.helper
+def fork_repo(github: GithubMainClass.Github, repo: RepoSnapshot, inventory,
+        create_limit: Optional[github_rate_limit.StageLimit] = None
+        ) -> RepoSnapshot:
+    """Returns a snapshot of our fork of this repo once it's ready.
+
+    If the inventory, a `fork_inventory.ForkInventory`, already has a fork
+    of this repo, we reuse it, syncing it with the repo first if it's out
+    of date, without creating a fork or waiting for it. Raises ForkOutOfDate
+    if it can't be synced, e.g. because of a conflict, since Github would
+    just hand back the same fork if we forked again. Otherwise we fork
+    the repo, inside a slot of create_limit if given, and add the fork to
+    the inventory."""
+    record = inventory.find_fork(github, repo)
+    if record is not None:
+        if not inventory.is_up_to_date(record, repo):
+            fork_name = record.full_name
+            record = inventory.sync_fork(github, record)
+            if record is None:
+                raise ForkOutOfDate(fork_name)
+        return record.get_snapshot()
 
     # Create the fork
-    forked_repo = repo.create_fork()
-
-    # Try to stamp it with "last modified" timestamp which both acts as
-    # as a hash for this repo, and which verifies that we have access
-    # to the forked repo.
-    for retry in range(1, MAX_FETCH_RETRIES + 1):
+    with create_limit.slot() if create_limit else contextlib.nullcontext():
+        forked_repo = repo.get_repo(github).create_fork()
+    fork = wait_for_fork(forked_repo)
+    inventory.add_fork(fork, repo)
+    return fork
+
+@github_metrics.helper
+def wait_for_fork(forked_repo: Repository.Repository) -> RepoSnapshot:
+    """Waits until a freshly created fork can be read, and returns a
+    snapshot of it. Raises RepoHasNoBranches if it takes too long.
+
+    After a repo is forked, we may not immediately have access to it's
+    branches, so we poll with one cheap call, backing off exponentially
+    with some jitter so that many pending forks don't poll in lockstep."""
+    
+    # How long we're willing to wait for a fork, and how often we poll.
+    MAX_WAIT_SECONDS = 5 * 60.0
+    FIRST_POLL_SECONDS = 1.0
+    MAX_POLL_SECONDS = 30.0
+
+    deadline = time.time() + MAX_WAIT_SECONDS
+    poll_seconds = FIRST_POLL_SECONDS
+    while True:
         try:
-            add_streamlit_hash(forked_repo)
-            return forked_repo
-        except RepoHasNoBranches as e:
-            st.warning(
-                f"**Retry `{retry}`:** `{e.repo_name}` has no branches. " + 
-                f"Waiting {RETRY_TIMEOUT_SECONDS}.")
-            if retry == MAX_FETCH_RETRIES:
+            check_default_branch(forked_repo)
+            return RepoSnapshot.from_repo(forked_repo)
+        except RepoHasNoBranches:
+            wait_seconds = poll_seconds * random.uniform(0.5, 1.0)
+            if time.time() + wait_seconds > deadline:
                 raise
-            time.sleep(RETRY_TIMEOUT_SECONDS)
-    assert False, "Should never be able to get here."
-
+            time.sleep(wait_seconds)
+            poll_seconds = min(2.0 * poll_seconds, MAX_POLL_SECONDS)
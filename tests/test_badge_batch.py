@@ -0,0 +1,50 @@
+import badge_batch
+
+APP_URL = "https://share.streamlit.io/owner/repo/main/streamlit_app.py"
+BADGE = ("[![Open in Streamlit](https://static.streamlit.io/badges/"
+    f"streamlit_badge_black_white.svg)]({APP_URL})")
+
+def test_insert_badge_in_title():
+    placement, contents = badge_batch.insert_badge(
+        b"# My app\nSome text.\n", APP_URL)
+    assert placement == badge_batch.BADGE_IN_TITLE
+    assert contents == f"# My app {BADGE}\nSome text.\n"
+
+def test_insert_badge_in_title_keeps_crlf():
+    placement, contents = badge_batch.insert_badge(
+        b"# My app\r\nSome text.\r\n", APP_URL)
+    assert placement == badge_batch.BADGE_IN_TITLE
+    assert contents == f"# My app {BADGE}\r\nSome text.\r\n"
+
+def test_insert_badge_prepends_with_crlf():
+    placement, contents = badge_batch.insert_badge(
+        b"Some text.\r\nMore text.\r\n", APP_URL)
+    assert placement == badge_batch.BADGE_PREPENDED
+    assert contents == f"{BADGE}\r\n\r\nSome text.\r\nMore text.\r\n"
+
+def test_insert_badge_prepends_to_title_with_link():
+    """Titles which already hold a link or image are left alone."""
+    readme = b"# [My app](https://example.com)\n"
+    placement, contents = badge_batch.insert_badge(readme, APP_URL)
+    assert placement == badge_batch.BADGE_PREPENDED
+    assert contents == f"{BADGE}\n\n{readme.decode()}"
+
+def test_insert_badge_prepends_to_single_line():
+    placement, contents = badge_batch.insert_badge(b"Just text", APP_URL)
+    assert placement == badge_batch.BADGE_PREPENDED
+    assert contents == f"{BADGE}\n\nJust text"
+
+def test_insert_badge_title_without_newline():
+    placement, contents = badge_batch.insert_badge(b"# My app", APP_URL)
+    assert placement == badge_batch.BADGE_IN_TITLE
+    assert contents == f"# My app {BADGE}"
+
+def test_insert_badge_skips_existing_badge():
+    readme = f"# My app\n{BADGE}\n".encode()
+    assert badge_batch.insert_badge(readme, APP_URL) == \
+        (badge_batch.ALREADY_HAS_BADGE, None)
+
+def test_insert_badge_skips_app_link():
+    readme = b"# My app\nTry it at https://share.streamlit.io/a/b\n"
+    assert badge_batch.insert_badge(readme, APP_URL) == \
+        (badge_batch.ALREADY_HAS_BADGE, None)
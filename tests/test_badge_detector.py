@@ -0,0 +1,65 @@
+import requests
+import badge_detector
+
+class Readme:
+    """Stands in for a PyGithub ContentFile."""
+
+    def __init__(self, download_url):
+        self.download_url = download_url
+
+def fake_raw_chunks(chunks, fetched):
+    """Returns an `_iter_raw_chunks` which yields chunks, and notes in
+    fetched which ones the scanner asked for."""
+
+    def iter_raw_chunks(download_url):
+        for chunk in chunks:
+            fetched.append(chunk)
+            yield chunk
+    return iter_raw_chunks
+
+def not_called():
+    raise AssertionError("Shouldn't fall back to the contents API.")
+
+def test_scan_readme_finds_each_kind():
+    readmes = {
+        b"![](https://static.streamlit.io/badges/streamlit_badge_red.svg)":
+            'streamlit_badge',
+        b"![](https://img.shields.io/badge/Open-Streamlit-red)":
+            'shields_badge',
+        b"Try https://share.streamlit.io/owner/repo now": 'app_link',
+        b"Try https://my-app.streamlitapp.com now": 'app_link',
+        b"Nothing to see here": None,
+    }
+    for contents, badge in readmes.items():
+        assert badge_detector.scan_readme(Readme(None),
+            lambda: contents) == badge
+
+def test_scan_readme_stops_at_first_match(monkeypatch):
+    chunks = [b"# Title\n", b"https://share.streamlit.io/a/b", b"more"]
+    fetched = []
+    monkeypatch.setattr(badge_detector, '_iter_raw_chunks',
+        fake_raw_chunks(chunks, fetched))
+    assert badge_detector.scan_readme(Readme('raw'), not_called) == 'app_link'
+    assert fetched == chunks[:2]
+
+def test_scan_readme_match_across_chunks(monkeypatch):
+    chunks = [b"x" * 1000 + b"https://share.stream", b"lit.io/owner/repo"]
+    monkeypatch.setattr(badge_detector, '_iter_raw_chunks',
+        fake_raw_chunks(chunks, []))
+    assert badge_detector.scan_readme(Readme('raw'), not_called) == 'app_link'
+
+def test_scan_readme_no_badge(monkeypatch):
+    chunks = [b"# Title\n", b"Nothing to see here."]
+    fetched = []
+    monkeypatch.setattr(badge_detector, '_iter_raw_chunks',
+        fake_raw_chunks(chunks, fetched))
+    assert badge_detector.scan_readme(Readme('raw'), not_called) is None
+    assert fetched == chunks
+
+def test_scan_readme_falls_back_when_raw_fails(monkeypatch):
+    def iter_raw_chunks(download_url):
+        raise requests.ConnectionError()
+        yield
+    monkeypatch.setattr(badge_detector, '_iter_raw_chunks', iter_raw_chunks)
+    assert badge_detector.scan_readme(Readme('raw'),
+        lambda: b"https://share.streamlit.io/a/b") == 'app_link'
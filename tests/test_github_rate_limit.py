@@ -0,0 +1,70 @@
+import pytest
+import github_rate_limit
+
+class FakeClock:
+    """Stands in for the time module, and only moves when slept."""
+
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock(1000.0)
+    monkeypatch.setattr(github_rate_limit, 'time', clock)
+    return clock
+
+def test_acquire_unknown_budget(clock):
+    budget = github_rate_limit.RateBudget('core')
+    assert budget.acquire() == 0.0
+    assert budget.get_remaining() is None
+
+def test_acquire_spends_budget(clock):
+    budget = github_rate_limit.RateBudget('core')
+    budget.update(100, 5000, clock.now + 100.0)
+    assert budget.acquire() == 0.0
+    assert budget.get_remaining() == 99
+
+def test_acquire_paces_after_burst(clock):
+    budget = github_rate_limit.RateBudget('core')
+    budget.update(100, 5000, clock.now + 100.0)
+    waits = [budget.acquire() for _ in range(20)]
+
+    # About a tenth of the budget goes through at once, and then the calls
+    # are spread over the window.
+    assert waits[:10] == [0.0] * 10
+    assert 0.0 < waits[-1] < 2.0
+    assert clock.now - 1000.0 == pytest.approx(sum(waits))
+
+def test_acquire_waits_for_reset_when_exhausted(clock):
+    budget = github_rate_limit.RateBudget('core')
+    budget.update(0, 5000, clock.now + 30.0)
+    wait_seconds = budget.acquire()
+    assert wait_seconds == pytest.approx(
+        30.0 + github_rate_limit.RESET_MARGIN_SECONDS)
+    assert budget.seconds_slept == wait_seconds
+
+def test_acquire_conditional(clock):
+    budget = github_rate_limit.RateBudget('core')
+    budget.update(100, 5000, clock.now + 100.0)
+    for _ in range(50):
+        assert budget.acquire(conditional=True) == 0.0
+    assert budget.get_remaining() == 100
+
+def test_acquire_conditional_waits_when_exhausted(clock):
+    budget = github_rate_limit.RateBudget('core')
+    budget.exhaust(clock.now + 10.0)
+    assert budget.acquire(conditional=True) == pytest.approx(
+        10.0 + github_rate_limit.RESET_MARGIN_SECONDS)
+
+def test_acquire_forgets_past_window(clock):
+    budget = github_rate_limit.RateBudget('core')
+    budget.update(0, 5000, clock.now + 10.0)
+    clock.sleep(60.0)
+    assert budget.acquire() == 0.0
+    assert budget.get_remaining() is None
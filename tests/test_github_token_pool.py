@@ -0,0 +1,64 @@
+import time
+import pytest
+import github_rate_limit
+import github_token_pool
+
+TOKENS = ['token-a', 'token-b', 'token-c']
+
+@pytest.fixture(autouse=True)
+def budgets(monkeypatch):
+    """Every test starts without any budgets."""
+    monkeypatch.setattr(github_rate_limit, '_budgets', {})
+
+def authorization(token):
+    return github_token_pool.AUTHORIZATION_FORMAT.format(token)
+
+def get_budget(token, resource='core'):
+    return github_rate_limit.get_budget(resource,
+        github_rate_limit.get_token_key(authorization(token)))
+
+def test_choose_most_remaining():
+    pool = github_token_pool.TokenPool(TOKENS)
+    reset = time.time() + 600.0
+    get_budget('token-a').update(10, 5000, reset)
+    get_budget('token-b').update(4000, 5000, reset)
+    get_budget('token-c').update(200, 5000, reset)
+    assert {pool.choose('core') for _ in range(6)} == {authorization('token-b')}
+
+def test_choose_unknown_first():
+    pool = github_token_pool.TokenPool(TOKENS)
+    reset = time.time() + 600.0
+    get_budget('token-a').update(4000, 5000, reset)
+    get_budget('token-b').update(4000, 5000, reset)
+    assert pool.choose('core') == authorization('token-c')
+
+def test_choose_spreads_ties():
+    pool = github_token_pool.TokenPool(TOKENS)
+    assert {pool.choose('core') for _ in range(3)} == \
+        {authorization(token) for token in TOKENS}
+
+def test_choose_by_resource():
+    pool = github_token_pool.TokenPool(TOKENS)
+    reset = time.time() + 60.0
+    get_budget('token-a', 'search').update(0, 30, reset)
+    get_budget('token-b', 'search').update(0, 30, reset)
+    get_budget('token-c', 'search').update(5, 30, reset)
+    get_budget('token-c').update(0, 5000, reset)
+    assert pool.choose('search') == authorization('token-c')
+    assert pool.choose('core') != authorization('token-c')
+
+def test_choose_soonest_reset_when_exhausted():
+    pool = github_token_pool.TokenPool(TOKENS)
+    now = time.time()
+    get_budget('token-a').update(0, 5000, now + 600.0)
+    get_budget('token-b').update(0, 5000, now + 60.0)
+    get_budget('token-c').update(0, 5000, now + 300.0)
+    assert {pool.choose('core') for _ in range(3)} == {authorization('token-b')}
+
+def test_write_token_defaults_to_first():
+    pool = github_token_pool.TokenPool(TOKENS)
+    assert pool.write_token == 'token-a'
+
+def test_needs_a_token():
+    with pytest.raises(ValueError):
+        github_token_pool.TokenPool([])
@@ -0,0 +1,44 @@
+import pandas as pd
+import pytest
+import streamlit_github
+
+def test_parse_app_urls():
+    urls = pd.Series([
+        "https://share.streamlit.io/owner/repo/main/streamlit_app.py",
+        "https://share.streamlit.io/owner/repo/dev/app/main.py",
+        "https://share.streamlit.io/owner/my-repo",
+        "https://share.streamlit.io/owner/repo/",
+        "https://share.streamlit.io/owner/repo/main/my%2Dapp.py",
+    ], index=[10, 11, 12, 13, 14])
+    coords = streamlit_github.parse_app_urls(urls)
+    assert list(coords.columns) == streamlit_github.COORDS_COLUMNS
+    assert list(coords.index) == [10, 11, 12, 13, 14]
+    assert coords.values.tolist() == [
+        ["owner", "repo", "main", "streamlit_app.py"],
+        ["owner", "repo", "dev", "app/main.py"],
+        ["owner", "my-repo", None, "streamlit_app.py"],
+        ["owner", "repo", None, "streamlit_app.py"],
+        ["owner", "repo", "main", "my-app.py"],
+    ]
+
+def test_parse_app_urls_unparsed():
+    urls = pd.Series([
+        "https://github.com/owner/repo",
+        "not a url",
+        None,
+    ])
+    coords = streamlit_github.parse_app_urls(urls)
+    assert coords.isna().all().all()
+
+@pytest.mark.parametrize('url', [
+    "https://share.streamlit.io/owner/repo/main/streamlit_app.py",
+    "https://share.streamlit.io/owner/repo/dev/pages/app.py",
+    "https://share.streamlit.io/owner/repo",
+    "https://share.streamlit.io/owner/repo/",
+    "https://share.streamlit.io/owner/repo/app.py",
+])
+def test_parse_app_urls_matches_from_app_url(url):
+    coords = streamlit_github.GithubCoords.from_app_url(url)
+    parsed = streamlit_github.parse_app_urls(pd.Series([url])).iloc[0]
+    assert [coords.owner, coords.repo, coords.branch, coords.path] == \
+        parsed.tolist()